@@ -1,30 +1,32 @@
 """
 
 FUNCTIONS:
-1. __init__(stream_elem, overlay_elem)
-   INPUT: stream_elem (UI element for video stream), overlay_elem (UI element for overlay)
+1. __init__(stream_elem, overlay_elem, cv_workers)
+   INPUT: stream_elem (UI element for video stream), overlay_elem (UI element for overlay),
+          cv_workers (int CV worker processes, default 0 to analyse on a thread in this process)
    OUTPUT: Initialized Automation object
   SUMMARY: Initializes automation system with UI elements, threading components, and state variables
 
 2. start_threads()
    INPUT: None
    OUTPUT: video_thread, movement_thread (threading objects)
-   SUMMARY: Starts video processing and movement execution threads, initiates automation
+   SUMMARY: Starts the ingest, analysis, display, telemetry poll, event and movement threads, initiates automation
 
 3. check_obstacles()
    INPUT: None
    OUTPUT: Boolean (True if obstacle detected, False otherwise)
-   SUMMARY: Queries robot API to check if obstacles are detected by sensors
+   SUMMARY: Fetches /telemetry once and returns its obstacle flag, refreshing the cached telemetry;
+            the flag stays set after a reflex stop until telemetry confirms it or avoidance starts
 
 4. update_vid_stream()
    INPUT: None
    OUTPUT: None (continuous loop)
-   SUMMARY: Continuously processes video stream, detects features, handles obstacles, updates UI
+   SUMMARY: Ingest stage: receives frames from the robot and hands the newest one to the analysis stage
 
 5. obstacle_avoidance_sequence()
    INPUT: None
    OUTPUT: None
-   SUMMARY: Executes 3-attempt obstacle avoidance by backing up and checking left/right paths
+   SUMMARY: Uploads the 3-attempt obstacle avoidance (back up, check left, check right) as one Pi-side program
 
 6. execute_movements()
    INPUT: None
@@ -59,10 +61,12 @@ FUNCTIONS:
 12. horizontal_line_sequence()
     INPUT: None
     OUTPUT: None
-    SUMMARY: Executes turning sequence when horizontal line detected, checks left/right for vertical paths
+    SUMMARY: Executes turning sequence when horizontal line detected as Pi-side programs, with the
+             left/right vertical path checks done here between them
 
-13. post_direction(direction)
-    INPUT: direction (string: 'forward', 'backward', 'left', 'right', 'stop')
+13. post_direction(direction, duration)
+    INPUT: direction (string: 'forward', 'backward', 'left', 'right', 'stop'),
+           duration (float seconds before the Pi stops on its own, optional)
     OUTPUT: None
     SUMMARY: Sends movement command to robot API and manages command logging
 
@@ -75,30 +79,130 @@ FUNCTIONS:
     INPUT: None
     OUTPUT: None
     SUMMARY: Terminates all threads and stops automation system
+
+16. analyze_frame(stream)
+    INPUT: stream (decoded OpenCV frame)
+    OUTPUT: (stream, overlay) to display, or None if there is nothing to show
+    SUMMARY: Uses the latest obstacle flag and Processing.analyze on one frame, then apply_result
+
+17. publish_frame(frame_id, frame)
+    INPUT: frame_id (int id assigned by the robot API), frame (decoded OpenCV frame)
+    OUTPUT: None
+    SUMMARY: Stores the newest streamed frame and wakes up anything waiting for it
+
+18. wait_for_frame(timeout)
+    INPUT: timeout (float seconds, default 2.0)
+    OUTPUT: Newest frame received after the call, or None on timeout
+    SUMMARY: Blocks until the video thread receives a frame newer than the one at call time
+
+19. process_frame(frame_id, stream)
+    INPUT: frame_id (int id assigned by the robot API), stream (decoded OpenCV frame)
+    OUTPUT: Boolean (False once the display is gone and the loop should end)
+    SUMMARY: Skips frames that were already received, then publishes new ones to the analysis stage
+
+20. analyze_frames()
+    INPUT: None
+    OUTPUT: None (continuous loop)
+    SUMMARY: Analysis stage: always takes the newest frame, never a backlog, and hands the result to display
+
+21. display_frames()
+    INPUT: None
+    OUTPUT: None (continuous loop)
+    SUMMARY: Display stage: hands the newest analysis result to the renderer
+
+22. show_frames(stream, overlay)
+    INPUT: stream, overlay (OpenCV BGR images)
+    OUTPUT: Boolean (False once the UI elements are gone)
+    SUMMARY: Queues both images for Renderer.TkRenderer, which paints them from the Tk main loop
+
+23. poll_telemetry()
+    INPUT: None
+    OUTPUT: None (continuous loop)
+    SUMMARY: Fetches /telemetry once per cycle off the frame path so analysis never waits on HTTP
+
+24. stages_stopped()
+    INPUT: None
+    OUTPUT: Boolean
+    SUMMARY: True once automation is stopped or the display is gone
+
+25. get_stage_stats()
+    INPUT: None
+    OUTPUT: dict of StageStats snapshots (throughput, ms per item, drops) keyed by stage name
+    SUMMARY: Reports each pipeline stage's own throughput
+
+26. analyze_frames_parallel()
+    INPUT: None
+    OUTPUT: None (continuous loop)
+    SUMMARY: Parallel analysis stage: feeds the newest frame to a CV worker process whenever one is free;
+             if the worker pool breaks, it says so and falls back to analyze_frames on this thread
+
+27. handle_analysis(frame_id, stream, result)
+    INPUT: frame_id (int), stream (decoded OpenCV frame), result (Processing.analyze dict)
+    OUTPUT: None
+    SUMMARY: Receives worker results in frame order, acts on them and hands them to display
+
+28. obstacle_result(stream)
+    INPUT: stream (decoded OpenCV frame)
+    OUTPUT: analyze() style dict with the obstacle overlay
+    SUMMARY: Labels a frame taken while the sensor sees an obstacle
+
+29. apply_result(stream, result)
+    INPUT: stream (decoded OpenCV frame), result (Processing.analyze or obstacle_result dict)
+    OUTPUT: (stream, overlay) to display, or None
+    SUMMARY: Queues the movement commands for one analysed frame and tracks the detected line type
+
+30. watch_events()
+    INPUT: None
+    OUTPUT: None (continuous loop)
+    SUMMARY: Long-polls /events so a reflex stop on the Pi marks the obstacle without waiting for the next poll,
+             latched so the lagging filtered flag from poll_telemetry can't clear it first
+
+31. run_sequence(steps, name)
+    INPUT: steps (list of step dicts, see RaspPiFiles/Sequence.py), name (string, optional)
+    OUTPUT: Final program status dict, or None if it could not run, was replaced or the threads stopped
+    SUMMARY: Uploads a motion program to the Pi and waits for it to end, cancelling it if the threads stop
+
+PIPELINE:
+robot -> ingest -> frame slot -> analysis -> display slot -> display
+Each slot holds only the newest value; a value replaced before it was read is counted as dropped.
+With cv_workers > 0 the analysis stage hands frames to ParallelProcessing worker processes through
+shared memory, and their results come back in frame order before any command reaches the movement queue.
+
 """
 
 import threading
 from tkinter import *
-import requests
-import base64
 import numpy as np
 import cv2
-from PIL import Image, ImageTk
 import Processing
+import RoverClient
+import Pipeline
+import ParallelProcessing
+import Renderer
 import time
-from queue import Queue
-
-url = 'http://192.168.240.25:5000/'
 
 class Automation:
     # Initialize automation system with UI elements and threading components
-    def __init__(self, stream_elem=None, overlay_elem=None):
+    def __init__(self, stream_elem=None, overlay_elem=None, cv_workers=0):
         # UI elements
         self.stream_elem = stream_elem
         self.overlay_elem = overlay_elem
 
+        # Pooled keep-alive connection to the robot API
+        self.client = RoverClient.get_client()
+
+        # Martian reference features are loaded once and reused for every frame
+        self.martian_detector = Processing.get_martian_detector()
+        # the bluescale lookup table takes about a second to build; pay for it here, not on the first frame
+        if not cv_workers:
+            Processing.prepare_bluescale_mask()
+
+        # Optional pool of CV worker processes; 0 keeps analysis on a thread in this process
+        self.cv_workers = cv_workers
+        self.analyzer = None
+
         # Threading and state variables
-        self.movement_queue = Queue()
+        self.movement_queue = Pipeline.TimedQueue('movement')  # a Queue that times each command's wait
         self.stop_event = threading.Event()
         self.pause_event = threading.Event()
         self.line_type_detected = None
@@ -109,6 +213,36 @@ class Automation:
         self.last_command = None
         self.sequence_start_time = None
 
+        # Latest streamed frame, shared with check_vertical_path
+        self.latest_frame = None
+        self.latest_frame_id = None
+        self.frame_condition = threading.Condition()
+
+        # Ingest -> analysis -> display, each hand-off keeps only the newest value
+        self.frame_slot = Pipeline.LatestSlot('frame slot')
+        self.display_slot = Pipeline.LatestSlot('display slot')
+        self.stage_stats = {'ingest': Pipeline.StageStats('ingest', self.frame_slot),
+                            'analysis': Pipeline.StageStats('analysis', self.display_slot),
+                            'display': Pipeline.StageStats('display'),
+                            'telemetry': Pipeline.StageStats('telemetry poll', report_every=0)}
+        self.display_closed = threading.Event()
+
+        # Frames reach the Tk panes through the Tk main loop, never straight from a worker thread
+        self.renderer = None
+        if stream_elem is not None and overlay_elem is not None:
+            self.renderer = Renderer.TkRenderer({'stream': stream_elem, 'overlay': overlay_elem})
+            self.stage_stats['render'] = self.renderer.stats
+
+        # Frame id, obstacle, direction and log state from /telemetry, refreshed by its own thread
+        self.telemetry = None
+        self.obstacle_detected = False
+        self.reflex_latched = False  # set by a reflex stop, held until telemetry agrees or avoidance starts
+        self.telemetry_interval = 0.1
+
+        # The Pi stops the motors itself when driving into an obstacle and reports it on /events
+        self.last_event_id = 0
+        self.event_wait = 2.0
+
     # Start video processing and movement execution threads
     def start_threads(self):
         # Clear any existing state
@@ -116,11 +250,25 @@ class Automation:
         self.pause_event.clear()
         self.automation_active = True
 
-        # Start video processing thread
+        # Start the video pipeline: ingest, analysis and display each run on their own thread
         video_thread = threading.Thread(target=self.update_vid_stream)
         video_thread.daemon = True
         video_thread.start()
 
+        if self.cv_workers and self.analyzer is None:
+            self.analyzer = ParallelProcessing.ParallelAnalyzer(self.handle_analysis, workers=self.cv_workers,
+                                                                ref_path=self.martian_detector.ref_path)
+        self.analysis_thread = threading.Thread(target=self.analyze_frames, daemon=True)
+        self.analysis_thread.start()
+        if self.renderer is not None:
+            self.renderer.start()  # start_threads is called from the Tk main thread
+        self.display_thread = threading.Thread(target=self.display_frames, daemon=True)
+        self.display_thread.start()
+        self.telemetry_thread = threading.Thread(target=self.poll_telemetry, daemon=True)
+        self.telemetry_thread.start()
+        self.event_thread = threading.Thread(target=self.watch_events, daemon=True)
+        self.event_thread.start()
+
         # Start movement execution thread
         movement_thread = threading.Thread(target=self.execute_movements)
         movement_thread.daemon = True
@@ -131,159 +279,263 @@ class Automation:
 
         return video_thread, movement_thread
 
-    # Query robot API to check for obstacle detection
+    # Fetch /telemetry once and return its obstacle flag, refreshing the cached telemetry
     def check_obstacles(self):
         try:
-            response = requests.get(url + 'obstacle')
-            data = response.json()
-            return data.get('obstacle_detected', False)
+            self.telemetry = self.client.get_telemetry()
+            detected = bool(self.telemetry.get('detect_flag', False))
+            if detected:
+                self.reflex_latched = False  # the filtered reading caught up, it carries the flag from here
+            # a reflex stop trips on the raw reading, which the filtered flag can lag behind by a few samples
+            self.obstacle_detected = detected or self.reflex_latched
+            return self.obstacle_detected
         except Exception as e:
             print(f'error checking obstacles: {e}')
             return False
 
-    # Continuously process video stream and detect features for automation
-    def update_vid_stream(self):
+    # Long-poll /events so a reflex stop on the pi marks the obstacle without waiting for the next poll
+    def watch_events(self):
         while not self.stop_event.is_set():
             try:
-                # Get frame from API
-                response = requests.get(url + 'vidstream')
-                b64_image = response.json().get('frame')
-                if not b64_image:
-                    print('Received empty frame from API')
-                    time.sleep(0.01)
+                reply = self.client.get_events(self.last_event_id, self.event_wait)
+            except Exception as e:
+                print(f'error reading events: {e}')
+                self.stop_event.wait(1.0)
+                continue
+
+            if reply['last_id'] < self.last_event_id:
+                self.last_event_id = 0  # the pi restarted and its event ids started over
+                continue
+            for event in reply['events']:
+                if event.get('type') == 'reflex_stop':
+                    # motors are already off, the next analysed frame starts the avoidance sequence
+                    print(f"pi reflex stop at {event['raw']:.2f} m")
+                    self.reflex_latched = True
+                    self.obstacle_detected = True
+            self.last_event_id = reply['last_id']
+
+    # Fetch /telemetry once per cycle off the frame path so analysis never waits on HTTP
+    def poll_telemetry(self):
+        while not self.stages_stopped():
+            start = time.perf_counter()
+            self.check_obstacles()
+            self.stage_stats['telemetry'].record(time.perf_counter() - start)
+            self.stop_event.wait(self.telemetry_interval)
+
+    # True once automation is stopped or the display is gone
+    def stages_stopped(self):
+        return self.stop_event.is_set() or self.display_closed.is_set()
+
+    # Ingest stage: receive frames from the robot and hand the newest one to the analysis stage
+    def update_vid_stream(self):
+        while not self.stages_stopped():
+            try:
+                # one connection for the whole stream instead of a GET per frame
+                start = time.perf_counter()
+                for frame_id, _, stream in self.client.frame_stream():
+                    if self.stages_stopped():
+                        break
+                    if not self.process_frame(frame_id, stream):
+                        return
+                    self.stage_stats['ingest'].record(time.perf_counter() - start)
+                    start = time.perf_counter()
+            except Exception as e:
+                print(f'Error in video stream: {e}')
+                try:
+                    # stream dropped; block on the long-poll for the next frame instead of spinning
+                    result = self.client.get_frame(after=self.latest_frame_id, wait=1.0)
+                    if result is not None:
+                        frame_id, _, stream = result
+                        if not self.process_frame(frame_id, stream):
+                            return
+                except Exception as e:
+                    print(f'Error fetching frame: {e}')
+                    time.sleep(0.5)  # give the api a moment before reconnecting
+
+    # Skip frames that were already received, then publish new ones to the analysis stage
+    def process_frame(self, frame_id, stream):
+        if frame_id == self.latest_frame_id:
+            return True  # same frame as last time, nothing new to analyse or queue
+        self.publish_frame(frame_id, stream)
+        self.frame_slot.put(stream)
+        return not self.display_closed.is_set()
+
+    # Analysis stage: always take the newest frame, never a backlog, and hand the result to display
+    def analyze_frames(self):
+        if self.analyzer is not None:
+            return self.analyze_frames_parallel()
+
+        seq = 0
+        while not self.stages_stopped():
+            item = self.frame_slot.get(after=seq, timeout=0.5)
+            if item is None:
+                continue
+            seq, stream = item
+
+            start = time.perf_counter()
+            result = self.analyze_frame(stream)
+            if result is not None:
+                self.display_slot.put(result)
+            self.stage_stats['analysis'].record(time.perf_counter() - start)
+
+    # Parallel analysis stage: feed the newest frame to a worker process whenever one is free
+    def analyze_frames_parallel(self):
+        seq = 0
+        fallback = False
+        try:
+            while not self.stages_stopped():
+                # only take a frame once it can be submitted, so it is the newest one at that moment
+                if not self.analyzer.wait_ready(timeout=0.5):
                     continue
-
-                # Decode image
-                decoded_img = base64.b64decode(b64_image)
-                np_image = np.frombuffer(decoded_img, dtype=np.uint8)
-                stream = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
-                if stream is None:
-                    print('Failed to decode image')
-                    time.sleep(0.01)
+                item = self.frame_slot.get(after=seq, timeout=0.5)
+                if item is None:
                     continue
+                seq, stream = item
 
-                obstacle_detected = self.check_obstacles()
-                if obstacle_detected:
-                    overlay = stream.copy()
-                    cv2.putText(overlay, 'OBSTACLE DETECTED', (10, 50),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-                    if not self.is_executing_sequence:
-                        print('obstacle detected! starting avoidance sequence...')
-                        self.movement_queue.put(('obstacle_detected', None))
-
-                    stream = cv2.resize(stream, (400, 300))
-                    overlay = cv2.resize(overlay, (400, 300))
-                    stream = cv2.cvtColor(stream, cv2.COLOR_BGR2RGB)
-                    overlay = cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB)
-
-                    stream_img = ImageTk.PhotoImage(Image.fromarray(stream))
-                    overlay_img = ImageTk.PhotoImage(Image.fromarray(overlay))
-
-                    if self.stream_elem and self.overlay_elem:
-                        self.stream_elem.imgtk = stream_img
-                        self.stream_elem.configure(image=stream_img)
-                        self.overlay_elem.imgtk = overlay_img
-                        self.overlay_elem.configure(image=overlay_img)
-                    else:
-                        break
-
-                    time.sleep(0.01)
-                    continue
+                if self.obstacle_detected:
+                    # no vision needed, but it still goes through the frame ordering
+                    self.analyzer.submit_result(seq, stream, self.obstacle_result(stream))
+                else:
+                    self.analyzer.submit(seq, stream)
+        except Exception as e:
+            # a broken worker pool doesn't come back, so keep analysing on this thread instead
+            print(f'CV workers failed, analysing frames on one thread from now on: {e}')
+            fallback = True
+        finally:
+            # this thread is the only one submitting, so it shuts the workers down
+            self.analyzer.close()
+            self.analyzer = None
+        if fallback:
+            self.analyze_frames()
+
+    # Worker results arrive here in frame order; act on them and hand them to display
+    def handle_analysis(self, frame_id, stream, result):
+        start = time.perf_counter()
+        try:
+            shown = self.apply_result(stream, result)
+            if shown is not None:
+                self.display_slot.put(shown)
+        except Exception as e:
+            print(f'Error in video stream: {e}')
+        self.stage_stats['analysis'].record(time.perf_counter() - start)
 
-                # Process frame using Processing.apply_overlay
+    # Use the latest obstacle flag and Processing on one frame, queue sequences
+    def analyze_frame(self, stream):
+        try:
+            if self.obstacle_detected:
+                result = self.obstacle_result(stream)
+            else:
                 # This is the key connection between Automation.py and Processing.py
-                overlay, line_type = Processing.apply_overlay(stream, self.movement_queue)
-
-                # Handle line type detection
-                if line_type != self.line_type_detected:
-                    self.line_type_detected = line_type
-                    print(f'Line type detected: {line_type}')
-
-                    # If horizontal line detected and automation is active, queue sequence
-                    if self.automation_active and line_type == 'horizontal' and not self.is_executing_sequence:
-                        print('Horizontal line detected! Queueing sequence...')
-                        self.movement_queue.put(('horizontal_line_detected', None))
-
-                # Resize and convert images for display
-                if overlay is not None:
-                    stream = cv2.resize(stream, (400, 300))
-                    overlay = cv2.resize(overlay, (400, 300))
-                    stream = cv2.cvtColor(stream, cv2.COLOR_BGR2RGB)
-                    overlay = cv2.cvtColor(overlay, cv2.COLOR_BGR2RGB)
-
-                    # Update UI elements
-                    stream_img = ImageTk.PhotoImage(Image.fromarray(stream))
-                    overlay_img = ImageTk.PhotoImage(Image.fromarray(overlay))
-
-                    if self.stream_elem and self.overlay_elem and self.stream_elem.winfo_exists() and self.overlay_elem.winfo_exists():
-                        self.stream_elem.imgtk = stream_img
-                        self.stream_elem.configure(image=stream_img)
-                        self.overlay_elem.imgtk = overlay_img
-                        self.overlay_elem.configure(image=overlay_img)
-                    else:
-                        break
+                result = Processing.analyze(stream, self.martian_detector)
+            return self.apply_result(stream, result)
 
-            except Exception as e:
-                print(f'Error in video stream: {e}')
-                time.sleep(0.01)
+        except Exception as e:
+            print(f'Error in video stream: {e}')
+        return None
+
+    # Label a frame taken while the sensor sees an obstacle
+    def obstacle_result(self, stream):
+        overlay = stream.copy()
+        cv2.putText(overlay, 'OBSTACLE DETECTED', (10, 50),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return {'overlay': overlay, 'line_type': None, 'commands': [], 'obstacle': True}
+
+    # Queue the movement commands for one analysed frame and track the detected line type
+    def apply_result(self, stream, result):
+        if result.get('obstacle'):
+            if not self.is_executing_sequence:
+                print('obstacle detected! starting avoidance sequence...')
+                self.movement_queue.put(('obstacle_detected', None))
+            return stream, result['overlay']
+
+        Processing.dispatch_commands(result, self.movement_queue)
+        overlay, line_type = result['overlay'], result['line_type']
+
+        # Handle line type detection
+        if line_type != self.line_type_detected:
+            self.line_type_detected = line_type
+            print(f'Line type detected: {line_type}')
+
+            # If horizontal line detected and automation is active, queue sequence
+            if self.automation_active and line_type == 'horizontal' and not self.is_executing_sequence:
+                print('Horizontal line detected! Queueing sequence...')
+                self.movement_queue.put(('horizontal_line_detected', None))
+
+        if overlay is not None:
+            return stream, overlay
+        return None
+
+    # Display stage: hand the newest analysis result to the renderer
+    def display_frames(self):
+        seq = 0
+        try:
+            while not self.stages_stopped():
+                item = self.display_slot.get(after=seq, timeout=0.5)
+                if item is None:
+                    continue
+                seq, (stream, overlay) = item
+
+                start = time.perf_counter()
+                try:
+                    if not self.show_frames(stream, overlay):
+                        self.display_closed.set()
+                        self.frame_slot.close()
+                        return
+                except Exception as e:
+                    print(f'Error in video stream: {e}')
+                self.stage_stats['display'].record(time.perf_counter() - start)
+        finally:
+            if self.renderer is not None:
+                self.renderer.stop()
+
+    # Queue both images for the Tk main loop to paint
+    def show_frames(self, stream, overlay):
+        if self.renderer is None:
+            return False
+        return self.renderer.submit('stream', stream) and self.renderer.submit('overlay', overlay)
+
+    # Report each pipeline stage's own throughput
+    def get_stage_stats(self):
+        return {name: stats.snapshot() for name, stats in self.stage_stats.items()}
+
+    # Store the newest streamed frame and wake up anything waiting for it
+    def publish_frame(self, frame_id, frame):
+        with self.frame_condition:
+            self.latest_frame = frame
+            self.latest_frame_id = frame_id
+            self.frame_condition.notify_all()
+
+    # Block until the video thread receives a frame newer than the one at call time
+    def wait_for_frame(self, timeout=2.0):
+        with self.frame_condition:
+            start_id = self.latest_frame_id
+            if not self.frame_condition.wait_for(lambda: self.latest_frame_id != start_id, timeout=timeout):
+                return None
+            return self.latest_frame
 
     # Execute 3-attempt obstacle avoidance by backing up and checking left/right paths
     def obstacle_avoidance_sequence(self):
-        attempts = 0
-        path_found = False
-
-        # First, stop any current movement
-        self.post_direction('stop')
-        time.sleep(0.3)
-
-        while attempts < 3 and not path_found and not self.stop_event.is_set():
-            print(f"Obstacle avoidance attempt {attempts + 1}/3")
-
-            # Move backward
-            self.post_direction('backward')
-            time.sleep(1.0)  # Adjust time as needed
-            self.post_direction('stop')
-            time.sleep(0.3)
-
-            # Check left path
-            print("Checking left path...")
-            self.post_direction('left')
-            time.sleep(1.4)  # Full left turn
-            self.post_direction('stop')
-            time.sleep(0.5)
-
-            # Check if path is clear on the left
-            if not self.check_obstacles():
-                print("Clear path found on the left")
-                path_found = True
-                self.post_direction('forward')
-                time.sleep(1.2)
-                break
-
-            # Check right path
-            print("No path on left, checking right...")
-            self.post_direction('right')
-            time.sleep(2.8)  # Full right turn from left position
-            self.post_direction('stop')
-            time.sleep(0.5)
-
-            # Check if path is clear on the right
-            if not self.check_obstacles():
-                print("Clear path found on the right")
-                path_found = True
-                self.post_direction('forward')
-                time.sleep(1.2)
-                break
-
-            # Return to center and try again
-            print("No path on right either, returning to center")
-            self.post_direction('left')
-            time.sleep(1.4)  # Turn from right to center
-            self.post_direction('stop')
-            time.sleep(0.3)
-
-            attempts += 1
+        # the reflex stop is being dealt with now, so the filtered reading alone decides from here
+        self.reflex_latched = False
+        # The whole search runs on the pi: turns are timed there and the obstacle checks read its sensor directly
+        look_around = [{'direction': 'backward', 'duration': 1.0},  # Adjust time as needed
+                       {'direction': 'stop', 'duration': 0.3},
+                       {'direction': 'left', 'duration': 1.4},  # Full left turn
+                       {'direction': 'stop', 'duration': 0.5},
+                       {'if': 'obstacle_clear',
+                        'then': [{'direction': 'forward', 'duration': 1.2}, {'finish': 'left'}]},
+                       {'direction': 'right', 'duration': 2.8},  # Full right turn from left position
+                       {'direction': 'stop', 'duration': 0.5},
+                       {'if': 'obstacle_clear',
+                        'then': [{'direction': 'forward', 'duration': 1.2}, {'finish': 'right'}]},
+                       {'direction': 'left', 'duration': 1.4},  # Turn from right to center
+                       {'direction': 'stop', 'duration': 0.3}]
+        steps = [{'direction': 'stop', 'duration': 0.3},
+                 {'repeat': 3, 'steps': look_around}]
+
+        print("Starting obstacle avoidance (up to 3 attempts)")
+        status = self.run_sequence(steps, 'obstacle avoidance')
+        path_found = status is not None and status['state'] == 'done' and status['result'] is not None
 
         # Final decision
         if not path_found:
@@ -291,7 +543,7 @@ class Automation:
             self.post_direction('stop')
             self.automation_active = False
         else:
-            print("Path found, resuming forward movement")
+            print(f"Clear path found on the {status['result']}, resuming forward movement")
             if self.automation_active:
                 self.post_direction('forward')
 
@@ -328,14 +580,16 @@ class Automation:
                         print(f"Sequence completed in {time.time() - self.sequence_start_time:.2f} seconds")
                     elif command == 'move':
                         direction, duration = data
-                        self.post_direction(direction)
+                        self.post_direction(direction, duration if duration > 0 else None)
                         last_direction = direction
                         if duration > 0:
-                            time.sleep(duration)
-                            # Only stop if not executing a sequence
+                            # the pi times the stop itself; waiting here only keeps the next
+                            # queued command from pre-empting this move early
+                            self.stop_event.wait(duration)
+                            last_direction = 'stop'
+                            self.last_command = 'stop'
                             if not self.is_executing_sequence:
-                                self.post_direction('stop')
-                                last_direction = 'stop'
+                                self.clear_queue()
 
                     # Mark the command as done
                     self.movement_queue.task_done()
@@ -389,30 +643,20 @@ class Automation:
     # Capture frame and check for valid vertical line paths
     def check_vertical_path(self):
         try:
-            # Get frame from API
-            response = requests.get(url + 'vidstream')
-            b64_image = response.json().get('frame')
-            if not b64_image:
-                return False
-
-            # Decode image
-            decoded_img = base64.b64decode(b64_image)
-            np_image = np.frombuffer(decoded_img, dtype=np.uint8)
-            frame = cv2.imdecode(np_image, cv2.IMREAD_COLOR)
+            # Wait for a frame captured after the turn finished
+            frame = self.wait_for_frame()
+            if frame is None:
+                # video thread isn't running, so long-poll the api for a new frame directly
+                result = self.client.get_frame(after=self.latest_frame_id, wait=1.0)
+                if result is not None:
+                    frame = result[2]
 
             if frame is None:
                 return False
 
-            # Process the frame to detect vertical lines
-            # Prepare the frame similar to how Processing.apply_overlay does it
-            blurred = Processing.apply_gaussian_blur(frame)
-            bluescaled = Processing.bluescale(blurred)
-            masked = Processing.hsv_mask(bluescaled)
-
-            # Use Processing's vertical_detection function
-            vertical_flag, _ = Processing.vertical_detection(masked)
-
-            return vertical_flag
+            # Same preprocessing and Hough pass that Processing.apply_overlay uses
+            analysis = Processing.FrameAnalysis(frame)
+            return analysis.vertical()['detected']
 
         except Exception as e:
             print(f'Error checking vertical path: {e}')
@@ -420,75 +664,68 @@ class Automation:
 
     # Execute turning sequence when horizontal line detected, check left/right for vertical paths
     def horizontal_line_sequence(self):
-        # Stop movement
-        self.post_direction('stop')
-        time.sleep(0.3)
-
-        # Move forward
-        self.post_direction('forward')
-        time.sleep(2.5)
-
-        # Stop before turning
-        self.post_direction('stop')
-        time.sleep(0.3)
-
-        # First try turning left and check for path
+        # The moves run as pi-side programs; only the vertical path checks, which need a camera frame,
+        # happen here between them
         print("Turning left to check for vertical path")
-        self.post_direction('left')
-        time.sleep(1.4)  # Full left turn
-
-        # Stop to check for vertical line
-        self.post_direction('stop')
-        time.sleep(0.5)
+        status = self.run_sequence([{'direction': 'stop', 'duration': 0.3},
+                                    {'direction': 'forward', 'duration': 2.5},
+                                    {'direction': 'stop', 'duration': 0.3},
+                                    {'direction': 'left', 'duration': 1.4},  # Full left turn
+                                    {'direction': 'stop', 'duration': 0.5}], 'horizontal line: look left')
+        if status is None or status['state'] != 'done':
+            print("Horizontal line sequence interrupted")
+            return
 
         # Check if there's a vertical path on the left
-        left_path_valid = self.check_vertical_path()
-
-        if left_path_valid:
+        if self.check_vertical_path():
             print("Valid vertical path found on the left")
-            # Move forward on this path
-            self.post_direction('forward')
-            time.sleep(1.2)
+            steps = [{'direction': 'forward', 'duration': 1.2}]
         else:
             # No path on left, try turning right
             print("No vertical path on left, checking right")
-            self.post_direction('right')
-            time.sleep(2.8)  # Need to turn from full left to full right
-
-            # Stop to check for vertical path
-            self.post_direction('stop')
-            time.sleep(0.5)
+            status = self.run_sequence([{'direction': 'right', 'duration': 2.8},  # Full left to full right
+                                        {'direction': 'stop', 'duration': 0.5}], 'horizontal line: look right')
+            if status is None or status['state'] != 'done':
+                print("Horizontal line sequence interrupted")
+                return
 
-            # Check if there's a vertical path on the right
-            right_path_valid = self.check_vertical_path()
-
-            if right_path_valid:
+            if self.check_vertical_path():
                 print("Valid vertical path found on the right")
-                # Move forward on this path
-                self.post_direction('forward')
-                time.sleep(1.2)
+                steps = [{'direction': 'forward', 'duration': 1.2}]
             else:
-                # No path found on either side, return to center
+                # No path found on either side, return to center and move forward from there
                 print("No vertical paths found, returning to center")
-                self.post_direction('left')
-                time.sleep(1.4)  # Turn from right to center
-
-                # Move forward from center
-                self.post_direction('stop')
-                time.sleep(0.3)
-                self.post_direction('forward')
-                time.sleep(1.2)
+                steps = [{'direction': 'left', 'duration': 1.4},  # Turn from right to center
+                         {'direction': 'stop', 'duration': 0.3},
+                         {'direction': 'forward', 'duration': 1.2}]
 
         # Final stop at the end of sequence
-        self.post_direction('stop')
-        time.sleep(0.5)
+        steps.append({'direction': 'stop', 'duration': 0.5})
+        status = self.run_sequence(steps, 'horizontal line: go')
 
         # Resume normal forward movement if automation is still active
-        if self.automation_active:
+        if status is not None and status['state'] == 'done' and self.automation_active:
             self.post_direction('forward')
 
+    # Upload a motion program to the pi and wait for it to end, cancelling it if the threads stop
+    def run_sequence(self, steps, name=None):
+        try:
+            status = self.client.run_sequence(steps, name)
+            program_id = status['id']
+            while status['state'] == 'running':
+                if self.stop_event.is_set():
+                    self.client.cancel_sequence()
+                    return None
+                status = self.client.get_sequence(wait=0.5)
+                if status is None or status['id'] != program_id:
+                    return None  # replaced by another program
+            return status
+        except Exception as e:
+            print(f'Error running sequence {name}: {e}')
+            return None
+
     # Send movement command to robot API and manage command logging
-    def post_direction(self, direction):
+    def post_direction(self, direction, duration=None):
         try:
             # Only log if direction changed
             if self.last_command != direction:
@@ -496,9 +733,7 @@ class Automation:
                 self.last_command = direction
 
             # Send command to robot
-            endpoint = url + 'moving'
-            data = {'direction': direction}
-            req = requests.post(endpoint, json=data)
+            self.client.move(direction, duration)
 
             # If stopping, clear the movement queue
             if direction == 'stop' and not self.is_executing_sequence:
@@ -524,4 +759,6 @@ class Automation:
         print("Stopping all threads...")
         self.stop_automation()
         self.stop_event.set()
+        self.frame_slot.close()
+        self.display_slot.close()
 
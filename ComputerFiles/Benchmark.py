@@ -0,0 +1,604 @@
+"""
+FUNCTIONS:
+1. load_frames(frame_dir, limit)
+   INPUT: frame_dir (string directory of recorded .jpg/.png frames), limit (int, optional)
+   OUTPUT: List of OpenCV BGR frames
+   SUMMARY: Reads recorded frames from disk in file name order
+
+2. synthetic_martian_frames(ref_path, count, seed)
+   INPUT: ref_path (string reference image), count (int), seed (int)
+   OUTPUT: List of 400x300 BGR frames
+   SUMMARY: Pastes the martian reference at random sizes and positions onto noisy backgrounds
+
+3. mutual_matches_loop(matches1to2, matches2to1, ratio)
+   INPUT: matches1to2, matches2to1 (knnMatch output with k=2), ratio (float)
+   OUTPUT: List of DMatch objects that pass the ratio test both ways
+   SUMMARY: The original nested-loop cross check, kept here as the baseline to compare against
+
+4. time_call(func, repeat)
+   INPUT: func (function with no arguments), repeat (int)
+   OUTPUT: Average seconds per call
+   SUMMARY: Times a function over several repeats with the performance counter
+
+5. bench_matching(frames, detector, repeat)
+   INPUT: frames (list of BGR frames), detector (MartianDetector), repeat (int)
+   OUTPUT: dict with per-frame loop time, vectorized time, speedup and match agreement
+   SUMMARY: Runs the old knnMatch + nested loop path and the new array path on the same descriptors
+
+6. bench_preprocess(frames, repeat)
+   INPUT: frames (list of BGR frames), repeat (int)
+   OUTPUT: dict with per-frame time of both paths and the speedup
+   SUMMARY: Times bluescale_mask against hsv_mask(bluescale(frame)); tests/test_processing.py checks they agree
+
+7. bench_parallel(frames, ref_path, workers, split)
+   INPUT: frames (list of BGR frames), ref_path (string), workers (int processes), split (bool)
+   OUTPUT: dict with serial fps, parallel fps, speedup and whether results came back in order and agreed
+   SUMMARY: Runs Processing.analyze on one thread, then through a ParallelAnalyzer, on the same frames
+
+8. track_frames(count, ref_path, seed)
+   INPUT: count (int), ref_path (string martian reference, its frames are skipped if unreadable), seed (int)
+   OUTPUT: List of 400x300 BGR frames
+   SUMMARY: Draws track images in turn with a horizontal line, a vertical lane, bare floor and a martian
+
+9. save_frames(frames, frame_dir)
+    INPUT: frames (list of BGR frames), frame_dir (string directory, created if missing)
+    OUTPUT: None
+    SUMMARY: Writes frames as numbered lossless PNGs that load_frames reads back in the same order
+
+10. stage_inputs(frame)
+    INPUT: frame (OpenCV BGR image)
+    OUTPUT: dict with frame, blurred, blue, masked and closed images, and band_closed (the closed horizontal band)
+    SUMMARY: Runs the preprocessing chain once so every stage is timed on the input it really gets
+
+11. pipeline_stages(detector, movement_queue)
+    INPUT: detector (MartianDetector), movement_queue (queue apply_overlay fills)
+    OUTPUT: dict of stage name -> function taking a stage_inputs dict
+    SUMMARY: Lists the Processing stages the suite measures, in pipeline order, ending with the whole pipeline
+
+12. measure_allocations(func, inputs)
+    INPUT: func (stage function), inputs (list of stage_inputs dicts)
+    OUTPUT: dict with mean peak and mean retained KiB per call
+    SUMMARY: Measures the memory a stage allocates with tracemalloc, outside the timed runs
+
+13. bench_stages(frames, detector, repeat, runs)
+    INPUT: frames (list of BGR frames), detector (MartianDetector), repeat (int calls per frame per run),
+           runs (int passes over every stage, default 5)
+    OUTPUT: dict of stage name -> calls, calls_per_run, mean_ms, p50_ms, p99_ms, runs (the per-run values of
+            the three), peak_kb, retained_kb
+    SUMMARY: Times every call of every stage separately; each time metric is the median of its per-run values,
+             so one noisy run can't move it
+
+14. environment_info()
+    INPUT: None
+    OUTPUT: dict with python, platform, cpu count, numpy and opencv versions
+    SUMMARY: Records where a result was produced so baselines are only trusted like for like
+
+15. compare_stages(stages, baseline, max_slowdown, max_p99_slowdown, max_alloc_growth, min_ms)
+    INPUT: stages (bench_stages result), baseline (earlier saved report), max_slowdown (fraction the mean
+           and p50 may grow), max_p99_slowdown (fraction p99 may grow), max_alloc_growth (fraction peak
+           allocation may grow), min_ms (time differences below this are ignored as noise)
+    OUTPUT: List of regression messages, empty if everything is within its threshold
+    SUMMARY: Checks each stage against the baseline and prints the change of every metric; a time only fails if
+             it also grew by more than min_ms, and p99 only with at least min_p99_calls calls per run
+
+16. main()
+    INPUT: Command line arguments
+    OUTPUT: None (prints a report, exits nonzero if a regression check fails)
+    SUMMARY: Picks recorded or synthetic frames and runs the requested benchmark
+
+17. reference_image(path)
+    INPUT: path (string file to write)
+    OUTPUT: path
+    SUMMARY: Draws a feature-rich stand-in martian reference, for the stages benchmark when ref_marvin.jpeg
+             (not in the repo) can't be read
+
+OFFLINE CLIENT (OfflineClient class):
+Stands in for RoverClient while stages are benchmarked, so martian_detection and apply_overlay
+record the stop commands they send instead of reaching for a rover.
+
+USAGE (from ComputerFiles/):
+    python Benchmark.py matching --frames path/to/recorded_frames
+    python Benchmark.py matching --synthetic 50
+    python Benchmark.py preprocess --frames path/to/recorded_frames
+    python Benchmark.py parallel --synthetic 200 --workers 4
+    python Benchmark.py stages --synthetic 40 --save-frames corpus --save-baseline stages.json
+    python Benchmark.py stages --frames corpus --baseline stages.json --max-slowdown 0.2
+    python Benchmark.py stages --frames corpus --runs 9 --baseline stages.json
+Without --frames, the stages benchmark uses track_frames rather than synthetic_martian_frames, and it
+falls back to reference_image if --ref can't be read.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import queue
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import Processing
+import ParallelProcessing
+import RoverClient
+
+# Read recorded frames from disk in file name order
+def load_frames(frame_dir, limit=None):
+    names = sorted(name for name in os.listdir(frame_dir) if name.lower().endswith(('.jpg', '.jpeg', '.png')))
+    if limit:
+        names = names[:limit]
+
+    frames = []
+    for name in names:
+        frame = cv2.imread(os.path.join(frame_dir, name), cv2.IMREAD_COLOR)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+# Paste the martian reference at random sizes and positions onto noisy backgrounds
+def synthetic_martian_frames(ref_path='ref_marvin.jpeg', count=50, seed=0):
+    ref = cv2.imread(ref_path, cv2.IMREAD_COLOR)
+    if ref is None:
+        raise FileNotFoundError(f'could not read martian reference image {ref_path}')
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+        frame = cv2.GaussianBlur(frame, (15, 15), 0)
+
+        size = int(rng.integers(60, 200))
+        scaled = cv2.resize(ref, (size, size * ref.shape[0] // ref.shape[1]))
+        h, w = min(scaled.shape[0], 300), min(scaled.shape[1], 400)
+        y = int(rng.integers(0, 300 - h + 1))
+        x = int(rng.integers(0, 400 - w + 1))
+        frame[y:y + h, x:x + w] = scaled[:h, :w]
+        frames.append(frame)
+    return frames
+
+# The original nested-loop cross check, kept here as the baseline to compare against
+def mutual_matches_loop(matches1to2, matches2to1, ratio=0.7):
+    good_matches1to2 = []
+    for match in matches1to2:
+        if len(match) == 2:
+            m, n = match
+            if m.distance < ratio * n.distance:
+                good_matches1to2.append(m)
+
+    good_matches2to1 = []
+    for match in matches2to1:
+        if len(match) == 2:
+            m, n = match
+            if m.distance < ratio * n.distance:
+                good_matches2to1.append(m)
+
+    good_matches = []
+    for m in good_matches1to2:
+        for n in good_matches2to1:
+            if m.queryIdx == n.trainIdx and m.trainIdx == n.queryIdx:
+                good_matches.append(m)
+                break
+    return good_matches
+
+# Time a function over several repeats with the performance counter
+def time_call(func, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+# Run the old knnMatch + nested loop path and the new array path on the same descriptors
+def bench_matching(frames, detector, repeat=20):
+    loop_times = []
+    vector_times = []
+    loop_filter_times = []
+    vector_filter_times = []
+    loop_total = 0
+    vector_total = 0
+    common_total = 0
+    matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)  # what MartianDetector matched with before
+
+    for frame in frames:
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 9), 0)
+        _, descriptors_frame = detector.orb.detectAndCompute(gray, None)
+        if descriptors_frame is None or len(descriptors_frame) < 2:
+            continue
+        descriptors_ref = detector.descriptors_ref
+
+        def loop_path():
+            matches1to2 = matcher.knnMatch(descriptors_ref, descriptors_frame, k=2)
+            matches2to1 = matcher.knnMatch(descriptors_frame, descriptors_ref, k=2)
+            return mutual_matches_loop(matches1to2, matches2to1, detector.ratio)
+
+        def vector_path():
+            forward = Processing.knn_arrays(descriptors_ref, descriptors_frame)
+            backward = Processing.knn_arrays(descriptors_frame, descriptors_ref)
+            return Processing.mutual_matches(forward, backward, detector.ratio)
+
+        # tie-breaking between equally distant neighbours can differ, so count overlap
+        loop_pairs = set((m.queryIdx, m.trainIdx) for m in loop_path())
+        ref_idx, frame_idx, _ = vector_path()
+        vector_pairs = set(zip(ref_idx.tolist(), frame_idx.tolist()))
+        loop_total += len(loop_pairs)
+        vector_total += len(vector_pairs)
+        common_total += len(loop_pairs & vector_pairs)
+
+        loop_times.append(time_call(loop_path, repeat))
+        vector_times.append(time_call(vector_path, repeat))
+
+        # the filtering step alone, with the nearest neighbour search already done
+        matches1to2 = matcher.knnMatch(descriptors_ref, descriptors_frame, k=2)
+        matches2to1 = matcher.knnMatch(descriptors_frame, descriptors_ref, k=2)
+        forward = Processing.knn_arrays(descriptors_ref, descriptors_frame)
+        backward = Processing.knn_arrays(descriptors_frame, descriptors_ref)
+        loop_filter_times.append(time_call(lambda: mutual_matches_loop(matches1to2, matches2to1, detector.ratio), repeat))
+        vector_filter_times.append(time_call(lambda: Processing.mutual_matches(forward, backward, detector.ratio), repeat))
+
+    if not loop_times:
+        return None
+    loop_ms = 1000 * float(np.mean(loop_times))
+    vector_ms = 1000 * float(np.mean(vector_times))
+    loop_filter_ms = 1000 * float(np.mean(loop_filter_times))
+    vector_filter_ms = 1000 * float(np.mean(vector_filter_times))
+    return {'frames': len(loop_times),
+            'loop_ms': loop_ms,
+            'vectorized_ms': vector_ms,
+            'speedup': loop_ms / vector_ms if vector_ms > 0 else float('inf'),
+            'loop_filter_ms': loop_filter_ms,
+            'vectorized_filter_ms': vector_filter_ms,
+            'filter_speedup': loop_filter_ms / vector_filter_ms if vector_filter_ms > 0 else float('inf'),
+            'loop_matches': loop_total,
+            'vectorized_matches': vector_total,
+            'common_matches': common_total}
+
+# Time bluescale_mask against hsv_mask(bluescale(frame))
+def bench_preprocess(frames, repeat=20):
+    original_times = []
+    fused_times = []
+
+    for frame in frames:
+        # match what FrameAnalysis feeds the stage
+        blurred = cv2.GaussianBlur(frame, (9, 9), 0)
+        original_times.append(time_call(lambda: Processing.hsv_mask(Processing.bluescale(blurred)), repeat))
+        fused_times.append(time_call(lambda: Processing.bluescale_mask(blurred), repeat))
+
+    original_ms = 1000 * float(np.mean(original_times))
+    fused_ms = 1000 * float(np.mean(fused_times))
+    return {'frames': len(frames),
+            'original_ms': original_ms,
+            'fused_ms': fused_ms,
+            'speedup': original_ms / fused_ms if fused_ms > 0 else float('inf')}
+
+# Run Processing.analyze on one thread, then through a ParallelAnalyzer, on the same frames
+def bench_parallel(frames, ref_path='ref_marvin.jpeg', workers=4, split=True):
+    detector = Processing.MartianDetector(ref_path)
+    start = time.perf_counter()
+    serial = [Processing.analyze(frame, detector)['line_type'] for frame in frames]
+    serial_seconds = time.perf_counter() - start
+
+    received = []
+    analyzer = ParallelProcessing.ParallelAnalyzer(lambda frame_id, frame, result: received.append(
+        (frame_id, result['line_type'])), workers=workers, split=split, ref_path=ref_path)
+    try:
+        # one untimed frame per worker so process start-up and reference loading are not counted
+        for frame_id in range(workers):
+            analyzer.wait_ready()
+            analyzer.submit(frame_id, frames[0])
+        while len(received) < workers:
+            time.sleep(0.01)
+        received.clear()
+
+        start = time.perf_counter()
+        for frame_id, frame in enumerate(frames, start=workers):
+            analyzer.wait_ready()
+            analyzer.submit(frame_id, frame)
+        while len(received) < len(frames):
+            time.sleep(0.001)
+        parallel_seconds = time.perf_counter() - start
+    finally:
+        analyzer.close()
+
+    ids = [frame_id for frame_id, _ in received]
+    return {'frames': len(frames),
+            'serial_fps': len(frames) / serial_seconds,
+            'parallel_fps': len(frames) / parallel_seconds,
+            'speedup': serial_seconds / parallel_seconds,
+            'in_order': ids == sorted(ids),
+            'agree': [line_type for _, line_type in received] == serial}
+
+# Draw track images in turn with a horizontal line, a vertical lane, bare floor and a martian
+def track_frames(count=40, ref_path='ref_marvin.jpeg', seed=0):
+    rng = np.random.default_rng(seed)
+    ref = cv2.imread(ref_path, cv2.IMREAD_COLOR)
+    kinds = ['horizontal', 'vertical', 'floor'] + (['martian'] if ref is not None else [])
+
+    frames = []
+    for index in range(count):
+        kind = kinds[index % len(kinds)]
+        # dull, textured floor that stays below the mask's brightness cut
+        floor = rng.normal((70, 80, 95), 18, (300, 400, 3))
+        frame = cv2.GaussianBlur(np.clip(floor, 0, 255).astype(np.uint8), (7, 7), 0)
+        tape = tuple(int(v) for v in rng.integers(215, 250, 3))
+
+        if kind == 'horizontal':
+            # the line crosses the band the horizontal check looks at, with a slight tilt
+            y = int(rng.integers(138, 162))
+            tilt = int(rng.integers(-6, 7))
+            cv2.line(frame, (0, y - tilt), (399, y + tilt), tape, int(rng.integers(6, 11)))
+        elif kind == 'vertical':
+            # two lane edges narrowing towards the top of the frame, as the camera sees them
+            left, right = int(rng.integers(40, 90)), int(rng.integers(310, 360))
+            narrowing = int(rng.integers(60, 100))
+            thickness = int(rng.integers(6, 11))
+            cv2.line(frame, (left, 299), (left + narrowing, 0), tape, thickness)
+            cv2.line(frame, (right, 299), (right - narrowing, 0), tape, thickness)
+        elif kind == 'martian':
+            size = int(rng.integers(100, 200))
+            scaled = cv2.resize(ref, (size, size * ref.shape[0] // ref.shape[1]))
+            h, w = min(scaled.shape[0], 300), min(scaled.shape[1], 400)
+            y = int(rng.integers(0, 300 - h + 1))
+            x = int(rng.integers(0, 400 - w + 1))
+            frame[y:y + h, x:x + w] = scaled[:h, :w]
+        frames.append(frame)
+    return frames
+
+# Write frames as numbered lossless PNGs that load_frames reads back in the same order
+def save_frames(frames, frame_dir):
+    os.makedirs(frame_dir, exist_ok=True)
+    for index, frame in enumerate(frames):
+        cv2.imwrite(os.path.join(frame_dir, f'frame_{index:05d}.png'), frame)
+
+class OfflineClient:
+    # Stand in for RoverClient so benchmarked stages never reach for a rover
+    def __init__(self):
+        self.moves = []
+
+    def move(self, direction, duration=None):
+        self.moves.append(direction)
+        return None
+
+# Run the preprocessing chain once so every stage is timed on the input it really gets
+def stage_inputs(frame):
+    blurred = Processing.apply_gaussian_blur(frame)
+    blue = Processing.bluescale(blurred)
+    masked = Processing.hsv_mask(blue)
+    closed = Processing.closing(masked, frame)
+    # apply_overlay only runs horizontal detection on the band
+    band_closed = Processing.FrameAnalysis(frame).closed(*Processing.band_rows(frame.shape[0]))
+    return {'frame': frame, 'blurred': blurred, 'blue': blue, 'masked': masked, 'closed': closed,
+            'band_closed': band_closed}
+
+# List the Processing stages the suite measures, in pipeline order, ending with the whole pipeline
+def pipeline_stages(detector, movement_queue):
+    # martian_detection draws on the frame it is given, so it gets a copy like apply_overlay's callers pass
+    return {'martian_detection': lambda inputs: Processing.martian_detection(inputs['frame'].copy(), detector),
+            'apply_gaussian_blur': lambda inputs: Processing.apply_gaussian_blur(inputs['frame']),
+            'bluescale': lambda inputs: Processing.bluescale(inputs['blurred']),
+            'hsv_mask': lambda inputs: Processing.hsv_mask(inputs['blue']),
+            'bluescale_mask': lambda inputs: Processing.bluescale_mask(inputs['blurred']),
+            'closing': lambda inputs: Processing.closing(inputs['masked'], inputs['frame']),
+            'horizontal_detection': lambda inputs: Processing.horizontal_detection(inputs['band_closed']),
+            'vertical_detection': lambda inputs: Processing.vertical_detection(inputs['closed']),
+            'apply_overlay': lambda inputs: Processing.apply_overlay(inputs['frame'], movement_queue, detector)}
+
+# Measure the memory a stage allocates with tracemalloc, outside the timed runs
+def measure_allocations(func, inputs):
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for stage_input in inputs:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            result = func(stage_input)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)  # what the stage hands back, since result is still held
+            del result
+    finally:
+        tracemalloc.stop()
+    return {'peak_kb': float(np.mean(peaks)) / 1024, 'retained_kb': float(np.mean(retained)) / 1024}
+
+# Time every call of every stage separately and summarise each stage by its median over several runs
+def bench_stages(frames, detector, repeat=20, runs=5):
+    inputs = [stage_inputs(frame) for frame in frames]
+    movement_queue = queue.Queue()
+    stages = pipeline_stages(detector, movement_queue)
+
+    run_times = {name: [] for name in stages}
+    # the stages print per frame; that is their cost too, but it shouldn't flood the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for func in stages.values():
+            func(inputs[0])  # builds per-width lookup tables and warms caches before timing
+
+        # each run passes over every stage, so a burst of background load spoils one run of a stage, not all of them
+        for _ in range(runs):
+            for name, func in stages.items():
+                times = []
+                for stage_input in inputs:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        func(stage_input)
+                        times.append(time.perf_counter() - start)
+                    while not movement_queue.empty():
+                        movement_queue.get_nowait()
+                run_times[name].append(1000 * np.array(times))
+
+        results = {}
+        for name, func in stages.items():
+            times_ms = run_times[name]
+            per_run = {'mean_ms': [float(times.mean()) for times in times_ms],
+                       'p50_ms': [float(np.percentile(times, 50)) for times in times_ms],
+                       'p99_ms': [float(np.percentile(times, 99)) for times in times_ms]}
+            results[name] = {'calls': sum(len(times) for times in times_ms),
+                             'calls_per_run': len(times_ms[0]),
+                             'runs': per_run}
+            for metric in ('mean_ms', 'p50_ms', 'p99_ms'):
+                results[name][metric] = float(np.median(per_run[metric]))
+            results[name].update(measure_allocations(func, inputs))
+    return results
+
+# Record where a result was produced so baselines are only trusted like for like
+def environment_info():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__}
+
+min_p99_calls = 200  # fewer calls per run than this and p99 is too noisy to fail on
+
+# Check each stage against the baseline and print the change of every metric
+def compare_stages(stages, baseline, max_slowdown=0.25, max_p99_slowdown=0.5, max_alloc_growth=0.1, min_ms=0.1):
+    limits = [('mean_ms', max_slowdown), ('p50_ms', max_slowdown), ('p99_ms', max_p99_slowdown),
+              ('peak_kb', max_alloc_growth)]
+    failures = []
+    print(f"{'stage':<22} {'metric':<8} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, result in stages.items():
+        before = baseline['stages'].get(name)
+        if before is None:
+            print(f'{name:<22} not in baseline')
+            continue
+        for metric, limit in limits:
+            old, new = before[metric], result[metric]
+            change = (new - old) / old if old > 0 else 0.0
+            # tiny stages jitter by more than a fraction of themselves, so small absolute changes never fail
+            noise = min_ms if metric.endswith('_ms') else 1.0
+            failed = change > limit and new - old > noise
+            if metric == 'p99_ms' and result['calls_per_run'] < min_p99_calls:
+                failed = False  # a p99 of a few dozen calls is just the slowest of them
+            flag = '  REGRESSION' if failed else ''
+            print(f'{name:<22} {metric:<8} {old:>10.3f} {new:>10.3f} {100 * change:>7.1f}%{flag}')
+            if failed:
+                failures.append(f'{name} {metric} grew {100 * change:.0f}% (limit {100 * limit:.0f}%)')
+    return failures
+
+# Draw a feature-rich stand-in martian reference for when ref_marvin.jpeg can't be read
+def reference_image(path):
+    rng = np.random.default_rng(1)
+    image = np.full((200, 200, 3), 255, dtype=np.uint8)
+    for _ in range(40):
+        x, y = (int(v) for v in rng.integers(10, 190, 2))
+        colour = tuple(int(v) for v in rng.integers(0, 200, 3))
+        if rng.random() < 0.5:
+            cv2.circle(image, (x, y), int(rng.integers(4, 20)), colour, -1)
+        else:
+            cv2.rectangle(image, (x, y), (x + int(rng.integers(5, 30)), y + int(rng.integers(5, 30))), colour, -1)
+    cv2.imwrite(path, image)
+    return path
+
+# Pick recorded or synthetic frames and run the requested benchmark
+def main():
+    parser = argparse.ArgumentParser(description='computer-side vision benchmarks')
+    parser.add_argument('benchmark', choices=['matching', 'preprocess', 'parallel', 'stages'])
+    parser.add_argument('--frames', help='directory of recorded frames')
+    parser.add_argument('--synthetic', type=int, default=50, help='number of generated frames if --frames is not given')
+    parser.add_argument('--limit', type=int, help='only use the first N recorded frames')
+    parser.add_argument('--ref', default='ref_marvin.jpeg', help='martian reference image')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=5, help='stages: passes over every stage, medians are reported')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes for parallel')
+    parser.add_argument('--no-split', action='store_true', help='run martian and line detection as one task')
+    parser.add_argument('--save-frames', help='also write the frames used to this directory as a corpus')
+    parser.add_argument('--baseline', help='stages: earlier --save-baseline report to check against')
+    parser.add_argument('--save-baseline', help='stages: write this run as a baseline report')
+    parser.add_argument('--max-slowdown', type=float, default=0.25, help='stages: allowed mean/p50 growth')
+    parser.add_argument('--max-p99-slowdown', type=float, default=0.5, help='stages: allowed p99 growth')
+    parser.add_argument('--max-alloc-growth', type=float, default=0.1, help='stages: allowed peak allocation growth')
+    parser.add_argument('--min-ms', type=float, default=0.1, help='stages: time changes below this never fail')
+    args = parser.parse_args()
+
+    ref_path = args.ref
+    if args.benchmark == 'stages' and cv2.imread(args.ref, cv2.IMREAD_COLOR) is None:
+        # keeps martian frames and the martian stages in the suite on a checkout without the reference
+        ref_path = reference_image(os.path.join(tempfile.mkdtemp(prefix='rover-stages-'), 'ref.png'))
+        print(f'could not read {args.ref}, using a generated martian reference')
+
+    if args.frames:
+        frames = load_frames(args.frames, args.limit)
+    elif args.benchmark == 'stages':
+        frames = track_frames(args.synthetic, ref_path)
+    else:
+        frames = synthetic_martian_frames(args.ref, args.synthetic)
+    print(f'{len(frames)} frames')
+    if args.save_frames:
+        save_frames(frames, args.save_frames)
+
+    if args.benchmark == 'matching':
+        # a large orb budget gives the cross check the keypoint counts textured floors produce
+        detector = Processing.MartianDetector(args.ref)
+        detector.orb.setMaxFeatures(1000)
+        detector.load_reference()
+        result = bench_matching(frames, detector, args.repeat)
+        if result is None:
+            print('no frame produced descriptors')
+            return
+        print(f"knn + nested loop:  {result['loop_ms']:.3f} ms/frame")
+        print(f"knn + vectorized:   {result['vectorized_ms']:.3f} ms/frame")
+        print(f"speedup:            {result['speedup']:.1f}x over {result['frames']} frames")
+        print(f"filter only:        {result['loop_filter_ms']:.3f} ms loop, {result['vectorized_filter_ms']:.3f} ms "
+              f"vectorized ({result['filter_speedup']:.1f}x)")
+        print(f"matches:            {result['loop_matches']} loop, {result['vectorized_matches']} vectorized, "
+              f"{result['common_matches']} in common")
+
+    elif args.benchmark == 'preprocess':
+        # the lookup table is built once per frame width, so keep that out of the timings
+        for frame in frames:
+            Processing.bluescale_mask(frame)
+        result = bench_preprocess(frames, args.repeat)
+        print(f"bluescale + hsv_mask: {result['original_ms']:.3f} ms/frame")
+        print(f"bluescale_mask:       {result['fused_ms']:.3f} ms/frame")
+        print(f"speedup:              {result['speedup']:.1f}x over {result['frames']} frames")
+
+    elif args.benchmark == 'parallel':
+        result = bench_parallel(frames, args.ref, args.workers, not args.no_split)
+        print(f"one thread:        {result['serial_fps']:.1f} frames/s")
+        print(f"{args.workers} worker processes: {result['parallel_fps']:.1f} frames/s ({result['speedup']:.1f}x)")
+        print(f"results in order:  {result['in_order']}, same line types: {result['agree']}")
+        if not (result['in_order'] and result['agree']):
+            sys.exit(1)
+
+    elif args.benchmark == 'stages':
+        # martian_detection and apply_overlay send stop commands, so keep them off the network
+        RoverClient.shared_client = OfflineClient()
+        detector = Processing.MartianDetector(ref_path)
+        stages = bench_stages(frames, detector, args.repeat, args.runs)
+
+        print(f"{'stage':<22} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>10} {'kept KiB':>10}")
+        for name, result in stages.items():
+            print(f"{name:<22} {result['mean_ms']:>9.3f} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+                  f"{result['peak_kb']:>10.1f} {result['retained_kb']:>10.1f}")
+        line_types = [Processing.analyze(frame, detector)['line_type'] for frame in frames]
+        print('line types: ' + ', '.join(f'{kind}: {line_types.count(kind)}' for kind in
+                                          ('horizontal', 'vertical', None)))
+
+        report = {'settings': {'frames': args.frames or 'track_frames', 'count': len(frames), 'repeat': args.repeat,
+                               'runs': args.runs, 'ref': args.ref if ref_path == args.ref else 'generated'},
+                  'environment': environment_info(),
+                  'stages': stages}
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get('settings') != report['settings']:
+                # different frames or call counts move every number, so the check would be meaningless
+                print(f"baseline settings {baseline.get('settings')} differ from this run's {report['settings']}, "
+                      f"not comparing")
+                sys.exit(2)
+            if baseline.get('environment') != report['environment']:
+                print('note: baseline was produced in a different environment')
+            failures = compare_stages(stages, baseline, args.max_slowdown, args.max_p99_slowdown,
+                                      args.max_alloc_growth, args.min_ms)
+            for failure in failures:
+                print(f'regression: {failure}')
+            if failures:
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -28,12 +28,13 @@ FUNCTIONS:
 6. play_button()
    INPUT: None
    OUTPUT: None
-   SUMMARY: Initializes automation system and starts video/movement threads
+   SUMMARY: Initializes automation system and starts video/movement threads; with ROVER_RECORD set to a
+            directory, the session is recorded there for Recording.py to replay
 
 7. stop_button_handler()
    INPUT: None
    OUTPUT: None
-   SUMMARY: Stops automation threads and sends stop command to robot
+   SUMMARY: Stops automation threads, sends stop command to robot and flushes the recording if there is one
 
 8. create_robot_gui()
    INPUT: None
@@ -59,6 +60,21 @@ FUNCTIONS:
     INPUT: None
     OUTPUT: None
     SUMMARY: Creates Tkinter root window and starts main GUI application loop
+
+13. open_stats()
+    INPUT: None
+    OUTPUT: None
+    SUMMARY: Opens the stats window with this process's timers and the Pi's /metrics, refreshed every second
+
+14. refresh_stats()
+    INPUT: None (runs on the Tk main loop via after())
+    OUTPUT: None
+    SUMMARY: Redraws the stats window from Metrics and the last Pi reading, then schedules itself again
+
+15. fetch_pi_metrics()
+    INPUT: None (runs on its own thread)
+    OUTPUT: None
+    SUMMARY: Reads /metrics off the Tk thread so a slow or missing Pi never freezes the window
 """
 
 from tkinter import *
@@ -72,13 +88,12 @@ from threading import Thread
 import cv2
 import numpy as np
 import Database
-import requests
+import Metrics
+import RoverClient
 from tkinter import messagebox
-import base64
 from datetime import datetime
 import Automation
-
-url = 'http://192.168.240.22:5000/'
+import Recording
 
 class GUI:
     # Initialize main GUI window, database object, and launch login page
@@ -87,6 +102,10 @@ class GUI:
         self.root.title('user login')
         self.root.geometry('320x150')
         self.database = Database.Database()
+        self.client = RoverClient.get_client()
+        self.stats_window = None
+        self.pi_metrics = None  # last /metrics reply, or the error from the last attempt
+        self.fetching_metrics = False
  
         self.setup_login_page()
 
@@ -160,9 +179,7 @@ class GUI:
     # Send movement command to robot API and log the action
     def post_direction(self, direction):
         try:
-            endpoint = url + 'moving'
-            data = {'direction': direction}
-            req = requests.post(endpoint, json=data)
+            self.client.move(direction)
             print('command sent successfully')
             self.logging(direction)
         except:
@@ -170,7 +187,11 @@ class GUI:
 
     # Initialize automation system and start video/movement threads
     def play_button(self):
-        self.automation = Automation.Automation(self.stream_elem, self.overlay_elem)
+        # ROVER_CV_WORKERS > 0 moves frame analysis into that many worker processes
+        cv_workers = int(os.environ.get('ROVER_CV_WORKERS', '0'))
+        if os.environ.get('ROVER_RECORD') and self.client.recorder is None:
+            self.client.recorder = Recording.Recorder(os.environ['ROVER_RECORD'])
+        self.automation = Automation.Automation(self.stream_elem, self.overlay_elem, cv_workers)
         self.video_thread, self.movement_thread = self.automation.start_threads()
 
     # Stop automation threads and send stop command to robot
@@ -181,6 +202,8 @@ class GUI:
             self.post_direction('stop')
         else:
             self.post_direction('stop')
+        if self.client.recorder is not None:
+            self.client.recorder.flush()
 
     # Create main robot control interface with video streams, control buttons, and logging
     def create_robot_gui(self):
@@ -209,6 +232,9 @@ class GUI:
         log_button = Button(log_panel, text='open log file', command=self.open_log_file, font=custom_font, padx=5, pady=7)
         log_button.grid(row=2, padx=4, pady=5, ipadx=5, ipady=5)
 
+        stats_button = Button(log_panel, text='stats', command=self.open_stats, font=custom_font, padx=5, pady=7)
+        stats_button.grid(row=3, padx=4, pady=5, ipadx=5, ipady=5)
+
         black_img = np.zeros((300, 400, 3), dtype=np.uint8)
         black_img = ImageTk.PhotoImage(Image.fromarray(black_img))
 
@@ -263,9 +289,7 @@ class GUI:
     # Retrieve timestamp from API, log command to file and text area
     def logging(self, direction):
         try:
-            endpoint = url + 'logging'
-            log = requests.get(endpoint)
-            log = log.json()
+            log = self.client.get_log()
             log_str = f"{log['Timestamp']} - {self.username}@{log['IP Address']} sent the command: {direction}\n"
             with open("system_log.txt", 'a') as file:
                 file.write(log_str)
@@ -287,6 +311,54 @@ class GUI:
             open(file_path, 'w').close()
         subprocess.call(('open', file_path))
 
+    # Open the stats window with this process's timers and the Pi's /metrics, refreshed every second
+    def open_stats(self):
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        self.stats_window = Toplevel()
+        self.stats_window.title('stats')
+        self.stats_text = ScrolledText(self.stats_window, width=100, height=45, font=('Courier', 11))
+        self.stats_text.pack(fill=BOTH, expand=True)
+        self.stats_text.config(state='disabled')
+        self.refresh_stats()
+
+    # Redraw the stats window from Metrics and the last Pi reading, then schedule itself again
+    def refresh_stats(self):
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            self.stats_window = None
+            return
+        if not self.fetching_metrics:
+            self.fetching_metrics = True
+            Thread(target=self.fetch_pi_metrics, daemon=True).start()
+
+        lines = Metrics.format_report(Metrics.snapshot(), 'computer')
+        pi_metrics = self.pi_metrics
+        if isinstance(pi_metrics, dict):
+            for name in ('api', 'video'):
+                if pi_metrics.get(name):
+                    lines += [''] + Metrics.format_report(pi_metrics[name], f'pi {name}')
+        elif pi_metrics is not None:
+            lines += ['', f'pi metrics unavailable: {pi_metrics}']
+
+        # keep the scroll position while the text is replaced
+        position = self.stats_text.yview()[0]
+        self.stats_text.config(state='normal')
+        self.stats_text.delete('1.0', END)
+        self.stats_text.insert(END, '\n'.join(lines))
+        self.stats_text.yview_moveto(position)
+        self.stats_text.config(state='disabled')
+        self.stats_window.after(1000, self.refresh_stats)
+
+    # Read /metrics off the Tk thread so a slow or missing Pi never freezes the window
+    def fetch_pi_metrics(self):
+        try:
+            self.pi_metrics = self.client.get_metrics()
+        except Exception as e:
+            self.pi_metrics = str(e)
+        finally:
+            self.fetching_metrics = False
+
     # Create Tkinter root window and start main GUI application loop
     @staticmethod
     def launch_guis():
@@ -0,0 +1,222 @@
+"""
+HISTOGRAM (Histogram class):
+1. __init__(name)
+   INPUT: name (string timer name)
+   OUTPUT: Empty Histogram object
+   SUMMARY: Log-spaced latency histogram, four buckets per doubling from 1 microsecond to about a minute
+
+2. observe(seconds)
+   INPUT: seconds (float duration)
+   OUTPUT: None
+   SUMMARY: Counts one duration in its bucket; a log2, a lock and a few adds, cheap enough for every frame
+
+3. snapshot()
+   INPUT: None
+   OUTPUT: dict with count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms, total_s and buckets (upper bound ms -> count)
+   SUMMARY: Reads the histogram; percentiles are bucket upper bounds, so within 19% of the true value
+
+METRICS REGISTRY (Registry class):
+1. __init__()
+   INPUT: None
+   OUTPUT: Empty Registry object
+   SUMMARY: Holds every named timer histogram and counter of one process
+
+2. histogram(name)
+   INPUT: name (string)
+   OUTPUT: Histogram object, created on first use
+   SUMMARY: Looks up a timer by name
+
+3. observe(name, seconds)
+   INPUT: name (string), seconds (float duration)
+   OUTPUT: None
+   SUMMARY: Records one duration in the named timer
+
+4. count(name, amount)
+   INPUT: name (string), amount (int, default 1)
+   OUTPUT: None
+   SUMMARY: Adds to the named counter
+
+5. snapshot()
+   INPUT: None
+   OUTPUT: dict with uptime_s, timers (name -> Histogram.snapshot) and counters (name -> int)
+   SUMMARY: Reads every timer and counter at once
+
+6. reset()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Forgets everything recorded so far, for measuring one run on its own
+
+MODULE FUNCTIONS:
+1. observe(name, seconds) / count(name, amount) / snapshot() / reset()
+   SUMMARY: The same calls on the process-wide registry, which is what the instrumented modules use
+
+2. save(path, data)
+   INPUT: path (string file), data (dict, default snapshot())
+   OUTPUT: None
+   SUMMARY: Writes a snapshot as JSON and swaps it into place, so a reader never sees half a file
+
+3. load(path)
+   INPUT: path (string file, optional)
+   OUTPUT: Snapshot dict or None if there is none
+   SUMMARY: Reads a snapshot another process saved
+
+4. format_report(data, title)
+   INPUT: data (snapshot dict), title (string first line, optional)
+   OUTPUT: List of text lines
+   SUMMARY: Lays out a snapshot as a table for a console or the GUI stats panel
+
+NAMES:
+Timers and counters are dotted names grouped by where they are recorded, e.g. video.encode, api.moving,
+client.decode, cv.martian, queue.movement. The same file is in RaspPiFiles/ and ComputerFiles/;
+keep the two copies identical.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+bucket_base = 1e-6  # upper bound of bucket 0 in seconds
+buckets_per_doubling = 4
+bucket_count = 104  # 2^(103/4) microseconds is about 57 seconds; anything longer lands in the last bucket
+
+class Histogram:
+    # Log-spaced latency histogram, four buckets per doubling from 1 microsecond to about a minute
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.buckets = [0] * bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    # Count one duration in its bucket
+    def observe(self, seconds):
+        if seconds > bucket_base:
+            index = min(int(math.ceil(buckets_per_doubling * math.log2(seconds / bucket_base))), bucket_count - 1)
+        else:
+            index = 0
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    # Read the histogram, with percentiles taken as bucket upper bounds
+    def snapshot(self):
+        with self.lock:
+            buckets = list(self.buckets)
+            count, total, largest = self.count, self.total, self.max
+
+        bounds_ms = [1000 * bucket_base * 2 ** (index / buckets_per_doubling) for index in range(bucket_count)]
+        result = {'count': count,
+                  'mean_ms': 1000 * total / count if count else 0.0,
+                  'max_ms': 1000 * largest,
+                  'total_s': total,
+                  'buckets': {f'{bounds_ms[index]:.4g}': value for index, value in enumerate(buckets) if value}}
+        for label, fraction in (('p50_ms', 0.50), ('p90_ms', 0.90), ('p99_ms', 0.99)):
+            value = 0.0
+            rank = fraction * count
+            seen = 0
+            for index, bucket in enumerate(buckets):
+                seen += bucket
+                if bucket and seen >= rank:
+                    # the largest value seen is a tighter bound than the top bucket's edge
+                    value = min(bounds_ms[index], 1000 * largest)
+                    break
+            result[label] = value
+        return result
+
+class Registry:
+    # Hold every named timer histogram and counter of one process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.monotonic()
+
+    # Look up a timer by name, creating it on first use
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(name))
+        return histogram
+
+    # Record one duration in the named timer
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    # Add to the named counter
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Read every timer and counter at once
+    def snapshot(self):
+        with self.lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+            started = self.started
+        return {'uptime_s': time.monotonic() - started,
+                'timers': {name: histograms[name].snapshot() for name in sorted(histograms)},
+                'counters': {name: counters[name] for name in sorted(counters)}}
+
+    # Forget everything recorded so far
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.monotonic()
+
+registry = Registry()
+
+# Record one duration in the named timer of the process-wide registry
+def observe(name, seconds):
+    registry.observe(name, seconds)
+
+# Add to the named counter of the process-wide registry
+def count(name, amount=1):
+    registry.count(name, amount)
+
+# Read every timer and counter of the process-wide registry
+def snapshot():
+    return registry.snapshot()
+
+# Forget everything the process-wide registry recorded so far
+def reset():
+    registry.reset()
+
+# Write a snapshot as JSON and swap it into place, so a reader never sees half a file
+def save(path, data=None):
+    if data is None:
+        data = snapshot()
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+# Read a snapshot another process saved
+def load(path):
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Lay out a snapshot as a table for a console or the GUI stats panel
+def format_report(data, title=None):
+    lines = []
+    if title:
+        lines.append(f"{title} (up {data['uptime_s']:.0f} s)")
+    lines.append(f"{'timer':<28} {'count':>7} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  ms")
+    for name, timer in data['timers'].items():
+        lines.append(f"{name:<28} {timer['count']:>7} {timer['mean_ms']:>8.2f} {timer['p50_ms']:>8.2f} "
+                     f"{timer['p90_ms']:>8.2f} {timer['p99_ms']:>8.2f} {timer['max_ms']:>8.2f}")
+    for name, value in data['counters'].items():
+        lines.append(f'{name:<28} {value:>7}')
+    return lines
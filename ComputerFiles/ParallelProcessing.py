@@ -0,0 +1,256 @@
+"""
+PARALLEL ANALYZER (ParallelAnalyzer class):
+1. __init__(on_result, workers, split, slot_count, max_frame_bytes, ref_path, band)
+   INPUT: on_result (function called as on_result(frame_id, frame, result) in frame id order),
+          workers (int worker processes, default one per core), split (bool, run martian and line detection
+          as separate tasks on the same frame, default True), slot_count (int frames in flight, default 2 per worker),
+          max_frame_bytes (int, default 640x480x3), ref_path (string martian reference image),
+          band (tuple fractions for the horizontal check, default Processing.horizontal_band)
+   OUTPUT: Initialized ParallelAnalyzer object with its worker processes started
+   SUMMARY: Runs Processing.analyze in a pool of worker processes so frame analysis can use every core
+
+2. wait_ready(timeout)
+   INPUT: timeout (float seconds, optional)
+   OUTPUT: Boolean (True if a shared memory slot is free)
+   SUMMARY: Blocks until another frame can be submitted, so the caller picks the newest frame only then
+
+3. submit(frame_id, frame)
+   INPUT: frame_id (int, increasing), frame (OpenCV BGR image)
+   OUTPUT: Boolean (False if every slot is busy or the frame is too large)
+   SUMMARY: Copies the frame into shared memory and hands it to the worker processes; if the pool refuses a
+            task the slot is given back and the error is raised
+
+4. submit_result(frame_id, frame, result)
+   INPUT: frame_id (int), frame (OpenCV image), result (analyze() style dict computed by the caller)
+   OUTPUT: None
+   SUMMARY: Puts a result that needed no worker into the same frame id ordering
+
+5. task_done(frame_id, part, future)
+   INPUT: frame_id (int), part (string 'martian', 'lines' or 'all'), future (finished Future)
+   OUTPUT: None
+   SUMMARY: Collects a worker result, merges split results and releases results in frame id order;
+            the time from submit to here is recorded as cv.worker_<part>
+
+6. release_ready()
+   INPUT: None (called without the lock held)
+   OUTPUT: None
+   SUMMARY: Hands finished frames at the front of the submission order to on_result, outside the lock so a
+            slow on_result never holds up task_done or submit_result
+
+7. free_slot(slot)
+   INPUT: slot (int)
+   OUTPUT: None
+   SUMMARY: Gives a slot back once every task reading it has finished
+
+8. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Stops the workers and frees the shared memory
+
+WORKER FUNCTIONS (run inside the pool processes):
+1. init_worker(shm_name, slot_bytes, ref_path, band)
+   INPUT: shm_name (string), slot_bytes (int), ref_path (string), band (tuple)
+   OUTPUT: None
+   SUMMARY: Attaches to the frame slots, loads the martian reference and builds the bluescale lookup table
+            once per worker
+
+2. slot_frame(slot, shape)
+   INPUT: slot (int), shape (tuple frame shape)
+   OUTPUT: Read-only numpy view of the frame in shared memory
+   SUMMARY: Reads a frame without copying it out of shared memory
+
+3. analyze_task(slot, shape)
+   INPUT: slot (int), shape (tuple)
+   OUTPUT: Processing.analyze() dict
+   SUMMARY: Runs martian and line detection one after the other on one frame
+
+4. martian_task(slot, shape)
+   INPUT: slot (int), shape (tuple)
+   OUTPUT: MartianDetector.score dict
+   SUMMARY: Runs martian detection only
+
+5. lines_task(slot, shape)
+   INPUT: slot (int), shape (tuple)
+   OUTPUT: Processing.detect_lines dict
+   SUMMARY: Runs line detection only
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+import numpy as np
+import Metrics
+import Processing
+
+# Worker process state, set once by init_worker
+worker_shm = None
+worker_slot_bytes = 0
+worker_detector = None
+worker_band = None
+
+# Attach to the frame slots, load the martian reference and build the bluescale lookup table once per worker
+def init_worker(shm_name, slot_bytes, ref_path, band):
+    global worker_shm, worker_slot_bytes, worker_detector, worker_band
+    # spawned workers share the parent's resource tracker, and the parent unlinks the block in close()
+    worker_shm = shared_memory.SharedMemory(name=shm_name)
+    worker_slot_bytes = slot_bytes
+    worker_detector = Processing.MartianDetector(ref_path)
+    worker_band = band
+    Processing.prepare_bluescale_mask()
+
+# Read a frame without copying it out of shared memory
+def slot_frame(slot, shape):
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=worker_shm.buf, offset=slot * worker_slot_bytes)
+    frame.flags.writeable = False  # other tasks may be reading the same frame
+    return frame
+
+# Run martian and line detection one after the other on one frame
+def analyze_task(slot, shape):
+    return Processing.analyze(slot_frame(slot, shape), worker_detector, worker_band)
+
+# Run martian detection only
+def martian_task(slot, shape):
+    return worker_detector.score(slot_frame(slot, shape))
+
+# Run line detection only
+def lines_task(slot, shape):
+    return Processing.detect_lines(slot_frame(slot, shape), worker_band)
+
+class ParallelAnalyzer:
+    # Run Processing.analyze in a pool of worker processes so frame analysis can use every core
+    def __init__(self, on_result, workers=None, split=True, slot_count=None, max_frame_bytes=640 * 480 * 3,
+                 ref_path='ref_marvin.jpeg', band=Processing.horizontal_band):
+        self.on_result = on_result
+        self.workers = workers or os.cpu_count() or 1
+        self.split = split
+        self.slot_count = slot_count or 2 * self.workers
+        self.slot_bytes = max_frame_bytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        self.free_slots = list(range(self.slot_count))
+        self.slot_available = threading.Condition()
+
+        # frames leave in the order they were submitted, whatever order the workers finish in
+        self.lock = threading.Lock()
+        self.delivery_lock = threading.Lock()
+        self.order = deque()
+        self.entries = {}  # frame_id -> {'frame', 'slot', 'parts', 'waiting', 'result'}
+
+        # spawn instead of fork: the parent has Tk and network threads that must not be copied
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=init_worker,
+                                        initargs=(self.shm.name, self.slot_bytes, ref_path, band))
+
+    # Block until another frame can be submitted, so the caller picks the newest frame only then
+    def wait_ready(self, timeout=None):
+        with self.slot_available:
+            return self.slot_available.wait_for(lambda: len(self.free_slots) > 0, timeout=timeout)
+
+    # Copy the frame into shared memory and hand it to the worker processes
+    def submit(self, frame_id, frame):
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes:
+            print(f'frame {frame_id} does not fit in a shared memory slot')
+            return False
+        with self.slot_available:
+            if not self.free_slots:
+                return False
+            slot = self.free_slots.pop()
+
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+
+        parts = ('martian', 'lines') if self.split else ('all',)
+        tasks = {'martian': martian_task, 'lines': lines_task, 'all': analyze_task}
+        submitted = time.perf_counter()
+        futures = []
+        try:
+            for part in parts:
+                futures.append((part, self.pool.submit(tasks[part], slot, frame.shape)))
+        except Exception:
+            # e.g. BrokenProcessPool; nothing is registered yet, so only the slot has to be given back,
+            # once no task that did get submitted can still be reading it. A cancelled task never runs,
+            # and wait() would never see it finish, so only the ones already running are waited for
+            wait([future for _, future in futures if not future.cancel()])
+            self.free_slot(slot)
+            raise
+
+        # registered only once every task is in the pool, so a failed submit never blocks the ordering
+        with self.lock:
+            self.order.append(frame_id)
+            self.entries[frame_id] = {'frame': frame, 'slot': slot, 'parts': {}, 'waiting': len(parts),
+                                      'result': None, 'submitted': submitted}
+        for part, future in futures:
+            future.add_done_callback(lambda done, part=part: self.task_done(frame_id, part, done))
+        return True
+
+    # Put a result that needed no worker into the same frame id ordering
+    def submit_result(self, frame_id, frame, result):
+        with self.lock:
+            self.order.append(frame_id)
+            self.entries[frame_id] = {'frame': frame, 'slot': None, 'parts': {}, 'waiting': 0, 'result': result}
+        self.release_ready()
+
+    # Collect a worker result, merge split results and release results in frame id order
+    def task_done(self, frame_id, part, future):
+        value = None
+        if not future.cancelled():
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f'error analysing frame {frame_id}: {e}')
+
+        with self.lock:
+            entry = self.entries[frame_id]
+            # queueing in the pool plus the work itself; the worker's own cv timers stay in its process
+            Metrics.observe(f'cv.worker_{part}', time.perf_counter() - entry['submitted'])
+            entry['parts'][part] = value
+            entry['waiting'] -= 1
+            if entry['waiting'] == 0:
+                parts = entry['parts']
+                if any(value is None for value in parts.values()):
+                    entry['result'] = None
+                elif 'all' in parts:
+                    entry['result'] = parts['all']
+                else:
+                    entry['result'] = Processing.combine_results(entry['frame'], parts['martian'], parts['lines'])
+                self.free_slot(entry['slot'])
+                entry['slot'] = None
+        self.release_ready()
+
+    # Give a slot back once every task reading it has finished
+    def free_slot(self, slot):
+        with self.slot_available:
+            self.free_slots.append(slot)
+            self.slot_available.notify()
+
+    # Hand finished frames at the front of the submission order to on_result
+    def release_ready(self):
+        # on_result can block on the network, so it runs outside self.lock; only the thread holding
+        # delivery_lock hands results out, which keeps them in order
+        while self.delivery_lock.acquire(blocking=False):
+            try:
+                ready = []
+                with self.lock:
+                    while self.order and self.entries[self.order[0]]['waiting'] == 0:
+                        frame_id = self.order.popleft()
+                        ready.append((frame_id, self.entries.pop(frame_id)))
+                for frame_id, entry in ready:
+                    if entry['result'] is not None:
+                        self.on_result(frame_id, entry['frame'], entry['result'])
+            finally:
+                self.delivery_lock.release()
+
+            # a frame finished while results were being handed out, and its thread saw delivery_lock taken
+            with self.lock:
+                if not (self.order and self.entries[self.order[0]]['waiting'] == 0):
+                    return
+
+    # Stop the workers and free the shared memory
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.shm.close()
+        self.shm.unlink()
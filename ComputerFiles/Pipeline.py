@@ -0,0 +1,177 @@
+"""
+LATEST SLOT (LatestSlot class):
+1. __init__(name)
+   INPUT: name (string used in reports)
+   OUTPUT: Empty LatestSlot object
+   SUMMARY: Single-slot buffer between two pipeline stages where the newest value always wins
+
+2. put(value)
+   INPUT: value (anything, usually a frame or an analysis result)
+   OUTPUT: seq (int number of the stored value)
+   SUMMARY: Replaces the stored value and counts it as dropped if the reader never took the old one
+
+3. get(after, timeout)
+   INPUT: after (int seq the reader already has, optional), timeout (float seconds, optional)
+   OUTPUT: (seq, value) or None on timeout or close
+   SUMMARY: Waits for a value newer than after and takes it
+
+4. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Wakes every waiting reader so its stage can shut down
+
+5. counts()
+   INPUT: None
+   OUTPUT: dict with puts, takes and drops
+   SUMMARY: Reads the slot counters
+
+STAGE STATS (StageStats class):
+1. __init__(name, output, report_every)
+   INPUT: name (string stage name), output (LatestSlot the stage feeds, optional),
+          report_every (float seconds between printed reports, 0 to never print)
+   OUTPUT: Initialized StageStats object
+   SUMMARY: Tracks how many items a stage handled and how long each one took
+
+2. record(duration)
+   INPUT: duration (float seconds spent on one item)
+   OUTPUT: None
+   SUMMARY: Counts one item, adds it to the stage.<name> histogram in Metrics and prints a throughput report
+            once per report_every seconds
+
+3. snapshot()
+   INPUT: None
+   OUTPUT: dict with name, count, fps over the last window, average ms per item and output slot drops
+   SUMMARY: Reads the current throughput without resetting it
+
+TIMED QUEUE (TimedQueue class, a queue.Queue):
+1. __init__(name, maxsize)
+   INPUT: name (string, items' waits go to the queue.<name> timer), maxsize (int, default 0 for unbounded)
+   OUTPUT: Empty TimedQueue object
+   SUMMARY: FIFO queue that behaves like queue.Queue and records how long each item waited in it
+
+2. put(item) / get() and the rest of the queue.Queue interface
+   SUMMARY: Unchanged; every item taken out, by get or get_nowait, counts its wait from the moment it was put
+"""
+
+from collections import deque
+import queue
+import threading
+import time
+import Metrics
+
+class LatestSlot:
+    # Single-slot buffer between two pipeline stages where the newest value always wins
+    def __init__(self, name='slot'):
+        self.name = name
+        self.condition = threading.Condition()
+        self.value = None
+        self.seq = 0
+        self.taken_seq = 0
+        self.closed = False
+
+        self.puts = 0
+        self.takes = 0
+        self.drops = 0
+
+    # Replace the stored value, counting it as dropped if the reader never took the old one
+    def put(self, value):
+        with self.condition:
+            if self.seq > self.taken_seq:
+                self.drops += 1
+            self.value = value
+            self.seq += 1
+            self.puts += 1
+            self.condition.notify_all()
+            return self.seq
+
+    # Wait for a value newer than after and take it
+    def get(self, after=None, timeout=None):
+        with self.condition:
+            if after is None:
+                after = self.taken_seq
+            if not self.condition.wait_for(lambda: self.closed or self.seq > after, timeout=timeout):
+                return None
+            if self.seq <= after:
+                return None  # closed with nothing new
+            self.taken_seq = self.seq
+            self.takes += 1
+            return self.seq, self.value
+
+    # Wake every waiting reader so its stage can shut down
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    # Read the slot counters
+    def counts(self):
+        with self.condition:
+            return {'puts': self.puts, 'takes': self.takes, 'drops': self.drops}
+
+class StageStats:
+    # Track how many items a stage handled and how long each one took
+    def __init__(self, name, output=None, report_every=5.0):
+        self.name = name
+        self.timer = 'stage.' + name.replace(' ', '_')
+        self.output = output
+        self.report_every = report_every
+        self.lock = threading.Lock()
+
+        self.count = 0
+        self.busy = 0.0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.window_busy = 0.0
+        self.fps = 0.0
+        self.avg_ms = 0.0
+
+    # Count one item and print a throughput report once per report_every seconds
+    def record(self, duration):
+        Metrics.observe(self.timer, duration)
+        with self.lock:
+            self.count += 1
+            self.busy += duration
+            self.window_count += 1
+            self.window_busy += duration
+
+            now = time.monotonic()
+            elapsed = now - self.window_start
+            if elapsed < (self.report_every if self.report_every > 0 else 1.0):
+                return
+            self.fps = self.window_count / elapsed
+            self.avg_ms = 1000 * self.window_busy / self.window_count
+            self.window_start = now
+            self.window_count = 0
+            self.window_busy = 0.0
+            report = f'{self.name}: {self.fps:.1f} fps, {self.avg_ms:.1f} ms per item'
+
+        if self.report_every > 0:
+            if self.output is not None:
+                report += f", {self.output.counts()['drops']} dropped at {self.output.name}"
+            print(report)
+
+    # Read the current throughput without resetting it
+    def snapshot(self):
+        with self.lock:
+            stats = {'name': self.name, 'count': self.count, 'fps': self.fps, 'avg_ms': self.avg_ms}
+        if self.output is not None:
+            stats['drops'] = self.output.counts()['drops']
+        return stats
+
+class TimedQueue(queue.Queue):
+    # FIFO queue that behaves like queue.Queue and records how long each item waited in it
+    def __init__(self, name, maxsize=0):
+        self.timer = 'queue.' + name
+        super().__init__(maxsize)
+
+    # queue.Queue calls these with its own lock held, so every way in and out is covered
+    def _init(self, maxsize):
+        self.queue = deque()
+
+    def _put(self, item):
+        self.queue.append((time.perf_counter(), item))
+
+    def _get(self):
+        put_at, item = self.queue.popleft()
+        Metrics.observe(self.timer, time.perf_counter() - put_at)
+        return item
@@ -60,21 +60,175 @@ FUNCTIONS:
     OUTPUT: None
     SUMMARY: Sends movement command to robot API endpoint
 
-13. apply_overlay(frame, movement_queue)
-    INPUT: frame (OpenCV image), movement_queue (Queue object)
+13. apply_overlay(frame, movement_queue, detector, band)
+    INPUT: frame (OpenCV image), movement_queue (Queue object), detector (MartianDetector, optional),
+           band (tuple top/bottom fractions of the frame height, default horizontal_band)
     OUTPUT: processed_frame, line_type (string or None)
     SUMMARY: Main processing function that detects martians, horizontal/vertical lines and queues commands
 
-14. martian_detection(frame)
-    INPUT: frame (OpenCV image)
-    OUTPUT: existence (boolean), processed_frame
+14. martian_detection(frame, detector)
+    INPUT: frame (OpenCV image), detector (MartianDetector, optional; shared detector by default)
+    OUTPUT: processed_frame, existence (boolean)
     SUMMARY: Uses ORB feature matching to detect martian reference image in current frame
+
+15. get_martian_detector()
+    INPUT: None
+    OUTPUT: Shared MartianDetector object
+    SUMMARY: Builds the detector on first use so the reference image is only read once per process
+
+16. knn_arrays(descriptors_query, descriptors_train)
+    INPUT: descriptors_query, descriptors_train (ORB descriptor arrays)
+    OUTPUT: distances, indices (N x 2 numpy arrays of the two nearest train descriptors)
+    SUMMARY: Finds the two nearest neighbours by Hamming distance without building DMatch objects
+
+17. mutual_matches(forward, backward, ratio)
+    INPUT: forward (reference to frame knn_arrays), backward (frame to reference knn_arrays), ratio (float)
+    OUTPUT: ref_idx, frame_idx, margins (numpy arrays for the mutually consistent matches)
+    SUMMARY: Applies the ratio test to both directions and keeps pairs that agree both ways
+
+18. hough_segments(image)
+    INPUT: image (grayscale or BGR OpenCV image)
+    OUTPUT: numpy array of Hough segments shaped (N, 1, 4), empty if none
+    SUMMARY: Runs the probabilistic Hough transform once so every detector can share its segments
+
+19. classify_horizontal(segments, frame_shape, band)
+    INPUT: segments (hough_segments output), frame_shape (image shape), band (tuple top/bottom rows, optional)
+    OUTPUT: dict with detected, center_y, lines, angles, confidence
+    SUMMARY: Picks near-horizontal segments inside the band and computes their length-weighted center row
+
+20. classify_vertical(segments)
+    INPUT: segments (hough_segments output)
+    OUTPUT: dict with detected, left, right and center lines, angles, confidence
+    SUMMARY: Splits steep segments into left/right lines by slope sign and fits the path between them
+
+21. draw_horizontal(image, result, offset_y)
+    INPUT: image (OpenCV image), result (classify_horizontal dict), offset_y (int rows to shift up, default 0)
+    OUTPUT: image with the center line drawn
+    SUMMARY: Draws the weighted horizontal center line
+
+22. draw_vertical(image, result)
+    INPUT: image (OpenCV image), result (classify_vertical dict)
+    OUTPUT: image with the lines drawn
+    SUMMARY: Draws the left, right and center vertical lines
+
+23. fit_lines(segments, labels, group_count)
+    INPUT: segments (N x 4 segment array), labels (int group per segment), group_count (int)
+    OUTPUT: group_count x 4 array of fitted lines [x1, y1, x2, y2] (NaN rows for empty groups)
+    SUMMARY: Least-squares fits x = slope * y + intercept for every group at once using both segment endpoints
+
+24. build_bluescale_mask_lut(width, chunk)
+    INPUT: width (int frame width), chunk (int table entries converted per block, default 4096)
+    OUTPUT: flattened lookup table, per-column offsets into it
+    SUMMARY: Precomputes the bluescale + hsv_mask output for every saturation/value pair, once per frame width
+
+25. bluescale_mask(frame)
+    INPUT: frame (OpenCV BGR image)
+    OUTPUT: Masked blue-tinted image, pixel-identical to hsv_mask(bluescale(frame)) (tests/test_processing.py)
+    SUMMARY: Replaces three colour conversions and two copies with one conversion and one table lookup
+
+26. prepare_bluescale_mask(width)
+    INPUT: width (int frame width, default frame_width)
+    OUTPUT: None
+    SUMMARY: Builds the lookup table for a width up front (about a second), so the first analysed frame doesn't
+             pay for it; Automation and each CV worker call it when they start
+
+27. bluescale_mask_rows(start, stop, width)
+    INPUT: start, stop (int range of (saturation << 8) | value entries), width (int)
+    OUTPUT: bluescale + hsv_mask output with one entry per row, repeated across the width
+    SUMMARY: Runs the original two functions on table entries so the lookup table matches them exactly
+
+28. band_rows(height, band)
+    INPUT: height (int frame rows), band (tuple top/bottom fractions, default horizontal_band)
+    OUTPUT: (top, bottom) pixel rows clamped to the frame
+    SUMMARY: Converts a band given as fractions of the frame height into pixel rows
+
+29. analyze(frame, detector, band)
+    INPUT: frame (OpenCV image), detector (MartianDetector, optional), band (tuple fractions, default horizontal_band)
+    OUTPUT: dict with overlay, line_type, commands (movement queue items) and martian (MartianDetector.score dict)
+    SUMMARY: Pure version of apply_overlay that touches neither the robot nor a queue, so it can run in any process;
+             records cv.martian, cv.lines and cv.analyze timers
+
+30. detect_lines(frame, band)
+    INPUT: frame (OpenCV image), band (tuple fractions, default horizontal_band)
+    OUTPUT: dict with overlay, line_type and commands
+    SUMMARY: Runs horizontal, then if needed vertical, line detection without side effects
+
+31. combine_results(frame, martian, lines)
+    INPUT: frame (OpenCV image), martian (MartianDetector.score dict), lines (detect_lines dict, unused if a martian was found)
+    OUTPUT: analyze() result dict
+    SUMMARY: Merges martian and line results for the same frame, the martian taking priority
+
+32. martian_overlay(frame)
+    INPUT: frame (OpenCV image)
+    OUTPUT: Copy of the frame labelled as containing a martian
+    SUMMARY: Draws the martian labels apply_overlay has always shown
+
+33. dispatch_commands(result, movement_queue)
+    INPUT: result (analyze() dict), movement_queue (Queue object)
+    OUTPUT: None
+    SUMMARY: Stops the robot for a martian and queues the result's movement commands
+
+FRAME ANALYSIS (FrameAnalysis class):
+1. __init__(frame, pad)
+   INPUT: frame (OpenCV BGR image), pad (int context rows around a region, default region_pad)
+   OUTPUT: FrameAnalysis with an empty per-frame cache
+   SUMMARY: Holds one frame and computes each preprocessing stage only for the rows a detector asks for
+
+2. closed(top, bottom)
+   INPUT: top, bottom (int rows, default the whole frame)
+   OUTPUT: Blurred, blue-masked and closed image for those rows
+   SUMMARY: Preprocesses a padded strip so the rows match the full-frame result exactly; the full frame
+            reuses any band already done and slices are taken from it once it exists (timed as cv.preprocess)
+
+3. gray(top, bottom)
+   INPUT: top, bottom (int rows, default the whole frame)
+   OUTPUT: Grayscale of closed(top, bottom)
+   SUMMARY: Converts the closed rows to grayscale for the Hough transform
+
+4. segments(top, bottom)
+   INPUT: top, bottom (int rows, default the whole frame)
+   OUTPUT: hough_segments array in full-frame coordinates
+   SUMMARY: Runs one Hough pass over the requested rows (timed as cv.hough)
+
+5. horizontal(band)
+   INPUT: band (tuple top/bottom rows, optional)
+   OUTPUT: classify_horizontal dict
+   SUMMARY: Classifies horizontal segments inside a row band, running Hough on the band unless full-frame segments exist
+
+6. vertical()
+   INPUT: None
+   OUTPUT: classify_vertical dict
+   SUMMARY: Classifies vertical segments across the whole frame
+
+MARTIAN DETECTOR (MartianDetector class):
+1. __init__(ref_path, scales, ratio, min_matches)
+   INPUT: ref_path (string, default 'ref_marvin.jpeg'), scales (tuple of pyramid scales, default (1.0,)),
+          ratio (float Lowe ratio, default 0.7), min_matches (int, default 2)
+   OUTPUT: Initialized MartianDetector object
+   SUMMARY: Creates one ORB and caches the reference descriptors
+
+2. load_reference()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Reads the reference image once and stacks its descriptors from every pyramid scale
+
+3. score(frame)
+   INPUT: frame (OpenCV BGR image)
+   OUTPUT: dict with existence (boolean), matches (int mutual match count), confidence (float 0-1)
+   SUMMARY: Matches the frame against the cached reference descriptors with a ratio and mutual check
+
+4. detect(frame)
+   INPUT: frame (OpenCV BGR image)
+   OUTPUT: processed_frame, existence (boolean)
+   SUMMARY: Scores the frame, stops the robot and labels the frame when a martian is found
 """
 
 import cv2
 import numpy as np
+import threading
 import time
-import requests
+import Metrics
+import RoverClient
 
 # Apply Gaussian blur filter to reduce image noise
 def apply_gaussian_blur(image, kernel_size=(9, 9)):
@@ -117,6 +271,66 @@ def hsv_mask(frame):
 
     return masked
 
+# Run bluescale + hsv_mask on a block of rows that each hold one (saturation, value) pair
+def bluescale_mask_rows(start, stop, width):
+    # bluescale forces hue to 120, so its output depends only on saturation and value
+    entries = np.arange(start, stop)
+    hsv_rows = np.empty((stop - start, width, 3), dtype=np.uint8)
+    hsv_rows[:, :, 0] = 120
+    hsv_rows[:, :, 1] = (entries >> 8)[:, None]
+    hsv_rows[:, :, 2] = (entries & 255)[:, None]
+    return hsv_mask(cv2.cvtColor(hsv_rows, cv2.COLOR_HSV2BGR))
+
+# Precompute the bluescale + hsv_mask result for every (saturation, value) pair at a frame width
+def build_bluescale_mask_lut(width, chunk=4096):
+    # opencv converts most of each row with SIMD and the last few pixels with scalar code,
+    # and the two can round differently, so columns are grouped by how they behave
+    labels = np.zeros(width, dtype=np.int64)
+    for start in range(0, 65536, chunk):
+        block = bluescale_mask_rows(start, start + chunk, width)
+        columns = np.ascontiguousarray(block.transpose(1, 0, 2)).reshape(width, -1)
+        groups = {}
+        for column in range(width):
+            key = (labels[column], columns[column].tobytes())
+            labels[column] = groups.setdefault(key, len(groups))
+
+    # one table per column group, taken from a representative column of each group
+    representatives = [int(np.flatnonzero(labels == label)[0]) for label in range(labels.max() + 1)]
+    lut = np.empty((len(representatives), 65536, 3), dtype=np.uint8)
+    for start in range(0, 65536, chunk):
+        block = bluescale_mask_rows(start, start + chunk, width)
+        lut[:, start:start + chunk] = block[:, representatives].transpose(1, 0, 2)
+
+    # pack each BGR entry into one 32-bit word so the lookup is a single flat gather,
+    # and keep the offset of each column's table inside the flattened lut
+    packed = np.zeros((lut.shape[0] * 65536, 4), dtype=np.uint8)
+    packed[:, :3] = lut.reshape(-1, 3)
+    return packed.view(np.uint32).ravel(), labels * 65536
+
+frame_width = 400  # the Pi resizes every frame to 400x300 before sending it (RaspPiFiles/Video.py)
+bluescale_mask_luts = {}
+bluescale_mask_lock = threading.Lock()
+
+# Build the lookup table for a frame width up front so the first analysed frame doesn't pay for it
+def prepare_bluescale_mask(width=frame_width):
+    with bluescale_mask_lock:
+        if width not in bluescale_mask_luts:
+            bluescale_mask_luts[width] = build_bluescale_mask_lut(width)
+
+# Bluescale and HSV-mask a frame with one colour conversion and one table lookup
+def bluescale_mask(frame):
+    width = frame.shape[1]
+    if width not in bluescale_mask_luts:
+        prepare_bluescale_mask(width)  # only frames of an unexpected width get here
+    lut, column_offsets = bluescale_mask_luts[width]
+
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    index = np.left_shift(hsv[:, :, 1], 8, dtype=np.intp)
+    index |= hsv[:, :, 2]
+    index += column_offsets
+    packed = np.take(lut, index).view(np.uint8).reshape(frame.shape[0], frame.shape[1], 4)
+    return cv2.cvtColor(packed, cv2.COLOR_BGRA2BGR)
+
 # Apply morphological closing operation to fill gaps in detected regions
 def closing(masked, full):
     gray = cv2.cvtColor(masked, cv2.COLOR_BGR2GRAY)
@@ -134,192 +348,422 @@ def polyfit_line(points):
     except:
         return None
 
+hough_threshold = 100  # accumulator votes HoughLinesP needs for a line
+
+# Run the probabilistic Hough transform once and return its (N, 1, 4) segment array
+def hough_segments(image):
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # a line needs at least hough_threshold votes, so fewer lit pixels than that can't produce one
+    if image.size == 0 or cv2.countNonZero(image) < hough_threshold:
+        return np.empty((0, 1, 4), dtype=np.int32)
+    lines = cv2.HoughLinesP(image, 1, np.pi / 180, hough_threshold, minLineLength=80, maxLineGap=10)
+    if lines is None:
+        return np.empty((0, 1, 4), dtype=np.int32)
+    return lines.reshape(-1, 1, 4)  # some opencv builds drop the middle axis
+
+# Classify the near-horizontal segments inside a row band and find their weighted center row
+def classify_horizontal(segments, frame_shape, band=None):
+    if band is None:
+        band = (0, frame_shape[0])
+    top, bottom = band
+    result = {'detected': False, 'center_y': None, 'lines': [], 'angles': [], 'confidence': 0.0}
+
+    x1, y1, x2, y2 = segments.reshape(-1, 4).astype(np.int64).T
+    lengths = np.abs(x2 - x1)
+    mid_y = (y1 + y2) // 2
+    hori = (np.abs(y2 - y1) < lengths) & (mid_y >= top) & (mid_y < bottom)
+    if not hori.any():
+        return result
+
+    # flat segments always have a nonzero x extent, so the weights can't all be zero
+    result['detected'] = True
+    result['center_y'] = int(np.average(mid_y[hori], weights=lengths[hori]))
+    result['lines'] = segments.reshape(-1, 4)[hori].tolist()
+    result['angles'] = np.degrees(np.arctan2(y2[hori] - y1[hori], x2[hori] - x1[hori])).tolist()
+    # how much of a full-width line the detected segments add up to
+    result['confidence'] = min(1.0, float(lengths[hori].sum()) / frame_shape[1])
+    return result
+
+# Least-squares fit x = slope * y + intercept for every group of segments in one pass
+def fit_lines(segments, labels, group_count):
+    x1, y1, x2, y2 = segments.reshape(-1, 4).astype(np.float64).T
+    # both endpoints of every segment are sample points; fitting x against y stays
+    # well-conditioned for the steep lines this is used on
+    x = np.concatenate((x1, x2))
+    y = np.concatenate((y1, y2))
+    groups = np.concatenate((labels, labels))
+
+    n = np.bincount(groups, minlength=group_count).astype(np.float64)
+    sum_x = np.bincount(groups, weights=x, minlength=group_count)
+    sum_y = np.bincount(groups, weights=y, minlength=group_count)
+    sum_yy = np.bincount(groups, weights=y * y, minlength=group_count)
+    sum_xy = np.bincount(groups, weights=x * y, minlength=group_count)
+
+    denominator = n * sum_yy - sum_y ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator != 0, (n * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = (sum_x - slope * sum_y) / n
+
+    y_top = np.full(group_count, np.inf)
+    y_bottom = np.full(group_count, -np.inf)
+    np.minimum.at(y_top, groups, y)
+    np.maximum.at(y_bottom, groups, y)
+
+    lines = np.column_stack((slope * y_top + intercept, y_top, slope * y_bottom + intercept, y_bottom))
+    lines[n == 0] = np.nan  # empty groups have no line
+    return lines
+
+# Split steep segments into left/right lines by slope sign and fit the path between them
+def classify_vertical(segments):
+    result = {'detected': False, 'left': None, 'right': None, 'center': None, 'angles': [], 'confidence': 0.0}
+
+    x1, y1, x2, y2 = segments.reshape(-1, 4).astype(np.int64).T
+    dx = x2 - x1
+    dy = y2 - y1
+    if not (np.abs(dy) > np.abs(dx)).all():
+        return result  # any flat segment means this isn't a clean vertical path
+
+    # positive slope in image coordinates is the left line, negative the right one
+    sloped = dx != 0
+    left = sloped & (dy * dx > 0)
+    right = sloped & ~left
+    left_count, right_count = int(left.sum()), int(right.sum())
+    if left_count < 1 or right_count < 1:
+        return result
+
+    labels = np.where(left, 0, 1)[sloped]
+    lines = fit_lines(segments.reshape(-1, 4)[sloped], labels, 2)
+    if not np.isfinite(lines).all():
+        return result
+
+    l_x1, l_y1, l_x2, l_y2 = [int(value) for value in lines[0]]
+    r_x1, r_y1, r_x2, r_y2 = [int(value) for value in lines[1]]
+
+    if calc_distance(l_x1, l_y1, r_x1, r_y1) < calc_distance(l_x1, l_y1, r_x2, r_y2):
+        center = [(l_x1 + r_x1) // 2, (l_y1 + r_y1) // 2, (l_x2 + r_x2) // 2, (l_y2 + r_y2) // 2]
+    else:
+        center = [(l_x1 + r_x2) // 2, (l_y1 + r_y2) // 2, (l_x2 + r_x1) // 2, (l_y2 + r_y1) // 2]
+
+    result['detected'] = True
+    result['left'] = [l_x1, l_y1, l_x2, l_y2]
+    result['right'] = [r_x1, r_y1, r_x2, r_y2]
+    result['center'] = center
+    result['angles'] = [float(calc_angle(*line)) for line in (result['left'], result['right'], center)]
+    # balanced support on both sides is more trustworthy than many segments on one side
+    result['confidence'] = min(left_count, right_count) / max(left_count, right_count)
+    return result
+
+# Draw the weighted horizontal center line onto an image
+def draw_horizontal(image, result, offset_y=0):
+    center_y = result['center_y'] - offset_y
+    cv2.line(image, (0, center_y), (image.shape[1], center_y), (0, 0, 255), 2)
+    return image
+
+# Draw the left, right and center vertical lines onto an image
+def draw_vertical(image, result):
+    for line in (result['left'], result['right'], result['center']):
+        x1, y1, x2, y2 = line
+        cv2.line(image, (x1, y1), (x2, y2), (0, 0, 255), 3)
+    return image
+
 # Detect horizontal lines using Hough transform and draw weighted center line
 def horizontal_detection(frame):
     new = frame.copy()
-
-    detect_flag = False
-
-    lines = cv2.HoughLinesP(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1, np.pi / 180, 100, minLineLength=80,
-                            maxLineGap=10)
-    if lines is not None:
-        hori_lines = []
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            if abs(y2 - y1) < abs(x2 - x1):
-                hori_lines.append(((y1 + y2) // 2, abs(x2 - x1)))
-
-        if hori_lines:
-            detect_flag = True
-            weighted_sum = sum(y * length for y, length in hori_lines)
-            total_length = sum(length for _, length in hori_lines)
-
-            if total_length > 0:
-                center_y = int(weighted_sum / total_length)
-            else:
-                center_y = frame.shape[0] // 2
-
-            cv2.line(new, (0, center_y), (new.shape[1], center_y), (0, 0, 255), 2)
-
-    return detect_flag, new
+    result = classify_horizontal(hough_segments(frame), frame.shape)
+    if result['detected']:
+        draw_horizontal(new, result)
+    return result['detected'], new
 
 # Detect left/right vertical lines and draw center path between them
 def vertical_detection(frame):
     new = frame.copy()
-    detect_flag = False
-
-    leftline = []
-    rightline = []
-    lines = cv2.HoughLinesP(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1, np.pi / 180, 100, minLineLength=80,
-                            maxLineGap=10)
-    if lines is not None:
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            if not abs(y2 - y1) > abs(x2 - x1):
-                return detect_flag, new
-            if x2 - x1 != 0:
-                if (y2 - y1) / (x2 - x1) > 0:
-                    leftline.append([x1, y1, x2, y2])
-                else:
-                    rightline.append([x1, y1, x2, y2])
-
-    if len(leftline) < 1 or len(rightline) < 1:
-        return detect_flag, new
-
-    leftline = np.array(leftline)
-    rightline = np.array(rightline)
-
-    leftline = polyfit_line(leftline)
-    rightline = polyfit_line(rightline)
-
-    if leftline is None or rightline is None:
-        return detect_flag, new
-
-    l_x1, l_y1, l_x2, l_y2 = leftline
-    r_x1, r_y1, r_x2, r_y2 = rightline
-
-    cv2.line(new, (l_x1, l_y1), (l_x2, l_y2), (0, 0, 255), 3)
-    cv2.line(new, (r_x1, r_y1), (r_x2, r_y2), (0, 0, 255), 3)
-
-    if calc_distance(l_x1, l_y1, r_x1, r_y1) < calc_distance(l_x1, l_y1, r_x2, r_y2):
-        mid_x1 = (l_x1 + r_x1) // 2
-        mid_y1 = (l_y1 + r_y1) // 2
-        mid_x2 = (l_x2 + r_x2) // 2
-        mid_y2 = (l_y2 + r_y2) // 2
-    else:
-        mid_x1 = (l_x1 + r_x2) // 2
-        mid_y1 = (l_y1 + r_y2) // 2
-        mid_x2 = (l_x2 + r_x1) // 2
-        mid_y2 = (l_y2 + r_y1) // 2
-
-    cv2.line(new, (mid_x1, mid_y1), (mid_x2, mid_y2), (0, 0, 255), 3)
-    detect_flag = True
-
-    return detect_flag, new
+    result = classify_vertical(hough_segments(frame))
+    if result['detected']:
+        draw_vertical(new, result)
+    return result['detected'], new
+
+# Rows the horizontal check looks at, as fractions of the frame height (rows 130-170 of a 300 row frame)
+horizontal_band = (130 / 300, 170 / 300)
+
+# Context rows each side of a region: 4 for the 9x9 blur plus 12 for three 5x5 closing passes
+region_pad = 16
+
+# Convert a band given as fractions of the frame height into pixel rows
+def band_rows(height, band=horizontal_band):
+    top = min(max(int(round(band[0] * height)), 0), height)
+    bottom = min(max(int(round(band[1] * height)), top), height)
+    return top, bottom
+
+class FrameAnalysis:
+    # Hold one frame and compute each preprocessing stage only for the rows a detector asks for
+    def __init__(self, frame, pad=region_pad):
+        self.frame = frame
+        self.height = frame.shape[0]
+        self.pad = pad
+        self.cache = {}  # (stage, top, bottom) -> result, so nothing is computed twice per frame
+
+    # Closed (blurred, blue-masked, morphologically closed) image for rows top:bottom
+    def closed(self, top=0, bottom=None):
+        if bottom is None:
+            bottom = self.height
+        full = self.cache.get(('closed', 0, self.height))
+        if full is not None:
+            return full[top:bottom]
+        key = ('closed', top, bottom)
+        bands = [cached for cached in self.cache if cached[0] == 'closed']
+        if key not in self.cache and (top, bottom) == (0, self.height) and bands:
+            # a band is already done, so only preprocess the rows above and below it
+            _, band_top, band_bottom = bands[0]
+            parts = [self.closed(0, band_top), self.cache[bands[0]], self.closed(band_bottom, self.height)]
+            self.cache[key] = np.vstack([part for part in parts if len(part)])
+        elif key not in self.cache:
+            # run the stages on a padded strip so the rows kept match the full-frame result exactly
+            start = max(0, top - self.pad)
+            stop = min(self.height, bottom + self.pad)
+            region = self.frame[start:stop]
+            timer = time.perf_counter()
+            masked = bluescale_mask(apply_gaussian_blur(region))  # same pixels as hsv_mask(bluescale(blurred))
+            self.cache[key] = closing(masked, region)[top - start:bottom - start]
+            Metrics.observe('cv.preprocess', time.perf_counter() - timer)
+        return self.cache[key]
+
+    # Grayscale of the closed image for rows top:bottom
+    def gray(self, top=0, bottom=None):
+        if bottom is None:
+            bottom = self.height
+        full = self.cache.get(('gray', 0, self.height))
+        if full is not None:
+            return full[top:bottom]
+        key = ('gray', top, bottom)
+        if key not in self.cache:
+            self.cache[key] = cv2.cvtColor(self.closed(top, bottom), cv2.COLOR_BGR2GRAY)
+        return self.cache[key]
+
+    # Hough segments for rows top:bottom, in full-frame coordinates
+    def segments(self, top=0, bottom=None):
+        if bottom is None:
+            bottom = self.height
+        key = ('segments', top, bottom)
+        if key not in self.cache:
+            gray = self.gray(top, bottom)
+            start = time.perf_counter()
+            segments = hough_segments(gray)
+            Metrics.observe('cv.hough', time.perf_counter() - start)
+            if top:
+                segments = segments + np.array([0, top, 0, top], dtype=segments.dtype)
+            self.cache[key] = segments
+        return self.cache[key]
+
+    # Classify horizontal segments inside a row band
+    def horizontal(self, band=None):
+        if band is None:
+            band = (0, self.height)
+        # reuse the full-frame segments if vertical detection already paid for them
+        if ('segments', 0, self.height) in self.cache:
+            return classify_horizontal(self.segments(), self.frame.shape, band)
+        return classify_horizontal(self.segments(*band), self.frame.shape, band)
+
+    # Classify vertical segments across the whole frame
+    def vertical(self):
+        return classify_vertical(self.segments())
 
 # Send movement command to robot API endpoint
 def post_direction(direction='forward'):
     try:
-        url = 'http://192.168.240.25:5000/'
-        endpoint = url + 'moving'
-        data = {'direction': direction}
-        req = requests.post(endpoint, json=data)
+        RoverClient.get_client().move(direction)
     except Exception as e:
         print(f'error: {e}')
 
-# Main processing function that detects martians, horizontal/vertical lines and queues commands
-def apply_overlay(frame, movement_queue):
+# Label a frame in which a martian was found
+def martian_overlay(frame):
+    overlay = frame.copy()
+    cv2.putText(overlay, 'martian detected!', (10, 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
+    cv2.putText(overlay, 'WE ARE NOT ALONE', (10, 50), cv2.FONT_HERSHEY_COMPLEX, 1, (0, 0, 255), 2,
+                cv2.LINE_AA)
+    return overlay
+
+# Run horizontal, then if needed vertical, line detection on a frame without side effects
+def detect_lines(frame, band=horizontal_band):
     new = frame.copy()
 
-    # first, do martian detection
-    martian_frame, existence = martian_detection(new)
-    if existence:
-        try:
-            movement_queue.put(('move', ('stop', 0)))
-        except:
-            pass
-        cv2.putText(martian_frame, 'WE ARE NOT ALONE', (10, 50), cv2.FONT_HERSHEY_COMPLEX, 1, (0, 0, 255), 2,
-                    cv2.LINE_AA)
-        return martian_frame, None
-
-    # then, process the image before further line detection
-    blurred = apply_gaussian_blur(new)
-    bluescaled = bluescale(blurred)
-    masked = hsv_mask(bluescaled)
-    closed = closing(masked, new)
-
-    # now, do horizontal line detection
-    hori_cropped = closed[130:170, :].copy()
-    hori_flag, overlay = horizontal_detection(hori_cropped)
-    if hori_flag:
+    # preprocess lazily so each detector only pays for the rows it looks at
+    analysis = FrameAnalysis(new)
+
+    # horizontal line detection on the band alone
+    band = band_rows(new.shape[0], band)
+    horizontal = analysis.horizontal(band)
+    if horizontal['detected']:
+        new[band[0]:band[1], :] = analysis.closed(*band)
+        draw_horizontal(new, horizontal)
+        cv2.rectangle(new, (0, band[0]), (new.shape[1], band[1]), (255, 0, 255), 2)
+        return {'overlay': new, 'line_type': 'horizontal', 'commands': [('horizontal_line_detected', None)]}
+
+    # if that didnt work, vertical line detection
+    vertical = analysis.vertical()
+    if vertical['detected']:
+        return {'overlay': draw_vertical(analysis.closed().copy(), vertical), 'line_type': 'vertical', 'commands': []}
+
+    return {'overlay': new, 'line_type': None, 'commands': []}
+
+# Merge a martian score and a line result for the same frame, the martian taking priority
+def combine_results(frame, martian, lines):
+    if martian['existence']:
+        return {'overlay': martian_overlay(frame), 'line_type': None, 'commands': [('move', ('stop', 0))],
+                'martian': martian}
+    result = dict(lines)
+    result['martian'] = martian
+    return result
+
+# Analyse one frame and return the overlay, line type and movement commands without touching the robot
+def analyze(frame, detector=None, band=horizontal_band):
+    if detector is None:
+        detector = get_martian_detector()
+
+    # first, do martian detection; line detection only runs when there is no martian
+    start = time.perf_counter()
+    martian = detector.score(frame)
+    scored = time.perf_counter()
+    Metrics.observe('cv.martian', scored - start)
+    if martian['existence']:
+        result = combine_results(frame, martian, None)
+    else:
+        lines = detect_lines(frame, band)
+        Metrics.observe('cv.lines', time.perf_counter() - scored)
+        result = combine_results(frame, martian, lines)
+    Metrics.observe('cv.analyze', time.perf_counter() - start)
+    return result
+
+# Act on an analyze() result: stop for a martian and queue its movement commands
+def dispatch_commands(result, movement_queue):
+    martian = result['martian']
+    print(f"good matches: {martian['matches']} (confidence {martian['confidence']:.2f})")
+    if martian['existence']:
+        post_direction('stop')
+        print('martian detected!')
+
+    for command in result['commands']:
         try:
-            movement_queue.put(('horizontal_line_detected', None))
+            movement_queue.put(command)
         except:
             pass
-        new[130:170, :] = overlay
-        cv2.rectangle(new, (0, 130), (new.shape[1], 170), (255, 0, 255), 2)
-        return new, 'horizontal'
-
-    # now, if that didnt work, do vertical line detection
-    vert_flag, overlay = vertical_detection(closed)
-    if vert_flag:
-        return overlay, 'vertical'
 
-    return new, None
+# Main processing function that detects martians, horizontal/vertical lines and queues commands
+def apply_overlay(frame, movement_queue, detector=None, band=horizontal_band):
+    result = analyze(frame, detector, band)
+    dispatch_commands(result, movement_queue)
+    return result['overlay'], result['line_type']
+
+class MartianDetector:
+    # Create one ORB and cache the reference descriptors
+    def __init__(self, ref_path='ref_marvin.jpeg', scales=(1.0,), ratio=0.7, min_matches=2):
+        self.ref_path = ref_path
+        self.scales = scales
+        self.ratio = ratio
+        self.min_matches = min_matches
+
+        self.orb = cv2.ORB_create()
+        self.lock = threading.Lock()  # the orb object isn't safe to share across threads
+
+        self.descriptors_ref = None
+        self.load_reference()
+
+    # Read the reference image once and stack its descriptors from every pyramid scale
+    def load_reference(self):
+        ref = cv2.imread(self.ref_path, cv2.IMREAD_GRAYSCALE)
+        if ref is None:
+            raise FileNotFoundError(f'could not read martian reference image {self.ref_path}')
+
+        descriptors = []
+        for scale in self.scales:
+            scaled = ref if scale == 1.0 else cv2.resize(ref, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            _, scaled_descriptors = self.orb.detectAndCompute(scaled, None)
+            if scaled_descriptors is not None:
+                descriptors.append(scaled_descriptors)
+
+        # one stacked array means one knnMatch call per frame no matter how many scales
+        self.descriptors_ref = np.vstack(descriptors) if descriptors else None
+
+    # Score the frame against the cached reference descriptors
+    def score(self, frame):
+        result = {'existence': False, 'matches': 0, 'confidence': 0.0}
+
+        frame_processed = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame_processed = cv2.GaussianBlur(frame_processed, (9, 9), 0)
+
+        with self.lock:
+            keypts_frame, descriptors_frame = self.orb.detectAndCompute(frame_processed, None)
+
+            if descriptors_frame is None or self.descriptors_ref is None:
+                return result
+
+            if descriptors_frame.shape[1] != self.descriptors_ref.shape[1]:
+                return result
+
+            if len(descriptors_frame) < 2 or len(self.descriptors_ref) < 2:
+                return result  # the ratio test needs a second-best match in both directions
+
+        # k=2 nearest neighbours as plain arrays, no per-match DMatch objects to walk in python
+        forward = knn_arrays(self.descriptors_ref, descriptors_frame)
+        backward = knn_arrays(descriptors_frame, self.descriptors_ref)
+        _, _, margins = mutual_matches(forward, backward, self.ratio)
+
+        result['matches'] = len(margins)
+        # average distance margin of the mutual matches: 0 is ambiguous, 1 is a perfect match
+        result['confidence'] = float(margins.mean()) if len(margins) else 0.0
+        result['existence'] = result['matches'] >= self.min_matches
+        return result
+
+    # Match the frame against the cached reference descriptors with a ratio and mutual check
+    def detect(self, frame):
+        result = self.score(frame)
+        print(f"good matches: {result['matches']} (confidence {result['confidence']:.2f})")
+
+        if result['existence']:
+            post_direction('stop')
+            print('martian detected!')
+            cv2.putText(frame, 'martian detected!', (10, 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
+
+        return frame.copy(), result['existence']
+
+# Find the two nearest train descriptors for every query descriptor by Hamming distance
+def knn_arrays(descriptors_query, descriptors_train):
+    distances, indices = cv2.batchDistance(descriptors_query, descriptors_train, cv2.CV_32S,
+                                           normType=cv2.NORM_HAMMING, K=2)
+    return distances, indices
+
+# Apply the ratio test to both match directions and keep pairs that agree both ways
+def mutual_matches(forward, backward, ratio=0.7):
+    forward_dist, forward_idx = forward
+    backward_dist, backward_idx = backward
+
+    ref_idx = np.arange(len(forward_idx))
+    frame_idx = forward_idx[:, 0]
+    forward_ok = (forward_dist[:, 0] < ratio * forward_dist[:, 1]) & (frame_idx >= 0)
+    backward_ok = backward_dist[:, 0] < ratio * backward_dist[:, 1]
+
+    # a ref->frame match survives if that frame descriptor passes its own ratio test
+    # and its best match points back at the same reference descriptor
+    safe_frame_idx = np.where(forward_ok, frame_idx, 0)
+    mutual = forward_ok & backward_ok[safe_frame_idx] & (backward_idx[safe_frame_idx, 0] == ref_idx)
+
+    best = forward_dist[mutual, 0].astype(np.float64)
+    second = np.maximum(forward_dist[mutual, 1].astype(np.float64), 1e-6)
+    return ref_idx[mutual], frame_idx[mutual], 1.0 - best / second
+
+shared_detector = None
+shared_detector_lock = threading.Lock()
+
+# Build the detector on first use so the reference image is only read once per process
+def get_martian_detector():
+    global shared_detector
+    with shared_detector_lock:
+        if shared_detector is None:
+            shared_detector = MartianDetector()
+        return shared_detector
 
 # Use ORB feature matching to detect martian reference image in current frame
-def martian_detection(frame):
-    existence = False
-
-    ref = cv2.imread('ref_marvin.jpeg', cv2.IMREAD_GRAYSCALE)
-    h, w = ref.shape
-
-    frame_processed = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    frame_processed = cv2.GaussianBlur(frame_processed, (9, 9), 0)
-    orb = cv2.ORB_create()
-
-    keypts_ref, descriptors_ref = orb.detectAndCompute(ref, None)
-    keypts_frame, descriptors_frame = orb.detectAndCompute(frame_processed, None)
-
-    if descriptors_frame is None or descriptors_ref is None:
-        return frame.copy(), existence
-
-    if descriptors_frame.shape[1] != descriptors_ref.shape[1]:
-        return frame.copy(), existence
-
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-
-    good_matches1to2 = []
-    good_matches2to1 = []
-
-    matches1to2 = bf.knnMatch(descriptors_ref, descriptors_frame, k=2)
-    for match in matches1to2:
-        if len(match) == 2:
-            m, n = match
-            if m.distance < 0.7 * n.distance:
-                good_matches1to2.append(m)
-
-    matches2to1 = bf.knnMatch(descriptors_frame, descriptors_ref, k=2)
-    for match in matches2to1:
-        if len(match) == 2:
-            m, n = match
-            if m.distance < 0.7 * n.distance:
-                good_matches2to1.append(m)
-
-    good_matches = []
-    for m in good_matches1to2:
-        for n in good_matches2to1:
-            if m.queryIdx == n.trainIdx and m.trainIdx == n.queryIdx:
-                good_matches.append(m)
-                break
-
-    print(f'good matches: {len(good_matches)}')
-
-    if len(good_matches) >= 2:
-        existence = True
-        post_direction('stop')
-        print('martian detected!')
-        cv2.putText(frame, 'martian detected!', (10, 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
-        return frame.copy(), existence
-
-    return frame.copy(), existence
+def martian_detection(frame, detector=None):
+    if detector is None:
+        detector = get_martian_detector()
+    return detector.detect(frame)
@@ -0,0 +1,787 @@
+"""
+RECORDER (Recorder class):
+1. __init__(path, flush_every)
+   INPUT: path (string directory, created if missing; an existing recording is appended to),
+          flush_every (float seconds between flushes to disk, default 1.0)
+   OUTPUT: Recorder object with its three files open for appending
+   SUMMARY: Writes a recording: JPEG bytes to frames.bin, one fixed-size record per frame to index.bin,
+            and telemetry, Pi events, commands and programs to events.jsonl
+
+2. repair(index_path, frames_path, events_path)
+   INPUT: index_path, frames_path, events_path (string files of an existing recording)
+   OUTPUT: (frame count, end of the frame data in bytes)
+   SUMMARY: Cuts a recording left behind by a crash back to its last complete frame so appends line up again
+
+3. add_frame(frame_id, timestamp, jpeg)
+   INPUT: frame_id (int id from the Pi), timestamp (float capture time on the Pi), jpeg (bytes or uint8 array)
+   OUTPUT: int index of the frame in the recording, or None once closed
+   SUMMARY: Appends the JPEG exactly as received plus its index record; two buffered writes, no re-encoding
+
+4. add_event(kind, data)
+   INPUT: kind (string 'telemetry', 'pi_event', 'command' or 'sequence'), data (JSON-serialisable value)
+   OUTPUT: None
+   SUMMARY: Appends one timestamped line to events.jsonl
+
+5. flush()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Pushes buffered frames, then their index records, then events to disk
+
+6. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Flushes and closes the files; later frames and events are ignored
+
+RECORDING (Recording class):
+1. __init__(path)
+   INPUT: path (string recording directory)
+   OUTPUT: Recording object
+   SUMMARY: Memory-maps the frame data and index for random access; index records whose bytes never reached
+            the disk are left out
+
+2. __len__()
+   INPUT: None
+   OUTPUT: int number of frames
+   SUMMARY: Counts the complete frames
+
+3. frame_info(index)
+   INPUT: index (int)
+   OUTPUT: (frame id, capture time on the Pi, time received here)
+   SUMMARY: Reads one index record
+
+4. jpeg(index)
+   INPUT: index (int)
+   OUTPUT: uint8 array viewing the JPEG inside the memory map, nothing copied
+   SUMMARY: Finds one frame's bytes
+
+5. frame(index)
+   INPUT: index (int)
+   OUTPUT: Decoded OpenCV frame or None
+   SUMMARY: Decodes one frame straight from the memory map
+
+6. find(received)
+   INPUT: received (float time on the computer's clock)
+   OUTPUT: int index of the last frame received at or before that time, -1 if none
+   SUMMARY: Binary search over the index for seeking by time
+
+7. events(kind)
+   INPUT: kind (string event type, optional for all of them)
+   OUTPUT: List of dicts with type, time and data, in the order they were recorded
+   SUMMARY: Reads events.jsonl once, skipping a line cut short by a crash
+
+8. duration()
+   INPUT: None
+   OUTPUT: float seconds between the first and last frame received
+   SUMMARY: Length of the recording in real time
+
+9. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Drops the memory maps
+
+REPLAY CLIENT (ReplayClient class):
+1. __init__(recording, speed, gate)
+   INPUT: recording (Recording), speed (float times real time, None for as fast as the consumer goes),
+          gate (function called before each frame is handed out that blocks until the consumer is ready, optional)
+   OUTPUT: ReplayClient object
+   SUMMARY: Stands in for RoverClient: frames come from the recording, telemetry and Pi events are the ones
+            recorded by the time the current frame arrived, and commands are logged instead of sent
+
+2. next_frame()
+   INPUT: None
+   OUTPUT: (frame_id, capture timestamp, decoded frame) or None at the end of the recording
+   SUMMARY: Hands out the next recorded frame, after the gate or the speed allows it, and moves the virtual
+            clock to the time it was received
+
+3. peek_frame()
+   INPUT: None
+   OUTPUT: (frame_id, capture timestamp, decoded frame) of the next recorded frame, the last one once the
+           recording is used up, or None if there are no frames
+   SUMMARY: Looks ahead without handing the frame out, so frame_stream still delivers it
+
+4. frame_stream() / get_frame(after, wait)
+   SUMMARY: Same as RoverClient; frame_stream is fed by next_frame, get_frame by peek_frame without waiting
+
+5. current_time()
+   INPUT: None
+   OUTPUT: float received time of the frame handed out last
+   SUMMARY: The replay's virtual clock, which telemetry and events are looked up against
+
+6. get_telemetry() / get_obstacle() / get_events(after, wait)
+   SUMMARY: The last recorded telemetry, and the recorded Pi events, as of current_time()
+
+7. move(direction, duration) / run_sequence(steps, name) / get_sequence(wait) / cancel_sequence()
+   SUMMARY: Logged with the frame they followed; programs finish at once, their if steps decided by the
+            recorded obstacle flag, since the replay doesn't model the rover moving
+
+8. run_program(steps)
+   INPUT: steps (list of step dicts, see RaspPiFiles/Sequence.py)
+   OUTPUT: (result, Boolean True if a finish step ended the program)
+   SUMMARY: Walks a program's branches the way the Pi would at this moment of the recording
+
+9. get_log() / get_metrics() / close()
+   SUMMARY: Harmless stand-ins so nothing in Automation or the GUI reaches for the network
+
+NULL RENDERER (NullRenderer class):
+Has the start/submit/stop/closed/stats interface of Renderer.TkRenderer and draws nothing, so Automation
+runs without Tk.
+
+MODULE FUNCTIONS:
+1. record(url, path, seconds)
+   INPUT: url (string robot API url), path (string recording directory), seconds (float)
+   OUTPUT: int frames recorded
+   SUMMARY: Records the stream, telemetry and Pi events from a rover without driving it
+
+2. replay_processing(recording, verbose)
+   INPUT: recording (Recording), verbose (bool keep Processing's prints, default False)
+   OUTPUT: dict with frames, seconds, fps, speedup over real time, line type counts, transitions,
+           queued commands and the line type of every frame
+   SUMMARY: Runs every frame through Processing.apply_overlay as fast as the CPU allows
+
+3. replay_automation(recording, cv_workers, timeout, verbose)
+   INPUT: recording (Recording), cv_workers (int, default 0), timeout (float seconds, optional),
+          verbose (bool keep Automation's prints, default False)
+   OUTPUT: dict with frames, seconds, fps, speedup, commands and programs issued, recorded commands, queued
+           commands dropped at the end and stage stats
+   SUMMARY: Runs the whole Automation pipeline on the recording, handing out each frame once the analysis stage
+            has taken the previous one and the movement queue is empty, so none are dropped; sequences see the next recorded frame at once, and
+            commands still queued when the recording runs out are dropped
+
+4. compare_line_types(result, baseline)
+   INPUT: result, baseline (replay_processing dicts, the baseline usually loaded from --json)
+   OUTPUT: dict with compared frame count and the frames whose line type changed
+   SUMMARY: Shows what a tuning change did to detection, frame by frame
+
+5. main()
+   INPUT: Command line arguments
+   OUTPUT: None (prints a report, optionally writes JSON)
+   SUMMARY: Records, describes or replays a recording
+
+FILES (in the recording directory):
+- frames.bin: JPEG bytes back to back, exactly as the Pi sent them
+- index.bin: header (magic, version, record size), then per frame: frame id, capture time on the Pi,
+  received time, offset into frames.bin and length
+- events.jsonl: {"type", "time", "data"} per line; time is the computer's clock, like received time
+
+USAGE (from ComputerFiles/):
+    python Recording.py record runs/lap1 --url http://192.168.240.25:5000/ --seconds 600
+    python Recording.py info runs/lap1
+    python Recording.py replay runs/lap1 --json lap1_lines.json
+    python Recording.py replay runs/lap1 --compare lap1_lines.json
+    python Recording.py replay runs/lap1 --through automation
+Setting ROVER_RECORD=<directory> before starting the GUI records while driving, commands included.
+"""
+
+import argparse
+import bisect
+import contextlib
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import cv2
+import numpy as np
+import Automation
+import Pipeline
+import Processing
+import RoverClient
+
+INDEX_MAGIC = b'RREC'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sII')  # magic, version, record size
+INDEX_RECORD = struct.Struct('<QddQI4x')  # frame id, capture time, received time, offset, length
+index_dtype = np.dtype({'names': ['frame_id', 'timestamp', 'received', 'offset', 'length'],
+                        'formats': ['<u8', '<f8', '<f8', '<u8', '<u4'],
+                        'offsets': [0, 8, 16, 24, 32],
+                        'itemsize': INDEX_RECORD.size})
+
+class Recorder:
+    # Write a recording: frame bytes, a fixed-size index record per frame, and events as JSON lines
+    def __init__(self, path, flush_every=1.0):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = threading.Lock()  # ingest, telemetry and movement threads all record
+
+        index_path = os.path.join(path, 'index.bin')
+        frames_path = os.path.join(path, 'frames.bin')
+        events_path = os.path.join(path, 'events.jsonl')
+        self.count, self.offset = self.repair(index_path, frames_path, events_path)
+        self.frames = open(frames_path, 'ab')
+        self.index = open(index_path, 'ab')
+        self.events = open(events_path, 'a')
+        if self.count == 0 and self.index.tell() == 0:
+            self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, INDEX_RECORD.size))
+        self.flushed = time.monotonic()
+        self.closed = False
+
+    # Cut a recording left behind by a crash back to its last complete frame
+    def repair(self, index_path, frames_path, events_path):
+        if os.path.exists(events_path):
+            # an event line cut short would swallow the first event appended after it
+            with open(events_path, 'rb+') as f:
+                data = f.read()
+                if data and not data.endswith(b'\n'):
+                    f.truncate(data.rfind(b'\n') + 1)
+
+        if not os.path.exists(index_path) or os.path.getsize(index_path) < INDEX_HEADER.size:
+            # no usable index, so whatever frame bytes exist can't be found again
+            for name in (index_path, frames_path):
+                if os.path.exists(name):
+                    os.truncate(name, 0)
+            return 0, 0
+
+        with open(index_path, 'rb') as f:
+            magic, _, record_size = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC or record_size != INDEX_RECORD.size:
+                raise ValueError(f'{self.path} is not a recording this version can append to')
+
+            count = (os.path.getsize(index_path) - INDEX_HEADER.size) // INDEX_RECORD.size
+            data_size = os.path.getsize(frames_path) if os.path.exists(frames_path) else 0
+            end = 0
+            while count:
+                f.seek(INDEX_HEADER.size + (count - 1) * INDEX_RECORD.size)
+                _, _, _, offset, length = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+                if offset + length <= data_size:
+                    end = offset + length
+                    break
+                count -= 1
+
+        os.truncate(index_path, INDEX_HEADER.size + count * INDEX_RECORD.size)
+        if os.path.exists(frames_path):
+            os.truncate(frames_path, end)
+        return count, end
+
+    # Append the JPEG exactly as received plus its index record
+    def add_frame(self, frame_id, timestamp, jpeg):
+        received = time.time()
+        length = len(jpeg)
+        with self.lock:
+            if self.closed:
+                return None
+            self.frames.write(jpeg)
+            self.index.write(INDEX_RECORD.pack(frame_id, timestamp, received, self.offset, length))
+            self.offset += length
+            self.count += 1
+            if time.monotonic() - self.flushed >= self.flush_every:
+                self.flush_files()
+            return self.count - 1
+
+    # Append one timestamped line to events.jsonl
+    def add_event(self, kind, data):
+        line = json.dumps({'type': kind, 'time': time.time(), 'data': data})
+        with self.lock:
+            if self.closed:
+                return
+            self.events.write(line + '\n')
+
+    # Push buffered frames, then their index records, then events to disk
+    def flush(self):
+        with self.lock:
+            if not self.closed:
+                self.flush_files()
+
+    def flush_files(self):
+        # frames first, so an index record on disk never points past the data
+        self.frames.flush()
+        self.index.flush()
+        self.events.flush()
+        self.flushed = time.monotonic()
+
+    # Flush and close the files
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.flush_files()
+            self.closed = True
+            for f in (self.frames, self.index, self.events):
+                f.close()
+
+class Recording:
+    # Memory-map the frame data and index of a recording for random access
+    def __init__(self, path):
+        self.path = path
+        index_path = os.path.join(path, 'index.bin')
+        frames_path = os.path.join(path, 'frames.bin')
+
+        with open(index_path, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            raise ValueError(f'{path} has no recording index')
+        magic, _, record_size = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or record_size != INDEX_RECORD.size:
+            raise ValueError(f'{path} is not a recording')
+
+        count = (os.path.getsize(index_path) - INDEX_HEADER.size) // INDEX_RECORD.size
+        data_size = os.path.getsize(frames_path) if os.path.exists(frames_path) else 0
+        self.index = np.empty(0, dtype=index_dtype)
+        self.data = np.empty(0, dtype=np.uint8)
+        if count:
+            self.index = np.memmap(index_path, dtype=index_dtype, mode='r', offset=INDEX_HEADER.size, shape=(count,))
+        if data_size:
+            self.data = np.memmap(frames_path, dtype=np.uint8, mode='r')
+
+        # a recorder that is still running or crashed can have index records ahead of its data
+        complete = self.index['offset'] + self.index['length'] <= data_size
+        if not complete.all():
+            self.index = self.index[:int(np.argmin(complete))]
+        self.received = np.asarray(self.index['received'])
+        self.event_list = None
+
+    # Count the complete frames
+    def __len__(self):
+        return len(self.index)
+
+    # Read one index record
+    def frame_info(self, index):
+        record = self.index[index]
+        return int(record['frame_id']), float(record['timestamp']), float(record['received'])
+
+    # Find one frame's bytes inside the memory map
+    def jpeg(self, index):
+        record = self.index[index]
+        offset = int(record['offset'])
+        return self.data[offset:offset + int(record['length'])]
+
+    # Decode one frame straight from the memory map
+    def frame(self, index):
+        return cv2.imdecode(self.jpeg(index), cv2.IMREAD_COLOR)
+
+    # Binary search over the index for the last frame received at or before a time
+    def find(self, received):
+        return int(np.searchsorted(self.received, received, side='right')) - 1
+
+    # Read events.jsonl once, skipping a line cut short by a crash
+    def events(self, kind=None):
+        if self.event_list is None:
+            self.event_list = []
+            events_path = os.path.join(self.path, 'events.jsonl')
+            if os.path.exists(events_path):
+                with open(events_path) as f:
+                    for line in f:
+                        try:
+                            self.event_list.append(json.loads(line))
+                        except ValueError:
+                            continue
+        if kind is None:
+            return list(self.event_list)
+        return [event for event in self.event_list if event['type'] == kind]
+
+    # Length of the recording in real time
+    def duration(self):
+        if len(self) < 2:
+            return 0.0
+        return float(self.received[-1] - self.received[0])
+
+    # Drop the memory maps
+    def close(self):
+        self.index = np.empty(0, dtype=index_dtype)
+        self.data = np.empty(0, dtype=np.uint8)
+        self.received = np.empty(0)
+
+class ReplayClient:
+    # Stand in for RoverClient with frames, telemetry and events from a recording
+    def __init__(self, recording, speed=None, gate=None):
+        self.recording = recording
+        self.speed = speed
+        self.gate = gate
+        self.recorder = None
+        self.lock = threading.Lock()
+        self.position = 0  # next frame to hand out
+        self.current = -1  # frame handed out last
+        self.clock = recording.frame_info(0)[2] if len(recording) else 0.0  # virtual time, see current_time
+        self.started = None
+        self.finished = threading.Event()
+
+        self.telemetry = recording.events('telemetry')
+        self.telemetry_times = [event['time'] for event in self.telemetry]
+        self.pi_events = recording.events('pi_event')
+        self.commands = []  # (frame index, direction, duration)
+        self.sequences = []  # (frame index, name, result)
+        self.sequence_status = None
+
+    # Hand out the next recorded frame, after the gate or the speed allows it
+    def next_frame(self):
+        while True:
+            if self.gate is not None:
+                self.gate()
+            with self.lock:
+                if self.position >= len(self.recording):
+                    self.finished.set()
+                    return None
+                index = self.position
+                self.position += 1
+
+            if self.speed:
+                # keep the recorded spacing between frames, shrunk by the speed factor
+                received = self.recording.frame_info(index)[2]
+                if self.started is None:
+                    self.started = (time.monotonic(), received)
+                delay = self.started[0] + (received - self.started[1]) / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            frame = self.recording.frame(index)
+            if frame is None:
+                continue
+            self.current = index
+            frame_id, timestamp, self.clock = self.recording.frame_info(index)
+            return frame_id, timestamp, frame
+
+    # Look at the next recorded frame without handing it out, so the stream still gets it
+    def peek_frame(self):
+        with self.lock:
+            position = self.position
+        for index in range(min(position, len(self.recording) - 1), len(self.recording)):
+            frame = self.recording.frame(index)
+            if frame is not None:
+                frame_id, timestamp, _ = self.recording.frame_info(index)
+                return frame_id, timestamp, frame
+        return None
+
+    def frame_stream(self):
+        while True:
+            item = self.next_frame()
+            if item is None:
+                time.sleep(0.1)  # nothing left; keep the caller from spinning on reconnects
+                return
+            yield item
+
+    def get_frame(self, after=None, wait=0.0):
+        # the frame that would arrive next on the virtual clock, served at once; never waits in real time
+        return self.peek_frame()
+
+    # The replay's virtual clock, which telemetry and events are looked up against
+    def current_time(self):
+        return self.clock
+
+    def get_telemetry(self):
+        latest = bisect.bisect_right(self.telemetry_times, self.current_time()) - 1
+        if latest < 0:
+            return {'frame_id': None, 'timestamp': None, 'distance': None, 'approach_rate': 0.0,
+                    'detect_flag': False, 'direction': None, 'log': {}}
+        return dict(self.telemetry[latest]['data'])
+
+    def get_obstacle(self):
+        return bool(self.get_telemetry().get('detect_flag', False))
+
+    def get_events(self, after=0, wait=0.0):
+        now = self.current_time()
+        events = [event['data'] for event in self.pi_events
+                  if event['time'] <= now and event['data'].get('id', 0) > after]
+        if not events:
+            time.sleep(min(wait, 0.05))  # a short wait, the replay clock moves fast
+            return {'events': [], 'last_id': after}
+        return {'events': events, 'last_id': max(event['id'] for event in events)}
+
+    def move(self, direction, duration=None):
+        self.commands.append((self.current, direction, duration))
+        return {'direction': direction}
+
+    def run_sequence(self, steps, name=None):
+        result, _ = self.run_program(steps)
+        self.sequences.append((self.current, name, result))
+        self.sequence_status = {'id': len(self.sequences), 'name': name, 'state': 'done', 'steps_done': 0,
+                                'current': None, 'result': result, 'elapsed': 0.0, 'trace': []}
+        return dict(self.sequence_status)
+
+    # Walk a program's branches the way the Pi would at this moment of the recording
+    def run_program(self, steps):
+        for step in steps:
+            if 'if' in step:
+                obstacle = self.get_obstacle()
+                passed = not obstacle if step['if'] == 'obstacle_clear' else obstacle
+                result, finished = self.run_program(step.get('then' if passed else 'else', []))
+                if finished:
+                    return result, True
+            elif 'repeat' in step:
+                for _ in range(step['repeat']):
+                    result, finished = self.run_program(step.get('steps', []))
+                    if finished:
+                        return result, True
+            elif 'finish' in step:
+                return step['finish'], True
+        return None, False
+
+    def get_sequence(self, wait=0.0):
+        return self.sequence_status
+
+    def cancel_sequence(self):
+        return {'cancelled': False, 'status': self.sequence_status}
+
+    def get_log(self):
+        direction = self.commands[-1][1] if self.commands else None
+        return {'IP Address': 'replay', 'Direction Sent': direction, 'Timestamp': ''}
+
+    def get_metrics(self, reset=False):
+        return {'api': None, 'video': None}
+
+    def close(self):
+        pass
+
+class NullRenderer:
+    # Same interface as Renderer.TkRenderer, but nothing is drawn
+    def __init__(self):
+        self.stats = Pipeline.StageStats('render', report_every=0)
+        self.stopped = False
+
+    def start(self):
+        self.stopped = False
+
+    def submit(self, name, frame):
+        if name == 'stream':
+            self.stats.record(0.0)
+        return not self.stopped
+
+    def stop(self):
+        self.stopped = True
+
+    def closed(self):
+        return self.stopped
+
+# Record the stream, telemetry and Pi events from a rover without driving it
+def record(url, path, seconds):
+    client = RoverClient.RoverClient(url, use_channel=False)
+    recorder = Recorder(path)
+    client.recorder = recorder
+    stop_event = threading.Event()
+
+    def poll_telemetry():
+        while not stop_event.is_set():
+            try:
+                client.get_telemetry()
+            except Exception as e:
+                print(f'error reading telemetry: {e}')
+                stop_event.wait(1.0)
+            stop_event.wait(0.1)
+
+    def watch_events():
+        last_id = 0
+        while not stop_event.is_set():
+            try:
+                last_id = client.get_events(last_id, 1.0)['last_id']
+            except Exception as e:
+                print(f'error reading events: {e}')
+                stop_event.wait(1.0)
+
+    threading.Thread(target=poll_telemetry, daemon=True).start()
+    threading.Thread(target=watch_events, daemon=True).start()
+
+    end = time.monotonic() + seconds
+    try:
+        while time.monotonic() < end:
+            try:
+                for _ in client.frame_stream():
+                    if time.monotonic() >= end:
+                        break
+            except Exception as e:
+                print(f'error in video stream: {e}')
+                time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        recorder.close()
+        client.close()
+    return recorder.count
+
+# Run every frame through Processing.apply_overlay as fast as the CPU allows
+def replay_processing(recording, verbose=False):
+    client = ReplayClient(recording)
+    RoverClient.shared_client = client  # the stop apply_overlay sends for a martian lands in the replay log
+    detector = Processing.get_martian_detector()
+    movement_queue = queue.Queue()
+    per_frame = []
+    queued = {}
+
+    with open(os.devnull, 'w') as devnull:
+        # apply_overlay prints every frame; at replay speed that costs more than some stages
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)
+        start = time.perf_counter()
+        with output:
+            while True:
+                item = client.next_frame()
+                if item is None:
+                    break
+                frame_id, _, frame = item
+                _, line_type = Processing.apply_overlay(frame, movement_queue, detector)
+                per_frame.append((frame_id, line_type))
+                while not movement_queue.empty():
+                    command, _ = movement_queue.get_nowait()
+                    queued[command] = queued.get(command, 0) + 1
+        seconds = time.perf_counter() - start
+
+    counts = {}
+    transitions = []
+    previous = None
+    for frame_id, line_type in per_frame:
+        counts[str(line_type)] = counts.get(str(line_type), 0) + 1
+        if line_type != previous:
+            transitions.append((frame_id, line_type))
+            previous = line_type
+
+    return {'frames': len(per_frame),
+            'seconds': seconds,
+            'fps': len(per_frame) / seconds if seconds > 0 else 0.0,
+            'speedup': recording.duration() / seconds if seconds > 0 else 0.0,
+            'line_types': counts,
+            'transitions': transitions,
+            'queued': queued,
+            'stops': len(client.commands),
+            'per_frame': per_frame}
+
+# Run the whole Automation pipeline on the recording without dropping frames
+def replay_automation(recording, cv_workers=0, timeout=None, verbose=False):
+    # each frame goes in only once analysis has taken the one before, so the newest-wins slot never drops,
+    # and once the movement thread has caught up, as it does at the rover's frame rate
+    def pipeline_ready():
+        while not automation.stages_stopped():
+            counts = automation.frame_slot.counts()
+            if counts['takes'] >= counts['puts'] and automation.movement_queue.empty():
+                return
+            time.sleep(0.0005)
+
+    # finished once every frame was analysed and shown
+    def drained():
+        frames = automation.frame_slot.counts()
+        shown = automation.display_slot.counts()
+        return (frames['takes'] >= frames['puts'] and
+                automation.stage_stats['analysis'].snapshot()['count'] >= frames['takes'] and
+                shown['takes'] + shown['drops'] >= shown['puts'])  # display may skip frames, as it does live
+
+    # a sequence looking for the frame after its turn gets the next recorded one straight away,
+    # instead of waiting up to two real seconds for the stream to publish it
+    def next_recorded_frame(timeout=2.0):
+        item = client.peek_frame()
+        return None if item is None else item[2]
+
+    client = ReplayClient(recording, gate=pipeline_ready)
+    RoverClient.shared_client = client
+    automation = Automation.Automation(cv_workers=cv_workers)
+    automation.renderer = NullRenderer()
+    automation.stage_stats['render'] = automation.renderer.stats
+    # poll the recorded obstacle readings often enough to keep up with frames going by much faster than 7 fps
+    automation.telemetry_interval = 0.01
+    automation.event_wait = 0.05
+    automation.wait_for_frame = next_recorded_frame
+
+    with open(os.devnull, 'w') as devnull:
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)
+        start = time.perf_counter()
+        with output:
+            automation.start_threads()
+            while not (client.finished.is_set() and drained()):
+                if timeout and time.perf_counter() - start > timeout:
+                    break
+                time.sleep(0.01)
+            # the recording is used up: queued commands would act on frames that never come, so drop them
+            # and only let a sequence already running finish
+            discarded = automation.movement_queue.qsize()
+            automation.clear_queue()
+            while automation.is_executing_sequence:
+                if timeout and time.perf_counter() - start > timeout:
+                    break
+                time.sleep(0.01)
+            seconds = time.perf_counter() - start
+            stage_stats = automation.get_stage_stats()
+            commands = list(client.commands)  # before stop_threads adds its own stop
+            automation.stop_threads()
+            time.sleep(0.2)
+
+    issued = {}
+    for _, direction, _ in commands:
+        issued[direction] = issued.get(direction, 0) + 1
+    recorded = {}
+    for event in recording.events('command'):
+        direction = event['data']['direction']
+        recorded[direction] = recorded.get(direction, 0) + 1
+    frames = automation.frame_slot.counts()['takes']
+    return {'frames': frames,
+            'seconds': seconds,
+            'fps': frames / seconds if seconds > 0 else 0.0,
+            'speedup': recording.duration() / seconds if seconds > 0 else 0.0,
+            'commands': issued,
+            'recorded_commands': recorded,
+            'sequences': [(name, result) for _, name, result in client.sequences],
+            'discarded': discarded,
+            'stages': stage_stats}
+
+# Show what a tuning change did to detection, frame by frame
+def compare_line_types(result, baseline):
+    before = {frame_id: line_type for frame_id, line_type in baseline['per_frame']}
+    changed = [(frame_id, before[frame_id], line_type) for frame_id, line_type in result['per_frame']
+               if frame_id in before and before[frame_id] != line_type]
+    compared = sum(1 for frame_id, _ in result['per_frame'] if frame_id in before)
+    return {'compared': compared, 'changed': changed}
+
+# Record, describe or replay a recording
+def main():
+    parser = argparse.ArgumentParser(description='record and replay rover sessions')
+    parser.add_argument('mode', choices=['record', 'info', 'replay'])
+    parser.add_argument('path', help='recording directory')
+    parser.add_argument('--url', default=RoverClient.url, help='record: robot API url')
+    parser.add_argument('--seconds', type=float, default=60.0, help='record: how long to record')
+    parser.add_argument('--through', choices=['processing', 'automation'], default='processing',
+                        help='replay: Processing.apply_overlay alone or the whole Automation pipeline')
+    parser.add_argument('--ref', help='replay: martian reference image, ref_marvin.jpeg if not given')
+    parser.add_argument('--cv-workers', type=int, default=0, help='replay automation: CV worker processes')
+    parser.add_argument('--timeout', type=float, help='replay automation: give up after this many seconds')
+    parser.add_argument('--json', help='replay: write the results to this file')
+    parser.add_argument('--compare', help='replay processing: earlier --json results to compare line types with')
+    parser.add_argument('--verbose', action='store_true', help="replay: keep the pipeline's own prints")
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        frames = record(args.url, args.path, args.seconds)
+        print(f'recorded {frames} frames to {args.path}')
+        return
+
+    recording = Recording(args.path)
+    if args.mode == 'info':
+        events = recording.events()
+        kinds = {}
+        for event in events:
+            kinds[event['type']] = kinds.get(event['type'], 0) + 1
+        duration = recording.duration()
+        print(f'{len(recording)} frames over {duration:.1f} s'
+              + (f' ({(len(recording) - 1) / duration:.1f} fps)' if duration > 0 else ''))
+        print('events: ' + (', '.join(f'{kind} {number}' for kind, number in kinds.items()) or 'none'))
+        return
+
+    if args.ref:
+        Processing.shared_detector = Processing.MartianDetector(args.ref)
+
+    if args.through == 'processing':
+        result = replay_processing(recording, args.verbose)
+        print(f"{result['frames']} frames in {result['seconds']:.1f} s: {result['fps']:.1f} fps, "
+              f"{result['speedup']:.1f}x real time")
+        print('line types: ' + ', '.join(f'{kind} {number}' for kind, number in result['line_types'].items()))
+        print(f"line type changes: {len(result['transitions']) - 1 if result['transitions'] else 0}, "
+              f"queued commands: {result['queued'] or 'none'}, martian stops: {result['stops']}")
+        if args.compare:
+            with open(args.compare) as f:
+                comparison = compare_line_types(result, json.load(f))
+            print(f"{len(comparison['changed'])} of {comparison['compared']} frames changed line type")
+            for frame_id, before, after in comparison['changed'][:20]:
+                print(f'  frame {frame_id}: {before} -> {after}')
+    else:
+        result = replay_automation(recording, args.cv_workers, args.timeout, args.verbose)
+        print(f"{result['frames']} frames in {result['seconds']:.1f} s: {result['fps']:.1f} fps, "
+              f"{result['speedup']:.1f}x real time")
+        print(f"commands issued: {result['commands'] or 'none'}")
+        print(f"commands in the recording: {result['recorded_commands'] or 'none'}")
+        programs = {}
+        for name, program_result in result['sequences']:
+            programs[f'{name} -> {program_result}'] = programs.get(f'{name} -> {program_result}', 0) + 1
+        print('programs run: ' + (', '.join(f'{name} {number}' for name, number in programs.items()) or 'none'))
+        print(f"queued commands dropped at the end of the recording: {result['discarded']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+TK RENDERER (TkRenderer class):
+1. __init__(panes, size, max_fps)
+   INPUT: panes (dict of pane name -> Tk Label), size (tuple width/height shown, default (400, 300)),
+          max_fps (float display refresh cap, default 30)
+   OUTPUT: Initialized TkRenderer object
+   SUMMARY: Gives each pane one PhotoImage that is reused for every frame
+
+2. start()
+   INPUT: None (must be called from the Tk main thread)
+   OUTPUT: None
+   SUMMARY: Starts the refresh loop on the Tk main loop
+
+3. submit(name, frame)
+   INPUT: name (string pane name), frame (OpenCV BGR image)
+   OUTPUT: Boolean (False once the panes are gone)
+   SUMMARY: Thread-safe hand-off of the newest frame for a pane; the resize and colour conversion happen here,
+            on the calling thread, so the Tk main loop only pastes
+
+4. render()
+   INPUT: None (runs on the Tk main loop via after())
+   OUTPUT: None
+   SUMMARY: Pastes the newest frame of each changed pane into its PhotoImage, then schedules itself again
+
+5. stop()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Ends the refresh loop after the current tick
+
+6. closed()
+   INPUT: None
+   OUTPUT: Boolean
+   SUMMARY: True once the refresh loop has stopped because the panes were destroyed or stop() was called
+"""
+
+import threading
+import time
+from tkinter import TclError
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+import Pipeline
+
+class TkRenderer:
+    # Give each pane one PhotoImage that is reused for every frame
+    def __init__(self, panes, size=(400, 300), max_fps=30):
+        self.panes = panes
+        self.size = size
+        self.interval_ms = max(1, int(1000 / max_fps))
+
+        self.lock = threading.Lock()
+        self.pending = {}  # pane name -> newest RGB frame not painted yet
+        self.last_source = {}  # pane name -> last frame object handed in, to skip resubmits
+        self.shown = {}  # pane name -> RGB frame currently on screen
+        self.photos = {}
+        self.running = False
+        self.stopped = False
+        self.stats = Pipeline.StageStats('render')
+
+        for name, label in panes.items():
+            photo = ImageTk.PhotoImage('RGB', size)
+            label.imgtk = photo
+            label.configure(image=photo)
+            self.photos[name] = photo
+
+    # Start the refresh loop on the Tk main loop
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.stopped = False
+            next(iter(self.panes.values())).after(self.interval_ms, self.render)
+
+    # Thread-safe hand-off of the newest frame for a pane
+    def submit(self, name, frame):
+        if self.stopped:
+            return False
+        if frame is self.last_source.get(name):
+            return True  # same frame object as last time, nothing new to show
+
+        # resize and convert here so the Tk main loop only has to paste
+        rgb = cv2.cvtColor(cv2.resize(frame, self.size), cv2.COLOR_BGR2RGB)
+        with self.lock:
+            self.last_source[name] = frame
+            self.pending[name] = rgb
+        return True
+
+    # Paste the newest frame of each changed pane into its PhotoImage, then schedule the next tick
+    def render(self):
+        try:
+            panes_exist = all(label.winfo_exists() for label in self.panes.values())
+        except TclError:
+            panes_exist = False  # the whole window is gone
+        if self.stopped or not panes_exist:
+            self.stopped = True
+            self.running = False
+            return
+
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        start = time.perf_counter()
+        painted = False
+        for name, rgb in pending.items():
+            shown = self.shown.get(name)
+            if shown is not None and np.array_equal(shown, rgb):
+                continue  # content unchanged, leave the pane alone
+            self.photos[name].paste(Image.fromarray(rgb))
+            self.shown[name] = rgb
+            painted = True
+        if painted:
+            self.stats.record(time.perf_counter() - start)
+
+        next(iter(self.panes.values())).after(self.interval_ms, self.render)
+
+    # End the refresh loop after the current tick
+    def stop(self):
+        self.stopped = True
+
+    # True once the refresh loop has stopped
+    def closed(self):
+        return self.stopped
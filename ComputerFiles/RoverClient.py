@@ -0,0 +1,401 @@
+"""
+FUNCTIONS:
+1. __init__(base_url, connect_timeout, read_timeout, retries, pool_size, use_channel)
+   INPUT: base_url (string robot API url), connect_timeout (float seconds), read_timeout (float seconds),
+          retries (int), pool_size (int max pooled connections), use_channel (bool, default True)
+   OUTPUT: Initialized RoverClient object
+   SUMMARY: Creates one keep-alive session with a connection pool, timeouts and a retry policy,
+            plus the TCP command channel used for movement commands
+
+2. move(direction, duration)
+   INPUT: direction (string: 'forward', 'backward', 'left', 'right', 'stop'),
+          duration (float seconds before the Pi stops the motors itself, optional; None runs until the next command)
+   OUTPUT: Response from the robot (dict with direction, plus Pi timestamp and round trip over the channel)
+   SUMMARY: Sends a movement command over the TCP command channel, falling back to POST /moving;
+            returns right away, the Pi times the stop
+
+3. get_frame(after, wait)
+   INPUT: after (int id of the frame the caller already has, optional), wait (float seconds to long-poll)
+   OUTPUT: (frame_id, capture timestamp, decoded OpenCV frame) or None if there is no newer frame
+   SUMMARY: Fetches the latest raw JPEG from /vidstream/latest, blocking on the Pi until a new one exists
+
+4. frame_stream()
+   INPUT: None
+   OUTPUT: Generator of (frame_id, capture timestamp, decoded OpenCV frame)
+   SUMMARY: Opens one long-lived MJPEG connection and yields each JPEG part as it arrives
+
+5. get_obstacle()
+   INPUT: None
+   OUTPUT: Boolean (True if the ultrasonic sensor sees an obstacle)
+   SUMMARY: Reads the obstacle flag from /obstacle_status
+
+6. get_log()
+   INPUT: None
+   OUTPUT: Last command log entry (dict with IP Address, Direction Sent, Timestamp)
+   SUMMARY: Reads the last logged command from /logging
+
+7. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Closes every pooled connection
+
+8. get_telemetry()
+   INPUT: None
+   OUTPUT: dict with frame_id, timestamp, distance, detect_flag, direction and log
+   SUMMARY: Reads frame, obstacle and command state from /telemetry in one request
+
+9. get_events(after, wait)
+   INPUT: after (int last event id already seen, default 0), wait (float seconds to long-poll)
+   OUTPUT: dict with events (list of event dicts, e.g. reflex stops) and last_id
+   SUMMARY: Fetches events newer than after from /events, blocking on the Pi until one happens
+
+10. run_sequence(steps, name)
+    INPUT: steps (list of step dicts, see RaspPiFiles/Sequence.py), name (string, optional)
+    OUTPUT: Status dict of the program now running on the Pi
+    SUMMARY: Uploads a whole motion program to POST /sequence in one request
+
+11. get_sequence(wait)
+    INPUT: wait (float seconds to long-poll for the program to end, default 0)
+    OUTPUT: Status dict (id, state, steps_done, current, result, elapsed, trace) or None
+    SUMMARY: Reads the progress of the running or last program from /sequence
+
+12. cancel_sequence()
+    INPUT: None
+    OUTPUT: dict with cancelled and status
+    SUMMARY: Cancels the running program and stops the motors
+
+13. get_metrics(reset)
+    INPUT: reset (bool, clear the Pi's timers after reading them, default False)
+    OUTPUT: dict with api and video Metrics snapshots
+    SUMMARY: Reads the Pi's latency histograms from /metrics
+
+14. record_frame(frame_id, timestamp, jpeg, started)
+    INPUT: frame_id (int), timestamp (float capture time from the Pi), jpeg (numpy bytes),
+           started (float perf_counter before decoding)
+    OUTPUT: Decoded OpenCV frame or None
+    SUMMARY: Decodes one received JPEG and records client.decode, client.frame_age and the frame counters;
+             with a recorder attached, the JPEG bytes are also saved as received
+
+RECORDING:
+Setting client.recorder to a Recording.Recorder saves every received frame, telemetry reply, Pi event,
+movement command and uploaded program, for Recording.py to replay later.
+
+COMMAND CHANNEL (CommandChannel class):
+1. __init__(host, port, timeout, retry_after)
+   INPUT: host (string), port (int, default 5001), timeout (float seconds), retry_after (float seconds)
+   OUTPUT: Initialized CommandChannel object
+   SUMMARY: Holds one persistent TCP connection to the Pi command server
+
+2. send(direction, duration)
+   INPUT: direction (string movement command), duration (float seconds, optional)
+   OUTPUT: Acknowledgment dict (direction, timestamp on the Pi, round trip seconds) or None if unavailable
+   SUMMARY: Sends one compact command frame and waits for its acknowledgment
+
+3. connect()
+   INPUT: None
+   OUTPUT: Boolean (True if connected)
+   SUMMARY: Opens the socket unless a recent failure means the channel should be skipped for now
+
+4. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Drops the connection so the next command reconnects or falls back to HTTP
+
+METRICS:
+client.command_channel and client.command_http (command round trips), client.frame_fetch (a /vidstream/latest
+request, including any long-poll wait), client.decode, and client.frame_age (capture on the Pi to decoded here,
+only meaningful while the two clocks are synchronised).
+
+MODULE FUNCTIONS:
+1. get_client()
+   INPUT: None
+   OUTPUT: Shared RoverClient object
+   SUMMARY: Returns the one client shared by Automation, GUI and Processing so they reuse the same pool
+"""
+
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
+import cv2
+import Metrics
+
+url = 'http://192.168.240.25:5000/'
+
+# Must match RaspPiFiles/CommandServer.py
+COMMAND_REQUEST = struct.Struct('!BII')
+COMMAND_RESPONSE = struct.Struct('!IBBd')
+command_opcodes = {'forward': 1, 'backward': 2, 'left': 3, 'right': 4, 'stop': 5}
+command_port = 5001
+
+class CommandChannel:
+    # Hold one persistent TCP connection to the Pi command server
+    def __init__(self, host, port=command_port, timeout=0.5, retry_after=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.sock = None
+        self.seq = 0
+        self.failed_at = None
+        self.lock = threading.Lock()  # gui and automation threads share the socket
+
+    # Open the socket unless a recent failure means the channel should be skipped for now
+    def connect(self):
+        if self.sock is not None:
+            return True
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_after:
+            return False
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.failed_at = None
+            return True
+        except OSError:
+            self.failed_at = time.monotonic()
+            return False
+
+    # Send one compact command frame and wait for its acknowledgment
+    def send(self, direction, duration=None):
+        opcode = command_opcodes.get(direction)
+        if opcode is None:
+            return None
+        duration_ms = int(round(1000 * duration)) if duration else 0  # 0 means until the next command
+        with self.lock:
+            if not self.connect():
+                return None
+            self.seq = (self.seq + 1) % 2 ** 32
+            try:
+                start = time.perf_counter()
+                self.sock.sendall(COMMAND_REQUEST.pack(opcode, self.seq, duration_ms))
+
+                data = b''
+                while len(data) < COMMAND_RESPONSE.size:
+                    chunk = self.sock.recv(COMMAND_RESPONSE.size - len(data))
+                    if not chunk:
+                        raise ConnectionError('command channel closed')
+                    data += chunk
+                round_trip = time.perf_counter() - start
+
+                seq, _, status, pi_time = COMMAND_RESPONSE.unpack(data)
+                if seq != self.seq or status != 0:
+                    raise ConnectionError(f'bad acknowledgment (seq {seq}, status {status})')
+                return {'direction': direction, 'timestamp': pi_time, 'round_trip': round_trip}
+            except OSError as e:
+                print(f'command channel unavailable, falling back to http: {e}')
+                self.close()
+                self.failed_at = time.monotonic()
+                return None
+
+    # Drop the connection so the next command reconnects or falls back to HTTP
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+class RoverClient:
+    # Create one keep-alive session with a connection pool, timeouts and a retry policy
+    def __init__(self, base_url=url, connect_timeout=1.0, read_timeout=2.0, retries=2, pool_size=8,
+                 use_channel=True):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.channel = CommandChannel(urlparse(base_url).hostname) if use_channel else None
+        self.recorder = None  # Recording.Recorder while record mode is on
+
+        # connection errors are retried for every method; read and status retries
+        # only happen for GETs since a repeated POST could repeat a command
+        retry = Retry(total=retries, backoff_factor=0.05, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # Send a movement command over the TCP command channel, falling back to POST /moving
+    def move(self, direction, duration=None):
+        if self.channel is not None:
+            ack = self.channel.send(direction, duration)
+            if ack is not None:
+                Metrics.observe('client.command_channel', ack['round_trip'])
+                if self.recorder is not None:
+                    self.recorder.add_event('command', {'direction': direction, 'duration': duration})
+                return ack
+
+        command = {'direction': direction}
+        if duration:
+            command['duration'] = duration
+        start = time.perf_counter()
+        response = self.session.post(self.base_url + 'moving', json=command, timeout=self.timeout)
+        response.raise_for_status()
+        Metrics.observe('client.command_http', time.perf_counter() - start)
+        if self.recorder is not None:
+            self.recorder.add_event('command', {'direction': direction, 'duration': duration})
+        return response.json()
+
+    # Fetch the latest raw JPEG from /vidstream/latest, blocking on the Pi until a new one exists
+    def get_frame(self, after=None, wait=0.0):
+        params = {}
+        if after is not None:
+            params = {'after': after, 'timeout': wait}
+        # the read timeout has to outlast the long-poll on the pi
+        timeout = (self.timeout[0], self.timeout[1] + wait)
+        start = time.perf_counter()
+        response = self.session.get(self.base_url + 'vidstream/latest', params=params, timeout=timeout)
+        response.raise_for_status()
+        received = time.perf_counter()
+        Metrics.observe('client.frame_fetch', received - start)
+        if response.status_code in (204, 304) or not response.content:
+            return None
+
+        frame_id = int(response.headers.get('X-Frame-Id', 0))
+        timestamp = float(response.headers.get('X-Capture-Time', 'nan'))
+        np_image = np.frombuffer(response.content, dtype=np.uint8)
+        frame = self.record_frame(frame_id, timestamp, np_image, received)
+        if frame is None:
+            return None
+        return frame_id, timestamp, frame
+
+    # Open one long-lived MJPEG connection and yield each JPEG part as it arrives
+    def frame_stream(self):
+        response = self.session.get(self.base_url + 'vidstream/mjpeg', stream=True, timeout=self.timeout)
+        response.raise_for_status()
+        buffer = bytearray()
+        try:
+            for chunk in response.iter_content(chunk_size=8192):
+                buffer += chunk
+                while True:
+                    # every part is "--frame" + headers + blank line + raw jpeg bytes
+                    header_end = buffer.find(b'\r\n\r\n')
+                    if header_end == -1:
+                        break
+
+                    headers = {}
+                    for line in bytes(buffer[:header_end]).split(b'\r\n'):
+                        if b':' in line:
+                            key, value = line.split(b':', 1)
+                            headers[key.strip().lower()] = value.strip()
+                    length = headers.get(b'content-length')
+                    if length is None:
+                        # not a frame header, throw it away and look for the next one
+                        del buffer[:header_end + 4]
+                        continue
+
+                    length = int(length)
+                    start = header_end + 4
+                    if len(buffer) < start + length:
+                        break  # rest of the jpeg hasn't arrived yet
+
+                    np_image = np.frombuffer(bytes(buffer[start:start + length]), dtype=np.uint8)
+                    del buffer[:start + length]
+
+                    frame_id = int(headers.get(b'x-frame-id', 0))
+                    timestamp = float(headers.get(b'x-capture-time', b'nan'))
+                    frame = self.record_frame(frame_id, timestamp, np_image, time.perf_counter())
+                    if frame is None:
+                        print('Failed to decode image')
+                        continue
+                    yield frame_id, timestamp, frame
+        finally:
+            response.close()
+
+    # Read the obstacle flag from /obstacle_status
+    def get_obstacle(self):
+        response = self.session.get(self.base_url + 'obstacle_status', timeout=self.timeout)
+        response.raise_for_status()
+        return bool(response.json().get('detect_flag', False))
+
+    # Read frame, obstacle and command state from /telemetry in one request
+    def get_telemetry(self):
+        response = self.session.get(self.base_url + 'telemetry', timeout=self.timeout)
+        response.raise_for_status()
+        telemetry = response.json()
+        if self.recorder is not None:
+            self.recorder.add_event('telemetry', telemetry)
+        return telemetry
+
+    # Fetch events newer than after from /events, blocking on the Pi until one happens
+    def get_events(self, after=0, wait=0.0):
+        # the read timeout has to outlast the long-poll on the pi
+        timeout = (self.timeout[0], self.timeout[1] + wait)
+        response = self.session.get(self.base_url + 'events', params={'after': after, 'timeout': wait},
+                                    timeout=timeout)
+        response.raise_for_status()
+        reply = response.json()
+        if self.recorder is not None:
+            for event in reply['events']:
+                self.recorder.add_event('pi_event', event)
+        return reply
+
+    # Upload a whole motion program to POST /sequence in one request
+    def run_sequence(self, steps, name=None):
+        response = self.session.post(self.base_url + 'sequence', json={'steps': steps, 'name': name},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        if self.recorder is not None:
+            self.recorder.add_event('sequence', {'name': name, 'steps': steps})
+        return response.json()
+
+    # Read the progress of the running or last program from /sequence
+    def get_sequence(self, wait=0.0):
+        timeout = (self.timeout[0], self.timeout[1] + wait)
+        response = self.session.get(self.base_url + 'sequence', params={'timeout': wait}, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    # Cancel the running program and stop the motors
+    def cancel_sequence(self):
+        response = self.session.post(self.base_url + 'sequence/cancel', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    # Read the Pi's latency histograms from /metrics
+    def get_metrics(self, reset=False):
+        params = {'reset': 1} if reset else {}
+        response = self.session.get(self.base_url + 'metrics', params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    # Decode one received JPEG, record how long that took and how old the frame is, and save it if recording
+    def record_frame(self, frame_id, timestamp, jpeg, started):
+        frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        Metrics.observe('client.decode', time.perf_counter() - started)
+        if self.recorder is not None:
+            self.recorder.add_frame(frame_id, timestamp, jpeg)
+        if frame is None:
+            Metrics.count('client.bad_frames')
+            return None
+        Metrics.count('client.frames')
+        if timestamp == timestamp:  # nan when the pi sent no capture time
+            Metrics.observe('client.frame_age', max(time.time() - timestamp, 0.0))
+        return frame
+
+    # Read the last logged command from /logging
+    def get_log(self):
+        response = self.session.get(self.base_url + 'logging', timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    # Close every pooled connection
+    def close(self):
+        if self.channel is not None:
+            self.channel.close()
+        self.session.close()
+
+shared_client = None
+shared_client_lock = threading.Lock()
+
+# Return the one client shared by Automation, GUI and Processing so they reuse the same pool
+def get_client():
+    global shared_client
+    with shared_client_lock:
+        if shared_client is None:
+            shared_client = RoverClient()
+        return shared_client
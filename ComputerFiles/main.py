@@ -30,6 +30,33 @@ IMPORTED MODULES AND THEIR FUNCTIONS:
    - Martian detection using ORB feature matching
    - HSV masking and color space conversions
 
+5. RoverClient - Shared connection to the robot API
+   - One pooled keep-alive session with connect/read timeouts and retries
+   - Movement commands, frames, obstacle status and command log
+
+6. Pipeline - Hand-offs between the video pipeline stages
+   - Single-slot "latest value wins" buffers with drop counters
+   - Per-stage throughput reporting
+
+7. ParallelProcessing - Optional multi-process frame analysis
+   - Worker processes read frames from shared memory slots
+   - Martian and line detection run as separate tasks on the same frame
+   - Results are handed back in frame order; enable with ROVER_CV_WORKERS=<workers>
+
+8. Renderer - Throttled drawing of the video panes
+   - Frames are painted from the Tk main loop via root.after at a capped refresh rate
+   - One reused PhotoImage per pane, unchanged panes are skipped
+
+9. Metrics - Lightweight timers and counters
+   - Log-spaced latency histograms for frame fetch, decode, each vision stage, movement queue wait and
+     command round trips
+   - Shown with the Pi's /metrics in the GUI stats window
+
+10. Recording - Session recording and replay
+   - Frames are stored as received with an index for random access, plus telemetry, events and commands
+   - Replays through Processing or the whole Automation pipeline faster than real time
+   - Record while driving with ROVER_RECORD=<directory>, or run python Recording.py
+
 APPLICATION FLOW:
 1. Import all required modules
 2. Launch GUI system via GUI.launch_guis()
@@ -45,5 +72,6 @@ import Processing
 from tkinter import *
 from sqlite3 import *
 
-# Launch the main GUI application
-GUI.launch_guis()
+# Launch the main GUI application (guarded so CV worker processes can import this module safely)
+if __name__ == '__main__':
+    GUI.launch_guis()
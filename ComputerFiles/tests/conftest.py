@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other by plain name, as they do when run from ComputerFiles/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
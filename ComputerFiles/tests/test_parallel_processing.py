@@ -0,0 +1,126 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pytest
+import Benchmark
+import ParallelProcessing
+import Processing
+
+# Executor stand-in whose futures the test finishes by hand, in whatever order it likes
+class ManualPool:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on  # submit call number that raises, like a pool whose workers died
+        self.submitted = []
+
+    def submit(self, task, slot, shape):
+        if len(self.submitted) + 1 == self.fail_on:
+            raise BrokenProcessPool('worker died')
+        future = Future()
+        self.submitted.append((task.__name__, slot, future))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+# Analyzer with its process pool swapped for a ManualPool
+def manual_analyzer(delivered, split=False, pool=None):
+    analyzer = ParallelProcessing.ParallelAnalyzer(lambda frame_id, frame, result: delivered.append(frame_id),
+                                                   workers=2, split=split, slot_count=4)
+    analyzer.pool.shutdown()  # no worker process has been started yet
+    analyzer.pool = pool or ManualPool()
+    return analyzer
+
+def blank_frame():
+    return np.zeros((30, 40, 3), dtype=np.uint8)
+
+def lines_result():
+    return {'overlay': None, 'line_type': None, 'commands': []}
+
+def test_results_are_delivered_in_frame_order_whatever_order_workers_finish_in():
+    delivered = []
+    analyzer = manual_analyzer(delivered)
+    try:
+        for frame_id in (1, 2, 3):
+            assert analyzer.submit(frame_id, blank_frame())
+        futures = [future for _, _, future in analyzer.pool.submitted]
+
+        futures[2].set_result(lines_result())  # frame 3 first
+        futures[1].set_result(lines_result())
+        assert delivered == []  # both wait for frame 1
+        futures[0].set_result(lines_result())
+        assert delivered == [1, 2, 3]
+        assert sorted(analyzer.free_slots) == [0, 1, 2, 3]
+    finally:
+        analyzer.close()
+
+def test_split_results_are_merged_and_ordered_with_results_that_needed_no_worker():
+    delivered = []
+    analyzer = manual_analyzer(delivered, split=True)
+    try:
+        assert analyzer.submit(1, blank_frame())
+        analyzer.submit_result(2, blank_frame(), lines_result())
+        assert delivered == []
+        parts = {name: future for name, _, future in analyzer.pool.submitted}
+        parts['lines_task'].set_result(lines_result())
+        assert delivered == []  # the martian half is still out
+        parts['martian_task'].set_result({'existence': False, 'matches': 0, 'confidence': 0.0})
+        assert delivered == [1, 2]
+    finally:
+        analyzer.close()
+
+def test_failed_worker_drops_its_frame_without_blocking_later_ones():
+    delivered = []
+    analyzer = manual_analyzer(delivered)
+    try:
+        analyzer.submit(1, blank_frame())
+        analyzer.submit(2, blank_frame())
+        futures = [future for _, _, future in analyzer.pool.submitted]
+        futures[1].set_result(lines_result())
+        futures[0].set_exception(RuntimeError('bad frame'))
+        assert delivered == [2]
+        assert len(analyzer.free_slots) == 4
+    finally:
+        analyzer.close()
+
+def test_failed_submit_rolls_back():
+    delivered = []
+    analyzer = manual_analyzer(delivered, split=True, pool=ManualPool(fail_on=2))
+    try:
+        with pytest.raises(BrokenProcessPool):
+            analyzer.submit(1, blank_frame())
+        _, _, martian_future = analyzer.pool.submitted[0]
+        assert martian_future.cancelled()
+        assert sorted(analyzer.free_slots) == [0, 1, 2, 3]
+        assert not analyzer.order and not analyzer.entries
+
+        # the ordering isn't stuck behind the frame that never went in
+        analyzer.submit_result(2, blank_frame(), lines_result())
+        assert delivered == [2]
+    finally:
+        analyzer.close()
+
+def test_oversized_frame_is_refused():
+    analyzer = manual_analyzer([])
+    try:
+        assert not analyzer.submit(1, np.zeros((1000, 1000, 3), dtype=np.uint8))
+        assert len(analyzer.free_slots) == 4 and not analyzer.pool.submitted
+    finally:
+        analyzer.close()
+
+def test_worker_processes_agree_with_one_thread(tmp_path):
+    ref_path = Benchmark.reference_image(str(tmp_path / 'ref.png'))
+    frames = Benchmark.track_frames(8, ref_path)
+    detector = Processing.MartianDetector(ref_path)
+    expected = [Processing.analyze(frame, detector)['line_type'] for frame in frames]
+
+    delivered = []
+    analyzer = ParallelProcessing.ParallelAnalyzer(
+        lambda frame_id, frame, result: delivered.append((frame_id, result['line_type'])),
+        workers=2, ref_path=ref_path)
+    try:
+        for frame_id, frame in enumerate(frames, 1):
+            assert analyzer.wait_ready(timeout=60)
+            assert analyzer.submit(frame_id, frame)
+    finally:
+        analyzer.close()  # waits for every task, so every result has been delivered
+    assert delivered == list(zip(range(1, len(frames) + 1), expected))
@@ -0,0 +1,75 @@
+import threading
+import time
+import Metrics
+import Pipeline
+
+def test_newest_value_wins_and_the_overwritten_one_counts_as_dropped():
+    slot = Pipeline.LatestSlot('frames')
+    slot.put('first')
+    slot.put('second')
+    assert slot.get(timeout=0) == (2, 'second')
+    assert slot.counts() == {'puts': 2, 'takes': 1, 'drops': 1}
+
+def test_taken_value_is_not_handed_out_twice():
+    slot = Pipeline.LatestSlot()
+    slot.put('only')
+    assert slot.get(timeout=0) == (1, 'only')
+    assert slot.get(timeout=0.01) is None
+    slot.put('next')  # the last one was taken, so nothing is dropped
+    assert slot.get(after=1, timeout=0) == (2, 'next')
+    assert slot.counts()['drops'] == 0
+
+def test_get_blocks_until_a_value_arrives():
+    slot = Pipeline.LatestSlot()
+    results = []
+    reader = threading.Thread(target=lambda: results.append(slot.get(timeout=2.0)))
+    reader.start()
+    time.sleep(0.05)
+    assert results == []  # still waiting
+    slot.put('frame')
+    reader.join(2.0)
+    assert results == [(1, 'frame')]
+
+def test_get_times_out_with_none():
+    slot = Pipeline.LatestSlot()
+    start = time.monotonic()
+    assert slot.get(timeout=0.05) is None
+    assert time.monotonic() - start >= 0.05
+    assert slot.counts() == {'puts': 0, 'takes': 0, 'drops': 0}
+
+def test_close_wakes_a_waiting_reader():
+    slot = Pipeline.LatestSlot()
+    results = []
+    reader = threading.Thread(target=lambda: results.append(slot.get(timeout=5.0)))
+    reader.start()
+    time.sleep(0.05)
+    slot.close()
+    reader.join(1.0)
+    assert not reader.is_alive()
+    assert results == [None]
+
+def test_close_still_hands_out_a_value_nobody_took():
+    slot = Pipeline.LatestSlot()
+    slot.put('last')
+    slot.close()
+    assert slot.get(timeout=0) == (1, 'last')
+    assert slot.get(timeout=0) is None
+
+def test_stage_stats_count_items_and_report_the_output_drops():
+    Metrics.reset()
+    slot = Pipeline.LatestSlot('display')
+    stats = Pipeline.StageStats('analysis', output=slot, report_every=0)
+    slot.put('a')
+    slot.put('b')
+    for _ in range(3):
+        stats.record(0.002)
+    snapshot = stats.snapshot()
+    assert snapshot['count'] == 3 and snapshot['drops'] == 1
+    assert Metrics.snapshot()['timers']['stage.analysis']['count'] == 3
+
+def test_timed_queue_is_fifo():
+    timed = Pipeline.TimedQueue('test')
+    for item in range(3):
+        timed.put(item)
+    assert [timed.get_nowait() for _ in range(3)] == [0, 1, 2]
+    assert timed.empty()
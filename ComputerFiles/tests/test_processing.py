@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+import Processing
+
+# Random BGR frame of the given size
+def random_frame(height, width, seed):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+# Frame holding every (saturation, value) pair once, with random hues
+def every_saturation_value_frame():
+    hsv = np.empty((256, 256, 3), dtype=np.uint8)
+    hsv[:, :, 0] = np.random.default_rng(0).integers(0, 180, (256, 256), dtype=np.uint8)
+    hsv[:, :, 1] = np.arange(256, dtype=np.uint8)[:, None]
+    hsv[:, :, 2] = np.arange(256, dtype=np.uint8)[None, :]
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+# The fused table lookup has to give exactly what the two separate passes give
+@pytest.mark.parametrize('width', [400, 333, 64, 7])
+@pytest.mark.parametrize('height', [300, 17, 1])
+def test_bluescale_mask_matches_two_pass(width, height):
+    frame = random_frame(height, width, width * 1000 + height)
+    expected = Processing.hsv_mask(Processing.bluescale(frame))
+    assert np.array_equal(Processing.bluescale_mask(frame), expected)
+
+def test_bluescale_mask_matches_two_pass_for_every_saturation_and_value():
+    frame = every_saturation_value_frame()
+    expected = Processing.hsv_mask(Processing.bluescale(frame))
+    assert np.array_equal(Processing.bluescale_mask(frame), expected)
+
+def test_bluescale_mask_matches_two_pass_for_every_colour():
+    colours = np.arange(2 ** 24, dtype=np.uint32)
+    frame = np.stack([(colours >> 16) & 255, (colours >> 8) & 255, colours & 255], axis=1).astype(np.uint8)
+    frame = frame.reshape(-1, 4096, 3)
+    expected = Processing.hsv_mask(Processing.bluescale(frame))
+    assert np.array_equal(Processing.bluescale_mask(frame), expected)
+
+def test_bluescale_mask_matches_two_pass_on_a_cropped_view():
+    frame = random_frame(300, 450, 1)[:, 25:425]
+    expected = Processing.hsv_mask(Processing.bluescale(frame))
+    assert np.array_equal(Processing.bluescale_mask(frame), expected)
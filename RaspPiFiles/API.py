@@ -1,22 +1,22 @@
 """
 FUNCTIONS:
-1. FWD()
-   INPUT: None
+1. FWD(duration)
+   INPUT: duration (float seconds, optional; None runs until the next command)
    OUTPUT: JSON response with direction 'forward'
    SUMMARY: Sets direction to forward, calls motor forward function, returns JSON confirmation
 
-2. BACKWD()
-   INPUT: None
+2. BACKWD(duration)
+   INPUT: duration (float seconds, optional; None runs until the next command)
    OUTPUT: JSON response with direction 'backward'
    SUMMARY: Sets direction to backward, calls motor backward function, returns JSON confirmation
 
-3. LEFT()
-   INPUT: None
+3. LEFT(duration)
+   INPUT: duration (float seconds, optional; None runs until the next command)
    OUTPUT: JSON response with direction 'left'
    SUMMARY: Sets direction to left, calls motor left function, returns JSON confirmation
 
-4. RIGHT()
-   INPUT: None
+4. RIGHT(duration)
+   INPUT: duration (float seconds, optional; None runs until the next command)
    OUTPUT: JSON response with direction 'right'
    SUMMARY: Sets direction to right, calls motor right function, returns JSON confirmation
 
@@ -31,9 +31,10 @@ FUNCTIONS:
    SUMMARY: Returns landing page message identifying API creator
 
 7. direction()
-   INPUT: JSON with direction field (POST) or None (GET)
-   OUTPUT: JSON response with movement confirmation or last command
-   SUMMARY: Handles movement commands via POST and returns status via GET
+   INPUT: JSON with direction and optional duration (float seconds; legacy key time) fields (POST) or None (GET)
+   OUTPUT: JSON response with movement confirmation or last command; 400 with an error for an unknown direction
+   SUMMARY: Handles movement commands via POST and returns status via GET; timed moves return immediately
+            and the motion scheduler stops them
 
 8. log_direction(the_direction, ip_addr)
    INPUT: the_direction (string), ip_addr (string) - optional parameters
@@ -41,66 +42,223 @@ FUNCTIONS:
    SUMMARY: Logs movement commands with timestamp and IP, returns log data on GET request
 
 9. video_stream()
-   INPUT: Base64 encoded frame (POST) or None (GET)
-   OUTPUT: Success message (POST) or base64 frame (GET)
-   SUMMARY: Receives video frames via POST and serves latest frame via GET
+   INPUT: Raw JPEG body or base64 encoded frame (POST), optional after/timeout query parameters (GET)
+   OUTPUT: Success message (POST), base64 frame with frame id and timestamp, or 304 if nothing newer (GET)
+   SUMMARY: Caches incoming JPEG bytes via POST and serves them without re-encoding via GET
 
 10. get_obstacle_status()
     INPUT: None (GET request)
-    OUTPUT: JSON with distance sensor reading
-    SUMMARY: Returns current obstacle detection status from ultrasonic sensor
+    OUTPUT: JSON with detect_flag, filtered distance and approach_rate
+    SUMMARY: Returns current obstacle detection status from the cached sensor reading
+
+11. mjpeg_frames()
+    INPUT: None
+    OUTPUT: Generator of multipart/x-mixed-replace chunks
+    SUMMARY: Waits for each new frame and yields it as a raw JPEG part with its length
+
+12. mjpeg_stream()
+    INPUT: None (GET request)
+    OUTPUT: Long-lived multipart/x-mixed-replace response of JPEG frames
+    SUMMARY: Pushes raw JPEG bytes over one connection instead of base64 JSON polling
+
+13. store_frame(jpeg, timestamp)
+    INPUT: jpeg (encoded JPEG bytes), timestamp (float capture time, optional)
+    OUTPUT: frame_id (int)
+    SUMMARY: Caches encoded frame bytes with a sequence number and wakes up waiting streams
+
+14. get_latest_frame()
+    INPUT: None
+    OUTPUT: Decoded OpenCV frame or None
+    SUMMARY: Lazily decodes the cached JPEG only when a server-side consumer needs pixels
+
+15. latest_jpeg()
+    INPUT: Optional after/timeout query parameters (GET request)
+    OUTPUT: Raw image/jpeg response with X-Frame-Id and X-Capture-Time headers, or 304 if nothing newer
+    SUMMARY: Serves the cached JPEG bytes as-is with no base64 or JSON wrapping
+
+16. watch_frame_ring(ring)
+    INPUT: ring (FrameRing attached to the shared memory written by Video.py)
+    OUTPUT: None (continuous loop)
+    SUMMARY: Picks up each new frame from shared memory and caches it like a posted frame
+
+17. start_frame_ring()
+    INPUT: None (reads ROVER_FRAME_RING environment variable)
+    OUTPUT: Watcher thread or None if no ring is available
+    SUMMARY: Attaches to the frame ring set up by main.py and starts the watcher thread
+
+18. run_channel_command(the_direction, ip_addr, duration)
+    INPUT: the_direction (string), ip_addr (string), duration (float seconds, optional)
+    OUTPUT: Boolean (False for an unknown direction)
+    SUMMARY: Logs and runs a movement command received over the TCP command channel
+
+19. start_command_channel()
+    INPUT: None
+    OUTPUT: CommandServer object
+    SUMMARY: Starts the low-latency TCP command channel next to the REST API
+
+20. wait_for_frame(after_id, timeout)
+    INPUT: after_id (int frame id the client already has, optional), timeout (float seconds)
+    OUTPUT: (jpeg bytes, frame id, timestamp) or None if no newer frame arrived in time
+    SUMMARY: Long-polls for a frame other than after_id so clients never re-download the same frame
+
+21. frame_request_args()
+    INPUT: None (reads after and timeout query parameters)
+    OUTPUT: (after_id, timeout)
+    SUMMARY: Parses the conditional-fetch parameters shared by the frame GET routes
+
+22. telemetry()
+    INPUT: None (GET request)
+    OUTPUT: JSON with frame_id, timestamp, distance, approach_rate, detect_flag, direction and log
+    SUMMARY: Returns everything the automation loop checks each cycle in one response
+
+23. start_sensor_service()
+    INPUT: None
+    OUTPUT: Sensor.SensorService object
+    SUMMARY: Starts sampling the ultrasonic sensor in the background so routes read a cached, filtered value,
+             with the reflex stop checking every sample
+
+24. sensor_reading()
+    INPUT: None
+    OUTPUT: dict with distance, approach_rate and detect_flag
+    SUMMARY: Returns the cached sensor reading, or reads the sensor directly if the service has no sample yet
+
+25. publish_event(event)
+    INPUT: event (dict with at least a type key)
+    OUTPUT: event id (int)
+    SUMMARY: Adds an event to the recent-events log and wakes clients long-polling /events
+
+26. wait_for_events(after_id, timeout)
+    INPUT: after_id (int last event id the client has, default 0), timeout (float seconds)
+    OUTPUT: List of event dicts newer than after_id (empty if none arrived in time)
+    SUMMARY: Long-polls the event log so clients hear about reflex stops without polling fast
+
+27. get_events()
+    INPUT: Optional after/timeout query parameters (GET request)
+    OUTPUT: JSON with events and last_id
+    SUMMARY: Serves the event log over HTTP, blocking until something newer than after happens
+
+28. reflex_tripped(event)
+    INPUT: event (dict from Reflex.ReflexStop)
+    OUTPUT: None
+    SUMMARY: Ends the forward move in the motion scheduler, so its timed stop never fires, then records the
+             reflex stop as a stop command and publishes it to clients
+
+29. timed_stop(direction, late)
+    INPUT: direction (string that was stopped), late (float seconds past the deadline)
+    OUTPUT: None
+    SUMMARY: Marks a timed move as finished once the motion scheduler has stopped it and publishes a move_done event
+
+30. sequence()
+    INPUT: JSON with steps (list, see Sequence.py) and optional name (POST), optional timeout query parameter (GET)
+    OUTPUT: Status of the new program, 400 with an error for a bad program (POST); status of the running or
+            last program, waiting up to timeout seconds for it to end (GET)
+    SUMMARY: Runs a whole motion program on the Pi so its step timing never depends on network round trips
+
+31. cancel_sequence()
+    INPUT: None (POST request)
+    OUTPUT: JSON with cancelled (bool) and the program status
+    SUMMARY: Cancels the running program and stops the motors
+
+32. sequence_finished(status)
+    INPUT: status (dict from Sequence.SequenceRunner)
+    OUTPUT: None
+    SUMMARY: Publishes a sequence_done event when a program ends
+
+33. start_services()
+    INPUT: None
+    OUTPUT: None
+    SUMMARY: Starts the frame ring watcher, TCP command channel and sensor service in the serving process
+
+34. run_server(mode, host, port, threads)
+    INPUT: mode (string 'dev', 'threaded' or 'waitress'), host (string), port (int),
+           threads (int worker threads for waitress)
+    OUTPUT: None (serves until the process exits)
+    SUMMARY: Serves the API with the chosen worker model:
+             dev      - Werkzeug dev server with the debugger and reloader, for working on the code
+             threaded - Werkzeug server without debugger or reloader, one thread per request (default)
+             waitress - waitress WSGI server with a fixed thread pool, if waitress is installed;
+                        every open MJPEG stream or long-poll holds one of its threads
+
+35. start_request_timer()
+    INPUT: None (runs before every request)
+    OUTPUT: None
+    SUMMARY: Notes when Flask started handling the request
+
+36. finish_request_timer(response)
+    INPUT: response (Flask response)
+    OUTPUT: The same response
+    SUMMARY: Records the handling time under api.<route> and counts the response status; long-polls include
+             their wait and streams only their set-up
+
+37. metrics()
+    INPUT: Optional reset query parameter (GET request)
+    OUTPUT: JSON with the api timers and counters and the latest ones saved by Video.py
+    SUMMARY: Serves the Pi's latency histograms so load can be traced without a debugger
+
+SHARED STATE:
+Every request thread goes through State.RoverState (direction, command log, frame cache, events),
+which keeps each part behind its own lock. Motion, sensor and sequence objects do their own locking.
 """
 
-from flask import Flask, jsonify, request
-from datetime import *
+from flask import Flask, Response, g, jsonify, request
 import base64
-import cv2
-import numpy as np
+import os
+import threading
 import time
 
+from CommandServer import CommandServer
+from FrameRing import FrameRing
+import Metrics
+import Motion
 import Motor as motor
+import Reflex
+import Sensor
+import Sequence
+import State
 
-global result
-json_thing = {'direction': None}  # sets up dictionary to be edited later on in functions
-final_log = {}
+# direction, command log, frame cache and events, shared by every request thread
+state = State.RoverState()
+
+mjpeg_boundary = 'frame'
+max_frame_wait = 10.0  # longest a long-poll GET may hold a worker thread
 
 app = Flask(__name__)  # creates instance of flask
 
 # Set direction to forward, call motor forward function, return JSON confirmation
-def FWD():
-    json_thing['direction'] = 'forward'
+def FWD(duration=None):
+    reply = state.set_direction('forward')
     print('going forward')  # debugging purposes; makes sure api has received the command
-    motor.forward()
-    return jsonify(json_thing)  # returns json data into the main function
+    motion.run('forward', duration)
+    return jsonify(reply)  # returns json data into the main function
     # the function structure + logic is the same for all other movement functions
 
 # Set direction to backward, call motor backward function, return JSON confirmation
-def BACKWD():
-    json_thing['direction'] = 'backward'
+def BACKWD(duration=None):
+    reply = state.set_direction('backward')
     print('going backward')
-    motor.backward()
-    return jsonify(json_thing)
+    motion.run('backward', duration)
+    return jsonify(reply)
 
 # Set direction to left, call motor left function, return JSON confirmation
-def LEFT():
-    json_thing['direction'] = 'left'
+def LEFT(duration=None):
+    reply = state.set_direction('left')
     print('going left')
-    motor.left()
-    return jsonify(json_thing)
+    motion.run('left', duration)
+    return jsonify(reply)
 
 # Set direction to right, call motor right function, return JSON confirmation
-def RIGHT():
-    json_thing['direction'] = 'right'
+def RIGHT(duration=None):
+    reply = state.set_direction('right')
     print('going right')
-    motor.right()
-    return jsonify(json_thing)
+    motion.run('right', duration)
+    return jsonify(reply)
 
 # Set direction to stop, call motor stop function, return JSON confirmation
 def STOP():
-    json_thing['direction'] = 'stop'
+    reply = state.set_direction('stop')
     print('stopping')
-    motor.stop()
-    return jsonify(json_thing)
+    motion.run('stop')
+    return jsonify(reply)
 
 # Return landing page message identifying API creator
 @app.route('/', methods=['GET'])  # landing page
@@ -112,74 +270,343 @@ def default():
 def direction():
     if request.method == 'POST':
         direction = request.json['direction']  # extracts the direction out of json
+        if direction not in motor_commands:
+            return jsonify({'error': f'unknown direction {direction!r}'}), 400
 
         ip = request.remote_addr  # gets ip from where the request was sent
         log_direction(direction, ip)
 
+        # seconds to keep moving before the scheduler stops the motors; old clients send it as time
+        duration = request.json.get('duration', request.json.get('time'))
+        if duration is not None:
+            duration = float(duration)
+
+        # a direct command always wins over an uploaded program
+        sequences.cancel('pre-empted')
+
         # runs a function based on which command was posted to api using if-elif
         if direction == 'forward':
-            result = FWD()
+            result = FWD(duration)
         elif direction == 'backward':
-            result = BACKWD()
+            result = BACKWD(duration)
         elif direction == 'left':
-            result = LEFT()
+            result = LEFT(duration)
         elif direction == 'right':
-            result = RIGHT()
+            result = RIGHT(duration)
         elif direction == 'stop':
             result = STOP()
 
-        try:
-            time = request.json['time']
-            time.sleep(time)
-        except Exception as e:
-            pass
-
         return result  # returns json data to api, which robot can then get the directional command
     if request.method == 'GET':
         # i want my code to return the last received directional command so its shown when visited on a browser
-        return jsonify(json_thing)
+        return jsonify(state.command_state()[0])
 
 # Log movement commands with timestamp and IP, return log data on GET request
 @app.route('/logging', methods=['GET'])
 def log_direction(the_direction=None, ip_addr=None):
-    global final_log
     if the_direction and ip_addr:
-        ip = ip_addr
-        direction = the_direction
-        time = datetime.now()
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        final_log = {'IP Address': ip,
-                     'Direction Sent': direction,
-                     'Timestamp': timestamp}
+        state.log_command(the_direction, ip_addr)
     else:
-        return jsonify(final_log)
+        return jsonify(state.command_state()[1])
+
+# Cache encoded frame bytes with a sequence number and wake up waiting streams
+def store_frame(jpeg, timestamp=None):
+    if timestamp is not None:
+        # capture to cache: encode and hand-off from the ring, or the whole upload for a POST
+        Metrics.observe('api.frame_age', max(time.time() - timestamp, 0.0))
+    Metrics.count('api.frames')
+    return state.store_frame(jpeg, timestamp)
+
+# Lazily decode the cached JPEG only when a server-side consumer needs pixels
+def get_latest_frame():
+    return state.latest_frame()
+
+# Long-poll for a frame other than after_id so clients never re-download the same frame
+def wait_for_frame(after_id=None, timeout=0.0):
+    return state.wait_for_frame(after_id, min(max(timeout, 0.0), max_frame_wait))
+
+# Parse the conditional-fetch parameters shared by the frame GET routes
+def frame_request_args():
+    after_id = request.args.get('after', type=int)
+    timeout = request.args.get('timeout', default=0.0, type=float)
+    return after_id, timeout
 
 # Receive video frames via POST and serve latest frame via GET
 @app.route('/vidstream', methods=['GET', 'POST'])
 def video_stream():
-    global latest_frame
     if request.method == 'POST':
-        b64_image = request.get_json()['frame']
-        decoded_img = base64.b64decode(b64_image)
-
-        np_img = np.frombuffer(decoded_img, dtype=np.uint8)
-        latest_frame = cv2.imdecode(np_img, cv2.IMREAD_COLOR)
-
+        if request.mimetype == 'image/jpeg':
+            # raw jpeg body, no base64 or json to undo
+            jpeg = request.get_data()
+            timestamp = request.headers.get('X-Capture-Time', type=float)
+        else:
+            data = request.get_json()
+            jpeg = base64.b64decode(data['frame'])
+            timestamp = data.get('timestamp')
+
+        store_frame(jpeg, timestamp)
         return jsonify({"message": "Frame received successfully!"})
 
     if request.method == 'GET':
-        _, buffer = cv2.imencode('.jpg', latest_frame)
-        b64_image = base64.b64encode(buffer).decode('utf-8')
-        return jsonify({'frame': b64_image})
+        after_id, timeout = frame_request_args()
+        result = wait_for_frame(after_id, timeout)
+        if result is None:
+            if after_id is not None:
+                return Response(status=304)  # client already has the newest frame
+            return jsonify({'frame': None, 'frame_id': 0, 'timestamp': None})
+        jpeg, current_id, timestamp = result
+        # the cached bytes are already a jpeg, so only the base64 step is left
+        b64_image = base64.b64encode(jpeg).decode('utf-8')
+        return jsonify({'frame': b64_image, 'frame_id': current_id, 'timestamp': timestamp})
+
+# Serve the cached JPEG bytes as-is with no base64 or JSON wrapping
+@app.route('/vidstream/latest', methods=['GET'])
+def latest_jpeg():
+    after_id, timeout = frame_request_args()
+    result = wait_for_frame(after_id, timeout)
+    if result is None:
+        return Response(status=304 if after_id is not None else 204)
+    jpeg, current_id, timestamp = result
+    return Response(jpeg, mimetype='image/jpeg',
+                    headers={'X-Frame-Id': str(current_id), 'X-Capture-Time': repr(timestamp)})
 
 # Return current obstacle detection status from ultrasonic sensor
 @app.route('/obstacle_status', methods=['GET'])
 def get_obstacle_status():
-    distance = motor.get_distance()
+    reading = sensor_reading()
     return jsonify({
-        'detect_flag': distance
+        'detect_flag': reading['detect_flag'],
+        'distance': reading['distance'],
+        'approach_rate': reading['approach_rate']
     })
 
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)  # runs api
+# Return everything the automation loop checks each cycle in one response
+@app.route('/telemetry', methods=['GET'])
+def telemetry():
+    current_id, timestamp = state.frame_info()
+    command, log = state.command_state()
+    reading = sensor_reading()
+    return jsonify({'frame_id': current_id,
+                    'timestamp': timestamp,
+                    'distance': reading['distance'],
+                    'approach_rate': reading['approach_rate'],
+                    'detect_flag': reading['detect_flag'],
+                    'direction': command['direction'],
+                    'log': log})
+
+# Wait for each new frame and yield it as a raw JPEG part with its length
+def mjpeg_frames():
+    sent_id = 0
+    while True:
+        # blocks instead of resending the same frame to the client
+        jpeg, sent_id, timestamp = state.wait_for_frame(sent_id)
+
+        header = (f'--{mjpeg_boundary}\r\n'
+                  f'Content-Type: image/jpeg\r\n'
+                  f'Content-Length: {len(jpeg)}\r\n'
+                  f'X-Frame-Id: {sent_id}\r\n'
+                  f'X-Capture-Time: {timestamp!r}\r\n\r\n')
+        yield header.encode('ascii') + jpeg + b'\r\n'
+
+# Push raw JPEG bytes over one long-lived connection instead of base64 JSON polling
+@app.route('/vidstream/mjpeg', methods=['GET'])
+def mjpeg_stream():
+    return Response(mjpeg_frames(), mimetype=f'multipart/x-mixed-replace; boundary={mjpeg_boundary}')
+
+# Pick up each new frame from shared memory and cache it like a posted frame
+def watch_frame_ring(ring):
+    last_id = None
+    while True:
+        result = ring.read(after_id=last_id)
+        if result is None:
+            time.sleep(0.005)  # well under one frame period at 7 fps
+            continue
+        last_id, timestamp, jpeg = result
+        store_frame(jpeg, timestamp)
+
+# Attach to the frame ring set up by main.py and start the watcher thread
+def start_frame_ring():
+    name = os.environ.get('ROVER_FRAME_RING')
+    if not name:
+        print('no frame ring configured; waiting for frames over POST /vidstream')
+        return None
+    try:
+        ring = FrameRing.attach(name)
+    except FileNotFoundError:
+        print(f'frame ring {name} not found; waiting for frames over POST /vidstream')
+        return None
+
+    watcher = threading.Thread(target=watch_frame_ring, args=(ring,), daemon=True)
+    watcher.start()
+    return watcher
+
+motor_commands = {'forward': motor.forward,
+                  'backward': motor.backward,
+                  'left': motor.left,
+                  'right': motor.right,
+                  'stop': motor.stop}
+
+# Mark a timed move as finished once the motion scheduler has stopped it
+def timed_stop(direction, late):
+    Metrics.observe('motion.stop_late', late)
+    state.set_direction('stop')
+    publish_event({'type': 'move_done', 'direction': direction, 'late_ms': 1000 * late, 'time': time.time()})
+
+motion = Motion.MotionScheduler(motor_commands, motor.halt_if, on_timed_stop=timed_stop)
+
+# Log and run a movement command received over the TCP command channel
+def run_channel_command(the_direction, ip_addr, duration=None):
+    if the_direction not in motor_commands:
+        return False
+    start = time.perf_counter()
+    log_direction(the_direction, ip_addr)
+    state.set_direction(the_direction)
+    sequences.cancel('pre-empted')
+    motion.run(the_direction, duration)  # same motor calls as FWD()/BACKWD()/..., minus flask
+    Metrics.observe('api.command_channel', time.perf_counter() - start)
+    return True
+
+# Start the low-latency TCP command channel next to the REST API
+def start_command_channel():
+    server = CommandServer(run_channel_command)
+    server.start()
+    return server
+
+# Add an event to the recent-events log and wake clients long-polling /events
+def publish_event(event):
+    return state.publish_event(event)
+
+# Long-poll the event log so clients hear about reflex stops without polling fast
+def wait_for_events(after_id=0, timeout=0.0):
+    events, _ = state.wait_for_events(after_id, min(max(timeout, 0.0), max_frame_wait))
+    return events
+
+# Serve the event log over HTTP, blocking until something newer than after happens
+@app.route('/events', methods=['GET'])
+def get_events():
+    after_id, timeout = frame_request_args()
+    events, last_id = state.wait_for_events(after_id or 0, min(max(timeout, 0.0), max_frame_wait))
+    return jsonify({'events': events, 'last_id': last_id})
+
+# Record a reflex stop as a stop command and publish it to clients
+def reflex_tripped(event):
+    # the scheduler owns the current motion, so it has to hear that the forward move is over
+    motion.preempt('reflex', 'forward')
+    state.set_direction('stop')
+    log_direction('stop', 'reflex')
+    print(f"reflex stop at {event['raw']:.2f} m")
+    publish_event(event)
+
+sensor_service = Sensor.SensorService(motor.ultrasonic, threshold=motor.obstacle_threshold)
+reflex = Reflex.ReflexStop(motor, threshold=motor.obstacle_threshold, on_trip=reflex_tripped)
+
+# Start sampling the ultrasonic sensor in the background so routes read a cached, filtered value
+def start_sensor_service():
+    # the reflex runs on the sampling thread, one sample period after the obstacle shows up
+    sensor_service.add_listener(reflex.check)
+    sensor_service.start()
+    return sensor_service
+
+# Return the cached sensor reading, or read the sensor directly if the service has no sample yet
+def sensor_reading():
+    reading = sensor_service.latest()
+    if reading is None:
+        distance = motor.read_distance()
+        reading = {'distance': distance,
+                   'approach_rate': 0.0,
+                   'detect_flag': distance < motor.obstacle_threshold}
+    return reading
+
+# Publish a sequence_done event when a program ends
+def sequence_finished(status):
+    publish_event({'type': 'sequence_done', 'sequence': status['id'], 'name': status['name'],
+                   'state': status['state'], 'result': status['result'], 'elapsed': status['elapsed'],
+                   'time': time.time()})
+
+sequences = Sequence.SequenceRunner(motion,
+                                    {'obstacle_clear': lambda: not sensor_reading()['detect_flag'],
+                                     'obstacle': lambda: sensor_reading()['detect_flag']},
+                                    on_finish=sequence_finished)
+
+# Run a whole motion program on the Pi so its step timing never depends on network round trips
+@app.route('/sequence', methods=['GET', 'POST'])
+def sequence():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            status = sequences.start(data.get('steps'), data.get('name'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        log_direction(f"sequence {data.get('name') or status['id']}", request.remote_addr)
+        return jsonify(status)
+
+    timeout = min(max(request.args.get('timeout', default=0.0, type=float), 0.0), max_frame_wait)
+    return jsonify(sequences.wait(timeout) if timeout > 0 else sequences.status())
+
+# Cancel the running program and stop the motors
+@app.route('/sequence/cancel', methods=['POST'])
+def cancel_sequence():
+    cancelled = sequences.cancel()
+    motion.run('stop')
+    state.set_direction('stop')
+    log_direction('stop', request.remote_addr)
+    return jsonify({'cancelled': cancelled, 'status': sequences.status()})
+
+# Note when Flask started handling the request
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# Record the handling time under api.<route> and count the response status
+@app.after_request
+def finish_request_timer(response):
+    start = g.get('request_start')
+    if start is not None:
+        Metrics.observe(f'api.{request.endpoint or "unknown"}', time.perf_counter() - start)
+    Metrics.count(f'api.status_{response.status_code}')
+    return response
+
+# Serve the Pi's latency histograms so load can be traced without a debugger
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    data = {'api': Metrics.snapshot(), 'video': Metrics.load(os.environ.get('ROVER_VIDEO_METRICS'))}
+    if request.args.get('reset'):
+        Metrics.reset()
+    return jsonify(data)
+
+# Start the frame ring watcher, TCP command channel and sensor service in the serving process
+def start_services():
+    start_frame_ring()
+    start_command_channel()
+    start_sensor_service()
+
+# Serve the API with the chosen worker model
+def run_server(mode='threaded', host='0.0.0.0', port=5000, threads=8):
+    if mode == 'waitress':
+        try:
+            from waitress import serve
+        except ImportError:
+            print('waitress is not installed, using the threaded server instead')
+            mode = 'threaded'
+        else:
+            start_services()
+            serve(app, host=host, port=port, threads=threads)
+            return
+
+    if mode == 'dev':
+        # debug=True runs this file twice through the reloader; only the child serves requests
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_services()
+        app.run(debug=True, host=host, port=port)
+        return
+
+    if mode != 'threaded':
+        print(f'unknown server mode {mode}, using the threaded server')
+    start_services()
+    app.run(debug=False, use_reloader=False, threaded=True, host=host, port=port)
 
+if __name__ == '__main__':
+    # main.py picks the mode; running this file directly uses the same defaults
+    run_server(os.environ.get('ROVER_SERVER', 'threaded'),
+               port=int(os.environ.get('ROVER_PORT', 5000)),
+               threads=int(os.environ.get('ROVER_SERVER_THREADS', 8)))  # runs api
@@ -0,0 +1,577 @@
+"""
+FUNCTIONS:
+1. test_jpeg(width, height, quality)
+   INPUT: width, height (int pixels, default 640x480), quality (int JPEG quality, default 80)
+   OUTPUT: Encoded JPEG bytes
+   SUMMARY: Makes a camera-sized JPEG with a gradient and noise so its size is close to a real frame
+
+2. start_api(mode, port, threads, hardware, sim_log)
+   INPUT: mode (string server mode, see API.run_server), port (int), threads (int waitress threads),
+          hardware (string 'sim' or 'real', default 'sim'), sim_log (string throttle log path, optional)
+   OUTPUT: subprocess.Popen of the running API
+   SUMMARY: Starts API.py in its own process group with the chosen server mode and hardware backend
+
+3. wait_until_up(url, timeout)
+   INPUT: url (string API base url), timeout (float seconds)
+   OUTPUT: Boolean (True once the API answers)
+   SUMMARY: Polls the landing page until the server accepts requests
+
+4. stop_api(process)
+   INPUT: process (subprocess.Popen from start_api)
+   OUTPUT: None
+   SUMMARY: Stops the API and, in dev mode, the reloader child with it
+
+5. percentile(values, fraction)
+   INPUT: values (list of floats), fraction (float 0 to 1)
+   OUTPUT: Float value at that fraction of the sorted list (nearest rank), or nan for an empty list
+   SUMMARY: Reads a latency percentile without numpy
+
+6. feed_frames(url, jpeg, fps, stop_event, counts)
+   INPUT: url (string), jpeg (bytes), fps (float), stop_event (threading.Event), counts (dict)
+   OUTPUT: None (runs until stop_event is set)
+   SUMMARY: Posts raw JPEG frames at a steady rate, the way Video.py feeds the API
+
+7. load_client(url, command_share, stop_event, latencies, errors, seed)
+   INPUT: url (string), command_share (float fraction of requests that are command POSTs),
+          stop_event (threading.Event), latencies (dict of kind -> list), errors (dict of kind -> int), seed (int)
+   OUTPUT: None (runs until stop_event is set)
+   SUMMARY: One keep-alive client sending a random mix of frame GETs and stop command POSTs back to back
+
+8. bench_load(url, clients, seconds, command_share, fps)
+   INPUT: url (string), clients (int concurrent clients), seconds (float), command_share (float), fps (float)
+   OUTPUT: dict of kind ('frame', 'command') -> requests, req_s, p50_ms, p99_ms, errors, plus frames_posted
+   SUMMARY: Runs the concurrent clients against one server for a fixed time and summarises each request kind
+
+9. bench_commands(client, tail, count)
+   INPUT: client (RoverClient), tail (ThrottleTail on the simulated throttle log), count (int commands)
+   OUTPUT: dict with count, p50/p99/max command-to-throttle ms, p50 acknowledgment ms and missed commands
+   SUMMARY: Alternates left/right commands and times each one from send to the first motor write it causes
+
+10. reference_image(path)
+    INPUT: path (string where the image is written)
+    OUTPUT: path
+    SUMMARY: Draws a feature-rich stand-in martian reference so the harness runs without the real image
+
+11. bench_pipeline(url, seconds, warmup, cv_workers, ref_path)
+    INPUT: url (string), seconds (float measured run), warmup (float seconds ignored at the start),
+           cv_workers (int, 0 for in-process analysis), ref_path (string martian reference)
+    OUTPUT: dict with displayed fps, capture-to-ingest and capture-to-display p50/p99 ms, and the stage stats
+    SUMMARY: Runs the real Automation pipeline against the API and times every frame that reaches display
+
+12. environment_info()
+    INPUT: None
+    OUTPUT: dict with python, platform, cpu count and opencv version
+    SUMMARY: Records where a report was produced so reports are only compared like for like
+
+13. compare_reports(report, baseline)
+    INPUT: report, baseline (e2e report dicts)
+    OUTPUT: None (prints one line per metric)
+    SUMMARY: Prints each headline number next to the baseline's with the relative change
+
+14. main()
+    INPUT: Command line arguments
+    OUTPUT: None (prints a table, optionally writes JSON)
+    SUMMARY: Runs the load benchmark against one or more server modes, or the end-to-end benchmark
+
+15. import_computer_side()
+    INPUT: None
+    OUTPUT: None (sets the Automation, Pipeline, Processing and RoverClient module globals)
+    SUMMARY: Imports the ComputerFiles modules for the e2e benchmark only, so the load benchmark runs on a Pi
+             without Tk or PIL; ComputerFiles goes at the end of sys.path so it can't shadow modules here
+
+THROTTLE TAIL (ThrottleTail class):
+1. __init__(path)
+   INPUT: path (string throttle log written by Hardware with ROVER_SIM_LOG)
+   OUTPUT: ThrottleTail positioned at the end of the file
+   SUMMARY: Follows the simulated throttle log of an API running in another process
+
+2. read()
+   INPUT: None
+   OUTPUT: List of (wall time, monotonic time, motor name, value) written since the last read
+   SUMMARY: Returns complete new lines only, keeping a half-written line for the next read
+
+TIMED FRAME CLIENT (TimedFrameClient class):
+1. __init__(client)
+   INPUT: client (RoverClient.RoverClient)
+   OUTPUT: TimedFrameClient object that passes every other call through to client
+   SUMMARY: Wraps the client Automation uses during the e2e benchmark
+
+2. frame_stream() / get_frame(after, wait)
+   SUMMARY: Same as RoverClient, but remembers each frame's capture time and arrival time by frame object
+
+3. lookup(frame)
+   INPUT: frame (numpy array handed out by frame_stream or get_frame)
+   OUTPUT: (frame id, capture time, arrival time) or None
+   SUMMARY: Finds the timing of a frame that has travelled through the pipeline
+
+TIMING RENDERER (TimingRenderer class):
+Has the start/submit/stop/closed/stats interface of Renderer.TkRenderer, so Automation can run without Tk;
+every stream frame handed to it is timed against its capture time.
+
+USAGE (from RaspPiFiles/):
+    python Benchmark.py load --url http://192.168.240.25:5000/ --clients 16 --seconds 10
+    python Benchmark.py load --modes dev,threaded,waitress --clients 16 --json load.json
+    python Benchmark.py e2e --seconds 20 --json e2e.json
+    python Benchmark.py e2e --seconds 20 --baseline e2e.json
+The load benchmark only ever sends 'stop'. The e2e benchmark always runs the API with the simulated
+hardware backend, since it drives the motors.
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+import requests
+
+# Computer-side modules, imported by import_computer_side() for the e2e benchmark only
+Automation = None
+Pipeline = None
+Processing = None
+RoverClient = None
+
+# Import the computer-side modules the e2e benchmark drives, so the load benchmark never needs Tk or PIL
+def import_computer_side():
+    global Automation, Pipeline, Processing, RoverClient
+    computer_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ComputerFiles')
+    if computer_dir not in sys.path:
+        sys.path.append(computer_dir)  # appended, so modules in this directory keep their names
+    import Automation
+    import Pipeline
+    import Processing
+    import RoverClient
+
+# Make a camera-sized JPEG with a gradient and noise so its size is close to a real frame
+def test_jpeg(width=640, height=480, quality=80):
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    frame = np.clip(gradient + rng.normal(0, 20, (height, width, 3)), 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+# Start API.py in its own process group with the chosen server mode and hardware backend
+def start_api(mode, port, threads=8, hardware='sim', sim_log=None):
+    env = dict(os.environ, ROVER_SERVER=mode, ROVER_PORT=str(port), ROVER_SERVER_THREADS=str(threads),
+               ROVER_HARDWARE=hardware)
+    env.pop('ROVER_FRAME_RING', None)  # frames come over POST /vidstream here
+    if sim_log:
+        env['ROVER_SIM_LOG'] = sim_log
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen([sys.executable, 'API.py'], cwd=here, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+# Poll the landing page until the server accepts requests
+def wait_until_up(url, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=0.5).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+# Stop the API and, in dev mode, the reloader child with it
+def stop_api(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=5)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+# Read a latency percentile without numpy
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+# Post raw JPEG frames at a steady rate, the way Video.py feeds the API
+def feed_frames(url, jpeg, fps, stop_event, counts):
+    session = requests.Session()
+    period = 1.0 / fps
+    next_frame = time.monotonic()
+    while not stop_event.is_set():
+        try:
+            session.post(url + 'vidstream', data=jpeg, timeout=2.0,
+                         headers={'Content-Type': 'image/jpeg', 'X-Capture-Time': repr(time.time())})
+            counts['posted'] += 1
+        except requests.RequestException:
+            counts['failed'] += 1
+        next_frame += period
+        stop_event.wait(max(0.0, next_frame - time.monotonic()))
+
+# One keep-alive client sending a random mix of frame GETs and stop command POSTs back to back
+def load_client(url, command_share, stop_event, latencies, errors, seed):
+    session = requests.Session()
+    rng = random.Random(seed)
+    while not stop_event.is_set():
+        kind = 'command' if rng.random() < command_share else 'frame'
+        start = time.perf_counter()
+        try:
+            if kind == 'command':
+                response = session.post(url + 'moving', json={'direction': 'stop'}, timeout=5.0)
+            else:
+                response = session.get(url + 'vidstream/latest', timeout=5.0)
+            ok = response.status_code in (200, 204)
+        except requests.RequestException:
+            ok = False
+        if ok:
+            latencies[kind].append(time.perf_counter() - start)
+        else:
+            errors[kind] += 1
+
+# Run the concurrent clients against one server for a fixed time and summarise each request kind
+def bench_load(url, clients=16, seconds=10.0, command_share=0.2, fps=30.0):
+    stop_event = threading.Event()
+    counts = {'posted': 0, 'failed': 0}
+    feeder = threading.Thread(target=feed_frames, args=(url, test_jpeg(), fps, stop_event, counts), daemon=True)
+    feeder.start()
+    time.sleep(0.5)  # let the first frames arrive so frame GETs return images
+
+    latencies = [{'frame': [], 'command': []} for _ in range(clients)]
+    errors = [{'frame': 0, 'command': 0} for _ in range(clients)]
+    threads = [threading.Thread(target=load_client, args=(url, command_share, stop_event, latencies[i], errors[i], i),
+                                daemon=True) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    feeder.join()
+
+    result = {'frames_posted': counts['posted'], 'frame_post_failures': counts['failed']}
+    for kind in ('frame', 'command'):
+        merged = [value for client in latencies for value in client[kind]]
+        result[kind] = {'requests': len(merged),
+                        'req_s': len(merged) / elapsed,
+                        'p50_ms': 1000 * percentile(merged, 0.50),
+                        'p99_ms': 1000 * percentile(merged, 0.99),
+                        'errors': sum(client[kind] for client in errors)}
+    return result
+
+class ThrottleTail:
+    # Follow the simulated throttle log of an API running in another process
+    def __init__(self, path):
+        self.file = open(path, 'r')
+        self.file.seek(0, os.SEEK_END)
+        self.partial = ''
+
+    # Return complete new lines only, keeping a half-written line for the next read
+    def read(self):
+        text = self.partial + self.file.read()
+        lines = text.split('\n')
+        self.partial = lines.pop()
+        entries = []
+        for line in lines:
+            wall, mono, name, value = line.split()
+            entries.append((float(wall), float(mono), name, float(value)))
+        return entries
+
+# Alternate left/right commands and time each one from send to the first motor write it causes
+def bench_commands(client, tail, count=50):
+    latencies = []
+    acks = []
+    missed = 0
+    for i in range(count):
+        tail.read()  # anything written before this command isn't ours
+        direction = 'left' if i % 2 == 0 else 'right'
+        sent = time.time()
+        client.move(direction)
+        acks.append(time.time() - sent)
+
+        written = None
+        deadline = time.monotonic() + 1.0
+        while written is None and time.monotonic() < deadline:
+            for wall, _, name, _ in tail.read():
+                if name == 'motor1' and wall >= sent:
+                    written = wall
+                    break
+            else:
+                time.sleep(0.0005)
+        if written is None:
+            missed += 1
+        else:
+            latencies.append(written - sent)
+        time.sleep(0.02)  # let the server settle so each command is timed on its own
+    client.move('stop')
+
+    return {'count': count,
+            'p50_ms': 1000 * percentile(latencies, 0.50),
+            'p99_ms': 1000 * percentile(latencies, 0.99),
+            'max_ms': 1000 * max(latencies) if latencies else float('nan'),
+            'ack_p50_ms': 1000 * percentile(acks, 0.50),
+            'missed': missed}
+
+# Draw a feature-rich stand-in martian reference so the harness runs without the real image
+def reference_image(path):
+    rng = np.random.default_rng(1)
+    image = np.full((200, 200, 3), 255, dtype=np.uint8)
+    for _ in range(40):
+        x, y = (int(v) for v in rng.integers(10, 190, 2))
+        colour = tuple(int(v) for v in rng.integers(0, 200, 3))
+        if rng.random() < 0.5:
+            cv2.circle(image, (x, y), int(rng.integers(4, 20)), colour, -1)
+        else:
+            cv2.rectangle(image, (x, y), (x + int(rng.integers(5, 30)), y + int(rng.integers(5, 30))), colour, -1)
+    cv2.imwrite(path, image)
+    return path
+
+class TimedFrameClient:
+    # Wrap a RoverClient and remember each frame's capture time and arrival time by frame object
+    def __init__(self, client):
+        self.client = client
+        self.timing_lock = threading.Lock()
+        self.timings = OrderedDict()  # id(frame) -> (frame, frame id, capture time, arrival time)
+
+    def remember(self, frame_id, timestamp, frame):
+        with self.timing_lock:
+            # the frame itself is kept so its id() can't be reused while it is in here
+            self.timings[id(frame)] = (frame, frame_id, timestamp, time.time())
+            while len(self.timings) > 256:
+                self.timings.popitem(last=False)
+
+    # Everything but the frame calls goes straight to the wrapped client
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def frame_stream(self):
+        for frame_id, timestamp, frame in self.client.frame_stream():
+            self.remember(frame_id, timestamp, frame)
+            yield frame_id, timestamp, frame
+
+    def get_frame(self, after=None, wait=0.0):
+        result = self.client.get_frame(after, wait)
+        if result is not None:
+            self.remember(*result)
+        return result
+
+    # Find the timing of a frame that has travelled through the pipeline
+    def lookup(self, frame):
+        with self.timing_lock:
+            entry = self.timings.get(id(frame))
+        if entry is None or entry[0] is not frame:
+            return None
+        return entry[1:]
+
+class TimingRenderer:
+    # Same interface as Renderer.TkRenderer, but it times frames instead of painting them
+    def __init__(self, client, measure_from):
+        self.client = client
+        self.measure_from = measure_from
+        self.stats = Pipeline.StageStats('render', report_every=0)
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.shown = []  # (display time, capture-to-ingest seconds, capture-to-display seconds)
+        self.last_frame_id = None
+
+    def start(self):
+        self.stopped = False
+
+    def submit(self, name, frame):
+        if self.stopped:
+            return False
+        if name != 'stream':
+            return True
+        now = time.time()
+        timing = self.client.lookup(frame)
+        if timing is None or now < self.measure_from:
+            return True
+        frame_id, captured, arrived = timing
+        with self.lock:
+            if frame_id != self.last_frame_id:
+                self.last_frame_id = frame_id
+                self.shown.append((now, arrived - captured, now - captured))
+                self.stats.record(0.0)
+        return True
+
+    def stop(self):
+        self.stopped = True
+
+    def closed(self):
+        return self.stopped
+
+# Run the real Automation pipeline against the API and time every frame that reaches display
+def bench_pipeline(url, seconds=20.0, warmup=3.0, cv_workers=0, ref_path=None):
+    client = TimedFrameClient(RoverClient.RoverClient(url))
+    RoverClient.shared_client = client  # Automation, GUI and Processing all pick up the shared client
+    Processing.shared_detector = Processing.MartianDetector(ref_path)
+
+    automation = Automation.Automation(cv_workers=cv_workers)
+    start = time.time()
+    renderer = TimingRenderer(client, start + warmup)
+    automation.renderer = renderer
+    automation.stage_stats['render'] = renderer.stats
+
+    automation.start_threads()
+    time.sleep(warmup + seconds)
+    stage_stats = automation.get_stage_stats()
+    automation.stop_threads()
+    time.sleep(0.5)  # let the stages notice and the stop command go out
+    client.close()
+    RoverClient.shared_client = None
+
+    shown = renderer.shown
+    ingest = [row[1] for row in shown]
+    display = [row[2] for row in shown]
+    span = shown[-1][0] - shown[0][0] if len(shown) > 1 else 0.0
+    return {'frames_displayed': len(shown),
+            'display_fps': (len(shown) - 1) / span if span > 0 else 0.0,
+            'ingest_p50_ms': 1000 * percentile(ingest, 0.50),
+            'ingest_p99_ms': 1000 * percentile(ingest, 0.99),
+            'display_p50_ms': 1000 * percentile(display, 0.50),
+            'display_p99_ms': 1000 * percentile(display, 0.99),
+            'stages': stage_stats}
+
+# Record where a report was produced so reports are only compared like for like
+def environment_info():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__}
+
+# Print each headline number next to the baseline's with the relative change
+def compare_reports(report, baseline):
+    if baseline.get('environment') != report['environment']:
+        print('note: baseline was produced in a different environment')
+    rows = [('commands channel p50 ms', 'commands_channel', 'p50_ms'),
+            ('commands channel p99 ms', 'commands_channel', 'p99_ms'),
+            ('commands http p50 ms', 'commands_http', 'p50_ms'),
+            ('commands http p99 ms', 'commands_http', 'p99_ms'),
+            ('display fps', 'pipeline', 'display_fps'),
+            ('capture-to-display p50 ms', 'pipeline', 'display_p50_ms'),
+            ('capture-to-display p99 ms', 'pipeline', 'display_p99_ms')]
+    print(f"{'metric':<28} {'baseline':>10} {'now':>10} {'change':>8}")
+    for label, section, key in rows:
+        before = baseline.get(section, {}).get(key)
+        now = report[section][key]
+        if before is None:
+            print(f'{label:<28} {"-":>10} {now:>10.2f}')
+            continue
+        change = 100 * (now - before) / before if before else float('nan')
+        print(f'{label:<28} {before:>10.2f} {now:>10.2f} {change:>7.1f}%')
+
+# Run the load benchmark against one or more server modes, or the end-to-end benchmark
+def main():
+    parser = argparse.ArgumentParser(description='pi api benchmarks')
+    parser.add_argument('benchmark', choices=['load', 'e2e'])
+    parser.add_argument('--url', help='load: benchmark an API that is already running at this url')
+    parser.add_argument('--modes', default='threaded', help='load: comma separated server modes to start and compare')
+    parser.add_argument('--server', default='threaded', help='e2e: server mode to start')
+    parser.add_argument('--hardware', choices=['sim', 'real'], default='sim', help='load: backend of started APIs')
+    parser.add_argument('--port', type=int, default=5050, help='port for the APIs this script starts')
+    parser.add_argument('--threads', type=int, default=8, help='worker threads for waitress')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--command-share', type=float, default=0.2, help='fraction of requests that are commands')
+    parser.add_argument('--fps', type=float, default=30.0, help='rate frames are posted at during the run')
+    parser.add_argument('--commands', type=int, default=50, help='e2e: commands timed per transport')
+    parser.add_argument('--cv-workers', type=int, default=0, help='e2e: Automation CV worker processes')
+    parser.add_argument('--ref', help='e2e: martian reference image, a generated one if not given')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--baseline', help='e2e: earlier --json report to compare against')
+    args = parser.parse_args()
+
+    if args.benchmark == 'e2e':
+        import_computer_side()
+        workdir = tempfile.mkdtemp(prefix='rover-e2e-')
+        sim_log = os.path.join(workdir, 'throttle.log')
+        open(sim_log, 'w').close()
+        ref_path = args.ref or reference_image(os.path.join(workdir, 'ref.png'))
+        url = f'http://127.0.0.1:{args.port}/'
+
+        process = start_api(args.server, args.port, args.threads, hardware='sim', sim_log=sim_log)
+        stop_event = threading.Event()
+        counts = {'posted': 0, 'failed': 0}
+        try:
+            if not wait_until_up(url):
+                print('api did not start')
+                sys.exit(1)
+            feeder = threading.Thread(target=feed_frames, args=(url, test_jpeg(), args.fps, stop_event, counts),
+                                      daemon=True)
+            feeder.start()
+
+            # commands are timed with frames flowing, as they would be while driving
+            tail = ThrottleTail(sim_log)
+            channel_client = RoverClient.RoverClient(url)
+            http_client = RoverClient.RoverClient(url, use_channel=False)
+            report = {'settings': vars(args), 'environment': environment_info(),
+                      'commands_channel': bench_commands(channel_client, tail, args.commands),
+                      'commands_http': bench_commands(http_client, tail, args.commands)}
+            channel_client.close()
+            http_client.close()
+
+            report['pipeline'] = bench_pipeline(url, args.seconds, cv_workers=args.cv_workers, ref_path=ref_path)
+            report['frames_posted'] = counts['posted']
+        finally:
+            stop_event.set()
+            stop_api(process)
+
+        for name in ('commands_channel', 'commands_http'):
+            row = report[name]
+            print(f"{name:<17} command-to-throttle p50 {row['p50_ms']:.2f} ms, p99 {row['p99_ms']:.2f} ms, "
+                  f"max {row['max_ms']:.2f} ms, ack p50 {row['ack_p50_ms']:.2f} ms, missed {row['missed']}")
+        row = report['pipeline']
+        print(f"pipeline          {row['display_fps']:.1f} fps displayed ({row['frames_displayed']} frames, "
+              f"{args.fps:.0f} fps posted)")
+        print(f"                  capture-to-ingest p50 {row['ingest_p50_ms']:.1f} ms, p99 {row['ingest_p99_ms']:.1f} ms")
+        print(f"                  capture-to-display p50 {row['display_p50_ms']:.1f} ms, "
+              f"p99 {row['display_p99_ms']:.1f} ms")
+        for stage in row['stages'].values():
+            print(f"                  {stage['name']}: {stage['fps']:.1f} fps, {stage['avg_ms']:.1f} ms per item"
+                  + (f", {stage['drops']} dropped" if 'drops' in stage else ''))
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                compare_reports(report, json.load(f))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return
+
+    runs = {}
+    if args.url:
+        url = args.url if args.url.endswith('/') else args.url + '/'
+        runs['running api'] = bench_load(url, args.clients, args.seconds, args.command_share, args.fps)
+    else:
+        url = f'http://127.0.0.1:{args.port}/'
+        for mode in args.modes.split(','):
+            process = start_api(mode, args.port, args.threads, hardware=args.hardware)
+            try:
+                if not wait_until_up(url):
+                    print(f'{mode}: api did not start')
+                    continue
+                runs[mode] = bench_load(url, args.clients, args.seconds, args.command_share, args.fps)
+            finally:
+                stop_api(process)
+
+    print(f'{args.clients} clients, {args.seconds:.0f} s, {100 * args.command_share:.0f}% commands, '
+          f'frames posted at {args.fps:.0f} fps')
+    print(f"{'server':<12} {'kind':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, result in runs.items():
+        for kind in ('frame', 'command'):
+            row = result[kind]
+            print(f"{name:<12} {kind:<8} {row['req_s']:>8.1f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                  f"{row['errors']:>7}")
+        print(f"{name:<12} frames posted: {result['frames_posted']}, failed posts: {result['frame_post_failures']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': vars(args), 'runs': runs}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
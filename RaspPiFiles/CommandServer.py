@@ -0,0 +1,107 @@
+"""
+FUNCTIONS:
+1. __init__(handler, host, port)
+   INPUT: handler (function taking direction, ip and duration in seconds or None, returns True if the command ran),
+          host (string, default '0.0.0.0'), port (int, default 5001)
+   OUTPUT: Initialized CommandServer object
+   SUMMARY: Sets up a plain TCP command channel next to the REST API
+
+2. start()
+   INPUT: None
+   OUTPUT: Listener thread
+   SUMMARY: Binds the listening socket and accepts clients on a daemon thread
+
+3. accept_loop()
+   INPUT: None
+   OUTPUT: None (continuous loop)
+   SUMMARY: Accepts each client and serves it on its own thread
+
+4. serve_client(conn, ip)
+   INPUT: conn (connected socket), ip (string client address)
+   OUTPUT: None (runs until the client disconnects)
+   SUMMARY: Reads fixed-size command frames, runs them and answers each with an acknowledgment
+
+5. recv_exact(conn, size)
+   INPUT: conn (socket), size (int bytes)
+   OUTPUT: bytes or None if the client disconnected
+   SUMMARY: Reads exactly size bytes from the socket
+
+FRAMING (network byte order):
+- request:  opcode (1 byte) + sequence number (4 bytes) + duration in ms (4 bytes, 0 = until the next command)
+- response: sequence number (4 bytes) + opcode (1 byte) + status (1 byte) + pi timestamp (8 byte float)
+- opcode 0 is a ping that touches no motors; status 0 means ok, 1 means unknown opcode
+"""
+
+import socket
+import struct
+import threading
+import time
+
+REQUEST = struct.Struct('!BII')
+RESPONSE = struct.Struct('!IBBd')
+
+opcodes = {1: 'forward', 2: 'backward', 3: 'left', 4: 'right', 5: 'stop'}
+PING = 0
+STATUS_OK = 0
+STATUS_UNKNOWN = 1
+
+default_port = 5001
+
+class CommandServer:
+    # Set up a plain TCP command channel next to the REST API
+    def __init__(self, handler, host='0.0.0.0', port=default_port):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.sock = None
+
+    # Bind the listening socket and accept clients on a daemon thread
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen()
+
+        listener = threading.Thread(target=self.accept_loop, daemon=True)
+        listener.start()
+        return listener
+
+    # Accept each client and serve it on its own thread
+    def accept_loop(self):
+        while True:
+            conn, addr = self.sock.accept()
+            # commands are tiny, so don't let nagle hold them back
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_client, args=(conn, addr[0]), daemon=True).start()
+
+    # Read fixed-size command frames, run them and answer each with an acknowledgment
+    def serve_client(self, conn, ip):
+        try:
+            while True:
+                data = self.recv_exact(conn, REQUEST.size)
+                if data is None:
+                    break
+                opcode, seq, duration_ms = REQUEST.unpack(data)
+
+                status = STATUS_OK
+                if opcode in opcodes:
+                    if not self.handler(opcodes[opcode], ip, duration_ms / 1000 if duration_ms else None):
+                        status = STATUS_UNKNOWN
+                elif opcode != PING:
+                    status = STATUS_UNKNOWN
+
+                conn.sendall(RESPONSE.pack(seq, opcode, status, time.time()))
+        except OSError as e:
+            print(f'command channel error from {ip}: {e}')
+        finally:
+            conn.close()
+
+    # Read exactly size bytes from the socket
+    def recv_exact(self, conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
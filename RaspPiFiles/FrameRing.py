@@ -0,0 +1,157 @@
+"""
+FUNCTIONS:
+1. create(name, slot_count, slot_size) [class method]
+   INPUT: name (string shared memory name), slot_count (int, default 4), slot_size (int bytes per frame, default 256KB)
+   OUTPUT: FrameRing object that owns the shared memory block
+   SUMMARY: Allocates the ring in shared memory, replacing a stale block left behind by a crashed run
+
+2. attach(name) [class method]
+   INPUT: name (string shared memory name)
+   OUTPUT: FrameRing object
+   SUMMARY: Opens a ring created by another process (Video.py writes, API.py reads)
+
+3. write(jpeg, timestamp)
+   INPUT: jpeg (encoded JPEG bytes), timestamp (float capture time, optional)
+   OUTPUT: frame_id (int)
+   SUMMARY: Copies a frame into the next slot, guarded by the slot's sequence counter (seqlock)
+
+4. latest_id()
+   INPUT: None
+   OUTPUT: Id of the newest fully written frame (0 if none yet)
+   SUMMARY: Reads the ring header so readers can cheaply check for new frames
+
+5. read(after_id)
+   INPUT: after_id (int, optional)
+   OUTPUT: (frame_id, timestamp, jpeg bytes) or None if there is no frame newer than after_id
+   SUMMARY: Reads the newest frame and retries if the writer overwrote the slot mid-read
+
+6. close()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Detaches this process from the shared memory block
+
+7. unlink()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Frees the shared memory block; only the owner (main.py) should call this
+
+LAYOUT:
+- ring header: magic, slot count, slot size, latest frame id
+- each slot: sequence counter, frame id, capture timestamp, jpeg length, jpeg bytes
+- the sequence counter is odd while the writer is inside the slot and even once it is done,
+  so a reader that sees it change (or odd) knows to try again
+"""
+
+from multiprocessing import shared_memory
+import struct
+import time
+
+RING_MAGIC = b'RING'
+RING_HEADER = struct.Struct('<4sIIQ')  # magic, slot_count, slot_size, latest_id
+SLOT_HEADER = struct.Struct('<QQdI4x')  # seq, frame_id, timestamp, length
+LATEST_ID_OFFSET = 12  # byte offset of latest_id inside RING_HEADER
+
+default_name = 'rover_frames'
+
+class FrameRing:
+    # Wrap a shared memory block laid out as a frame ring
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+
+        magic, self.slot_count, self.slot_size, _ = RING_HEADER.unpack_from(self.buf, 0)
+        if magic != RING_MAGIC:
+            raise ValueError(f'shared memory block {shm.name} is not a frame ring')
+        self.slot_stride = SLOT_HEADER.size + self.slot_size
+        self.next_id = self.latest_id() + 1
+
+    # Allocate the ring in shared memory, replacing a stale block left behind by a crashed run
+    @classmethod
+    def create(cls, name=default_name, slot_count=4, slot_size=256 * 1024):
+        size = RING_HEADER.size + slot_count * (SLOT_HEADER.size + slot_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        shm.buf[:size] = bytes(size)
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, slot_count, slot_size, 0)
+        return cls(shm, owner=True)
+
+    # Open a ring created by another process
+    @classmethod
+    def attach(cls, name=default_name):
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # the creating process is responsible for unlinking, so stop the resource
+            # tracker from deleting the block when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return cls(shm)
+
+    # Byte offset of a slot header
+    def slot_offset(self, frame_id):
+        return RING_HEADER.size + (frame_id % self.slot_count) * self.slot_stride
+
+    # Copy a frame into the next slot, guarded by the slot's sequence counter
+    def write(self, jpeg, timestamp=None):
+        jpeg = memoryview(jpeg).cast('B')  # accepts bytes or the array from cv2.imencode
+        length = jpeg.nbytes
+        if length > self.slot_size:
+            raise ValueError(f'frame of {length} bytes does not fit in a {self.slot_size} byte slot')
+        if timestamp is None:
+            timestamp = time.time()
+
+        frame_id = self.next_id
+        offset = self.slot_offset(frame_id)
+        seq = SLOT_HEADER.unpack_from(self.buf, offset)[0]
+
+        # odd sequence tells readers the slot is being written
+        SLOT_HEADER.pack_into(self.buf, offset, seq + 1, frame_id, timestamp, length)
+        data_start = offset + SLOT_HEADER.size
+        self.buf[data_start:data_start + length] = jpeg
+        SLOT_HEADER.pack_into(self.buf, offset, seq + 2, frame_id, timestamp, length)
+
+        # publish only after the slot is complete
+        struct.pack_into('<Q', self.buf, LATEST_ID_OFFSET, frame_id)
+        self.next_id += 1
+        return frame_id
+
+    # Read the ring header so readers can cheaply check for new frames
+    def latest_id(self):
+        return struct.unpack_from('<Q', self.buf, LATEST_ID_OFFSET)[0]
+
+    # Read the newest frame and retry if the writer overwrote the slot mid-read
+    def read(self, after_id=None):
+        for _ in range(10):
+            frame_id = self.latest_id()
+            if frame_id == 0 or (after_id is not None and frame_id <= after_id):
+                return None
+
+            offset = self.slot_offset(frame_id)
+            seq, slot_id, timestamp, length = SLOT_HEADER.unpack_from(self.buf, offset)
+            if seq % 2 == 1 or slot_id != frame_id:
+                continue  # writer is in this slot right now
+
+            data_start = offset + SLOT_HEADER.size
+            jpeg = bytes(self.buf[data_start:data_start + length])
+
+            if SLOT_HEADER.unpack_from(self.buf, offset)[0] == seq:
+                return frame_id, timestamp, jpeg
+        return None
+
+    # Detach this process from the shared memory block
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    # Free the shared memory block
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,113 @@
+"""
+HARDWARE BACKEND:
+MotorKit and DistanceSensor below are either the real adafruit/gpiozero classes or the simulated ones,
+picked once at import time from the ROVER_HARDWARE environment variable:
+- real (default): adafruit_motorkit.MotorKit and gpiozero.DistanceSensor on the Pi
+- sim: SimMotorKit and SimDistanceSensor, so the API runs on any machine
+With sim, ROVER_SIM_LOG (optional file path) receives one line per throttle write and
+ROVER_SIM_DISTANCE (meters, default 1.0) sets what the simulated sensor reads.
+
+SIMULATED MOTOR (SimMotor class):
+1. __init__(name)
+   INPUT: name (string such as 'motor1')
+   OUTPUT: SimMotor object with throttle 0
+   SUMMARY: Stands in for one adafruit DC motor channel
+
+2. throttle [property]
+   INPUT: float -1 to 1 when set
+   OUTPUT: Last value written
+   SUMMARY: Records every write with its wall-clock and monotonic time in the throttle log
+
+SIMULATED MOTOR KIT (SimMotorKit class):
+1. __init__(address)
+   INPUT: address (int I2C address, only kept for reference)
+   OUTPUT: SimMotorKit object with motor1 to motor4
+   SUMMARY: Stands in for adafruit_motorkit.MotorKit
+
+SIMULATED DISTANCE SENSOR (SimDistanceSensor class):
+1. __init__(echo, trigger, distance, noise)
+   INPUT: echo, trigger (int pins, ignored), distance (float meters or function of elapsed seconds,
+          default ROVER_SIM_DISTANCE), noise (float standard deviation, default 0)
+   OUTPUT: SimDistanceSensor object
+   SUMMARY: Stands in for gpiozero.DistanceSensor using Sensor.FakeDistanceSensor
+
+MODULE FUNCTIONS:
+1. record_throttle(name, value)
+   INPUT: name (string motor name), value (float throttle)
+   OUTPUT: None
+   SUMMARY: Appends one throttle write to the in-memory log and, if configured, the log file
+
+2. throttle_writes()
+   INPUT: None
+   OUTPUT: List of (wall time, monotonic time, motor name, value) tuples
+   SUMMARY: Copies the in-memory throttle log
+"""
+
+from collections import deque
+import os
+import threading
+import time
+from Sensor import FakeDistanceSensor
+
+backend = os.environ.get('ROVER_HARDWARE', 'real')
+
+throttle_log = deque(maxlen=10000)
+throttle_lock = threading.Lock()
+throttle_file = None
+if backend == 'sim' and os.environ.get('ROVER_SIM_LOG'):
+    throttle_file = open(os.environ['ROVER_SIM_LOG'], 'a', buffering=1)  # line buffered
+
+# Append one throttle write to the in-memory log and, if configured, the log file
+def record_throttle(name, value):
+    entry = (time.time(), time.monotonic(), name, value)
+    with throttle_lock:
+        throttle_log.append(entry)
+        if throttle_file is not None:
+            throttle_file.write(f'{entry[0]!r} {entry[1]!r} {name} {value!r}\n')
+
+# Copy the in-memory throttle log
+def throttle_writes():
+    with throttle_lock:
+        return list(throttle_log)
+
+class SimMotor:
+    # Stand in for one adafruit DC motor channel
+    def __init__(self, name):
+        self.name = name
+        self.value = 0.0
+
+    # Record every write with its wall-clock and monotonic time in the throttle log
+    @property
+    def throttle(self):
+        return self.value
+
+    @throttle.setter
+    def throttle(self, value):
+        self.value = value
+        record_throttle(self.name, value)
+
+class SimMotorKit:
+    # Stand in for adafruit_motorkit.MotorKit
+    def __init__(self, address=0x60):
+        self.address = address
+        self.motor1 = SimMotor('motor1')
+        self.motor2 = SimMotor('motor2')
+        self.motor3 = SimMotor('motor3')
+        self.motor4 = SimMotor('motor4')
+
+class SimDistanceSensor(FakeDistanceSensor):
+    # Stand in for gpiozero.DistanceSensor using Sensor.FakeDistanceSensor
+    def __init__(self, echo=None, trigger=None, distance=None, noise=0.0):
+        if distance is None:
+            distance = float(os.environ.get('ROVER_SIM_DISTANCE', 1.0))
+        super().__init__(distance, noise)
+        self.echo = echo
+        self.trigger = trigger
+
+if backend == 'sim':
+    MotorKit = SimMotorKit
+    DistanceSensor = SimDistanceSensor
+else:
+    from adafruit_motorkit import MotorKit
+    from gpiozero import DistanceSensor
+    import board
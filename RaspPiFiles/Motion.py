@@ -0,0 +1,148 @@
+"""
+MOTION SCHEDULER (MotionScheduler class):
+1. __init__(commands, halt, on_timed_stop, spin)
+   INPUT: commands (dict of direction -> motor function, e.g. API.motor_commands),
+          halt (function halt(direction) that stops only if still moving that way, e.g. Motor.halt_if),
+          on_timed_stop (function called as on_timed_stop(direction, late) after a timed stop, optional),
+          spin (float seconds busy-waited before a deadline instead of sleeping, default 0.002)
+   OUTPUT: Initialized MotionScheduler object
+   SUMMARY: Runs "direction X for N seconds" without blocking the caller; a newer command always pre-empts
+
+2. run(direction, duration)
+   INPUT: direction (string), duration (float seconds, None or 0 to run until the next command)
+   OUTPUT: dict with direction, duration and generation, or None for an unknown direction
+   SUMMARY: Starts the motion right away and, for timed moves, hands the stop to the scheduler thread;
+            the motor call is timed as motion.command
+
+3. start()
+   INPUT: None
+   OUTPUT: Scheduler thread
+   SUMMARY: Starts the thread that times the stops (run() starts it on the first timed move)
+
+4. stop()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Ends the scheduler thread; pending timed stops are dropped
+
+5. schedule_loop()
+   INPUT: None
+   OUTPUT: None (continuous loop)
+   SUMMARY: Sleeps until the current deadline on the monotonic clock and stops the motion if nothing replaced it
+
+6. status()
+   INPUT: None
+   OUTPUT: dict with direction, remaining (seconds or None) and generation
+   SUMMARY: Reports the current motion and how long until its timed stop
+
+7. preempt(reason, direction)
+   INPUT: reason (string, e.g. 'reflex'), direction (string motion it ended, optional for whatever is running)
+   OUTPUT: dict with direction, reason and generation, or None if a newer command already replaced that motion
+   SUMMARY: Records that something outside the scheduler already stopped the motors, dropping the pending
+            timed stop so it never reports a move_done for a move that ended early
+"""
+
+import threading
+import time
+import Metrics
+
+class MotionScheduler:
+    # Run "direction X for N seconds" without blocking the caller; a newer command always pre-empts
+    def __init__(self, commands, halt, on_timed_stop=None, spin=0.002):
+        self.commands = commands
+        self.halt = halt
+        self.on_timed_stop = on_timed_stop
+        self.spin = spin
+
+        self.condition = threading.Condition()
+        self.direction = 'stop'
+        self.deadline = None  # monotonic time of the pending stop
+        self.generation = 0  # bumped by every command so an older deadline can tell it was replaced
+        self.running = False
+        self.thread = None
+
+    # Start the motion right away and, for timed moves, hand the stop to the scheduler thread
+    def run(self, direction, duration=None):
+        if direction not in self.commands:
+            return None
+        if duration and (self.thread is None or not self.thread.is_alive()):
+            self.start()
+
+        with self.condition:
+            # the motor call happens under the lock, so a timed stop can't land between it and the new deadline
+            start = time.perf_counter()
+            self.commands[direction]()
+            Metrics.observe('motion.command', time.perf_counter() - start)
+            self.generation += 1
+            self.direction = direction
+            self.deadline = None
+            if duration and direction != 'stop':
+                self.deadline = time.monotonic() + duration
+            self.condition.notify_all()
+            return {'direction': direction, 'duration': duration, 'generation': self.generation}
+
+    # Start the thread that times the stops
+    def start(self):
+        with self.condition:
+            if self.thread is None or not self.thread.is_alive():
+                self.running = True
+                self.thread = threading.Thread(target=self.schedule_loop, daemon=True)
+                self.thread.start()
+            return self.thread
+
+    # End the scheduler thread; pending timed stops are dropped
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    # Sleep until the current deadline on the monotonic clock and stop the motion if nothing replaced it
+    def schedule_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: not self.running or self.deadline is not None)
+                if not self.running:
+                    return
+                generation, deadline, direction = self.generation, self.deadline, self.direction
+
+                # sleep most of the way; a newer command wakes this up early and changes the generation
+                self.condition.wait_for(lambda: not self.running or self.generation != generation,
+                                        timeout=max(0.0, deadline - self.spin - time.monotonic()))
+                if not self.running:
+                    return
+                if self.generation != generation:
+                    continue
+
+            # spin the last couple of milliseconds, sleep wake-ups are not that precise
+            while time.monotonic() < deadline:
+                pass
+
+            with self.condition:
+                if self.generation != generation:
+                    continue  # pre-empted while spinning
+                late = time.monotonic() - deadline
+                self.halt(direction)  # no-op if something else (e.g. the reflex stop) already stopped it
+                self.generation += 1
+                self.direction = 'stop'
+                self.deadline = None
+            if self.on_timed_stop is not None:
+                self.on_timed_stop(direction, late)
+
+    # Report the current motion and how long until its timed stop
+    def status(self):
+        with self.condition:
+            remaining = None
+            if self.deadline is not None:
+                remaining = max(0.0, self.deadline - time.monotonic())
+            return {'direction': self.direction, 'remaining': remaining, 'generation': self.generation}
+
+    # Record that something outside the scheduler already stopped the motors
+    def preempt(self, reason, direction=None):
+        with self.condition:
+            if direction is not None and self.direction != direction:
+                return None
+            stopped = self.direction
+            self.generation += 1
+            self.direction = 'stop'
+            self.deadline = None
+            self.condition.notify_all()
+            return {'direction': stopped, 'reason': reason, 'generation': self.generation}
@@ -29,48 +29,99 @@ FUNCTIONS:
    INPUT: None
    OUTPUT: Boolean (True if obstacle detected within 0.25m, False otherwise)
    SUMMARY: Reads ultrasonic sensor distance and returns obstacle detection status
-"""
 
-from adafruit_motorkit import MotorKit
-from gpiozero import DistanceSensor
-import board
+7. read_distance()
+   INPUT: None
+   OUTPUT: Float distance in meters
+   SUMMARY: Reads the raw ultrasonic sensor distance
+
+8. halt_if(direction)
+   INPUT: direction (string the rover must currently be moving in)
+   OUTPUT: Boolean (True if the motors were stopped)
+   SUMMARY: Stops both motors only if the rover is still moving in that direction, so a reflex stop
+            can never cancel a newer command
+
+9. get_direction()
+   INPUT: None
+   OUTPUT: String direction the motors were last set to ('stop' at startup)
+   SUMMARY: Reports the current motion without touching the motor driver
+"""
 
+import threading
 import time
-kit = MotorKit(0x40)
-ultrasonic = DistanceSensor(echo=17, trigger=4)
+import Hardware  # real adafruit/gpiozero classes, or simulated ones with ROVER_HARDWARE=sim
+kit = Hardware.MotorKit(0x40)
+ultrasonic = Hardware.DistanceSensor(echo=17, trigger=4)
+obstacle_threshold = 0.25  # meters
+
+current_direction = 'stop'
+motion_lock = threading.Lock()  # throttle writes and current_direction always change together
 
 # Power both motors forward with adjusted throttle values to compensate for motor differences
 def forward():
-    kit.motor1.throttle = -0.77
-    # motor 1 is slightly weaker than motor 2 so adjustments had to be made
-    kit.motor2.throttle = -0.70
+    global current_direction
+    with motion_lock:
+        kit.motor1.throttle = -0.77
+        # motor 1 is slightly weaker than motor 2 so adjustments had to be made
+        kit.motor2.throttle = -0.70
+        current_direction = 'forward'
 
 # Power both motors backward with negated throttle values from forward motion
 def backward():
-    kit.motor1.throttle = 0.74
-    kit.motor2.throttle = 0.715
-    # same throttles as moving forward, but negated values 
+    global current_direction
+    with motion_lock:
+        kit.motor1.throttle = 0.74
+        kit.motor2.throttle = 0.715
+        # same throttles as moving forward, but negated values 
+        current_direction = 'backward'
 
 # Create counterclockwise spin by moving right motor forward and left motor backward
 def left():
-    # moves it backward slightly before turning 
-    kit.motor1.throttle = -0.793 
-    kit.motor2.throttle = 0.75 
-    # time.sleep(0.15) # allows for turning in small increments
+    global current_direction
+    with motion_lock:
+        # moves it backward slightly before turning 
+        kit.motor1.throttle = -0.793 
+        kit.motor2.throttle = 0.75 
+        # time.sleep(0.15) # allows for turning in small increments
+        current_direction = 'left'
 
 # Create clockwise spin by moving left motor forward and right motor backward
 def right():
-    kit.motor1.throttle = 0.793 
-    kit.motor2.throttle = -0.75
-    # time.sleep(0.15) # allows for turning in small incremenets
+    global current_direction
+    with motion_lock:
+        kit.motor1.throttle = 0.793 
+        kit.motor2.throttle = -0.75
+        # time.sleep(0.15) # allows for turning in small incremenets
+        current_direction = 'right'
 
 # Set both motor throttles to zero to stop all movement
 def stop():
-    kit.motor1.throttle = 0.0
-    kit.motor2.throttle = 0.0
+    global current_direction
+    with motion_lock:
+        kit.motor1.throttle = 0.0
+        kit.motor2.throttle = 0.0
+        current_direction = 'stop'
+
+# Stop both motors only if the rover is still moving in that direction
+def halt_if(direction):
+    global current_direction
+    with motion_lock:
+        if current_direction != direction:
+            return False  # a newer command already replaced that motion
+        kit.motor1.throttle = 0.0
+        kit.motor2.throttle = 0.0
+        current_direction = 'stop'
+        return True
+
+# Report the current motion without touching the motor driver
+def get_direction():
+    return current_direction
+
+# Read the raw ultrasonic sensor distance
+def read_distance():
+    return ultrasonic.distance
 
 # Read ultrasonic sensor distance and return obstacle detection status
 def get_distance():
-    distance = ultrasonic.distance
-    return distance < 0.25
-
+    distance = read_distance()
+    return distance < obstacle_threshold
@@ -0,0 +1,61 @@
+"""
+REFLEX STOP (ReflexStop class):
+1. __init__(motor, threshold, confirm, on_trip)
+   INPUT: motor (Motor module or anything with get_direction() and halt_if(direction)),
+          threshold (float meters, default Motor.obstacle_threshold), confirm (int raw samples in a row
+          that must be in range, default 2), on_trip (function called as on_trip(event) after a stop, optional)
+   OUTPUT: Initialized ReflexStop object
+   SUMMARY: Cuts the motors on the Pi itself when the rover drives forward into an obstacle
+
+2. check(reading)
+   INPUT: reading (SensorService reading dict)
+   OUTPUT: Event dict if the motors were stopped, None otherwise
+   SUMMARY: Sensor listener run on the sampling thread; stops forward motion once an obstacle is confirmed
+
+3. reset()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Forgets the in-range streak, e.g. after the sensor service restarts
+"""
+
+import time
+
+class ReflexStop:
+    # Cut the motors on the Pi itself when the rover drives forward into an obstacle
+    def __init__(self, motor, threshold=0.25, confirm=2, on_trip=None):
+        self.motor = motor
+        self.threshold = threshold
+        self.confirm = confirm
+        self.on_trip = on_trip
+        self.in_range = 0  # raw samples in a row closer than threshold
+        self.trips = 0
+
+    # Stop forward motion once an obstacle is confirmed
+    def check(self, reading):
+        # the filtered flag lags a few samples behind, so a short streak of raw readings also counts;
+        # the streak drops single bad echoes without waiting for the filter to catch up
+        if reading['raw'] < self.threshold:
+            self.in_range += 1
+        else:
+            self.in_range = 0
+        if not (reading['detect_flag'] or self.in_range >= self.confirm):
+            return None
+
+        if not self.motor.halt_if('forward'):
+            return None  # not driving forward, or a newer command already took over
+        self.trips += 1
+
+        event = {'type': 'reflex_stop',
+                 'distance': reading['distance'],
+                 'raw': reading['raw'],
+                 'approach_rate': reading['approach_rate'],
+                 'sample_time': reading['timestamp'],
+                 'stop_time': time.monotonic(),
+                 'time': time.time()}
+        if self.on_trip is not None:
+            self.on_trip(event)
+        return event
+
+    # Forget the in-range streak
+    def reset(self):
+        self.in_range = 0
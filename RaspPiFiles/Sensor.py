@@ -0,0 +1,182 @@
+"""
+SENSOR SERVICE (SensorService class):
+1. __init__(sensor, rate, window, alpha, threshold, buffer_size, rate_window)
+   INPUT: sensor (object with a .distance attribute in meters, e.g. gpiozero.DistanceSensor or FakeDistanceSensor),
+          rate (float samples per second, default 40), window (int median window, default 5),
+          alpha (float EMA weight of the newest median, default 0.4), threshold (float meters, default 0.25),
+          buffer_size (int samples kept, default 64), rate_window (float seconds used for the approach rate, default 0.5)
+   OUTPUT: Initialized SensorService object (not sampling yet)
+   SUMMARY: Samples the ultrasonic sensor on its own thread so requests never wait on an echo
+
+2. start()
+   INPUT: None
+   OUTPUT: Sampling thread
+   SUMMARY: Starts sampling at a fixed rate on a daemon thread
+
+3. stop()
+   INPUT: None
+   OUTPUT: None
+   SUMMARY: Ends the sampling thread after its current sample
+
+4. sample_loop()
+   INPUT: None
+   OUTPUT: None (continuous loop)
+   SUMMARY: Reads the sensor on a fixed schedule that does not drift with how long a read takes
+
+5. add_sample(raw, timestamp)
+   INPUT: raw (float meters or None if the read failed), timestamp (float monotonic seconds)
+   OUTPUT: Published reading dict
+   SUMMARY: Stores one raw sample in the ring buffer, filters it and publishes the new reading
+
+6. latest()
+   INPUT: None
+   OUTPUT: dict with distance (filtered), raw, approach_rate (m/s, positive when closing in), detect_flag,
+           timestamp and samples, or None before the first sample
+   SUMMARY: Returns the last published reading in O(1) without touching the sensor
+
+7. add_listener(callback)
+   INPUT: callback (function called as callback(reading) on the sampling thread after every sample)
+   OUTPUT: None
+   SUMMARY: Lets reflexes react to a sample the moment it is taken instead of polling latest()
+
+FAKE SENSOR (FakeDistanceSensor class):
+1. __init__(distance, noise, seed)
+   INPUT: distance (float meters or function of elapsed seconds returning meters), noise (float standard deviation),
+          seed (int, optional)
+   OUTPUT: FakeDistanceSensor object
+   SUMMARY: Stand-in for gpiozero.DistanceSensor so the service can run without GPIO
+
+2. distance [property]
+   INPUT: None
+   OUTPUT: Float meters clamped to the sensor's 0-1 m range
+   SUMMARY: Returns the scripted distance plus optional noise
+
+3. set_distance(distance)
+   INPUT: distance (float meters or function of elapsed seconds)
+   OUTPUT: None
+   SUMMARY: Changes what the fake sensor reports from now on
+"""
+
+from collections import deque
+import random
+import statistics
+import threading
+import time
+
+class SensorService:
+    # Sample the ultrasonic sensor on its own thread so requests never wait on an echo
+    def __init__(self, sensor, rate=40.0, window=5, alpha=0.4, threshold=0.25, buffer_size=64, rate_window=0.5):
+        self.sensor = sensor
+        self.period = 1.0 / rate
+        self.window = window
+        self.alpha = alpha
+        self.threshold = threshold
+        self.rate_window = rate_window
+
+        self.raw_samples = deque(maxlen=buffer_size)  # ring buffer of raw readings
+        self.history = deque(maxlen=buffer_size)  # ring buffer of (timestamp, filtered distance)
+        self.filtered = None
+        self.samples = 0
+        self.reading = None  # replaced as a whole on every sample, so readers never see half an update
+        self.listeners = []
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # Start sampling at a fixed rate on a daemon thread
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.sample_loop, daemon=True)
+            self.thread.start()
+        return self.thread
+
+    # End the sampling thread after its current sample
+    def stop(self):
+        self.stop_event.set()
+
+    # Read the sensor on a fixed schedule that does not drift with how long a read takes
+    def sample_loop(self):
+        next_sample = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                raw = self.sensor.distance
+            except Exception as e:
+                print(f'ultrasonic read failed: {e}')
+                raw = None
+            self.add_sample(raw, time.monotonic())
+
+            next_sample += self.period
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                next_sample = time.monotonic()  # fell behind, don't try to catch up with a burst
+                delay = 0
+            self.stop_event.wait(delay)
+
+    # Store one raw sample in the ring buffer, filter it and publish the new reading
+    def add_sample(self, raw, timestamp):
+        if raw is None:
+            return self.reading  # keep the last good reading
+
+        self.raw_samples.append(raw)
+        self.samples += 1
+
+        # median drops single bad echoes, the EMA then smooths what is left
+        median = statistics.median(list(self.raw_samples)[-self.window:])
+        if self.filtered is None:
+            self.filtered = median
+        else:
+            self.filtered = self.alpha * median + (1 - self.alpha) * self.filtered
+        self.history.append((timestamp, self.filtered))
+
+        # compare with the oldest filtered value inside rate_window
+        approach_rate = 0.0
+        for then, distance in self.history:
+            if timestamp - then <= self.rate_window:
+                if timestamp > then:
+                    approach_rate = (distance - self.filtered) / (timestamp - then)
+                break
+
+        self.reading = {'distance': self.filtered,
+                        'raw': raw,
+                        'approach_rate': approach_rate,
+                        'detect_flag': self.filtered < self.threshold,
+                        'timestamp': timestamp,
+                        'samples': self.samples}
+        for callback in self.listeners:
+            try:
+                callback(self.reading)
+            except Exception as e:
+                print(f'sensor listener failed: {e}')
+        return self.reading
+
+    # Return the last published reading without touching the sensor
+    def latest(self):
+        return self.reading
+
+    # Let reflexes react to a sample the moment it is taken instead of polling latest()
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+class FakeDistanceSensor:
+    # Stand-in for gpiozero.DistanceSensor so the service can run without GPIO
+    def __init__(self, distance=1.0, noise=0.0, seed=None):
+        self.start_time = time.monotonic()
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.set_distance(distance)
+
+    # Change what the fake sensor reports from now on
+    def set_distance(self, distance):
+        self.script = distance
+
+    # Return the scripted distance plus optional noise
+    @property
+    def distance(self):
+        if callable(self.script):
+            value = self.script(time.monotonic() - self.start_time)
+        else:
+            value = self.script
+        if self.noise:
+            value += self.rng.gauss(0.0, self.noise)
+        return min(max(value, 0.0), 1.0)  # gpiozero reports 0 to max_distance (1 m by default)
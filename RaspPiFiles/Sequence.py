@@ -0,0 +1,241 @@
+"""
+SEQUENCE RUNNER (SequenceRunner class):
+1. __init__(motion, conditions, on_finish, spin, max_steps)
+   INPUT: motion (Motion.MotionScheduler), conditions (dict of condition name -> function returning bool),
+          on_finish (function called as on_finish(status) when a program ends, optional),
+          spin (float seconds busy-waited before each step boundary, default 0.002),
+          max_steps (int largest program accepted, counting nested and repeated steps, default 500)
+   OUTPUT: Initialized SequenceRunner object
+   SUMMARY: Runs a whole uploaded motion program on the Pi so step timing never crosses the network
+
+2. validate(steps, depth)
+   INPUT: steps (list of step dicts), depth (int nesting level, default 0)
+   OUTPUT: int number of steps the program can execute at most
+   SUMMARY: Checks a program before anything moves; raises ValueError describing the first bad step
+
+3. start(steps, name)
+   INPUT: steps (list of step dicts), name (string shown in status, optional)
+   OUTPUT: status dict of the new program
+   SUMMARY: Validates the program, cancels whatever program is running and runs the new one on its own thread
+
+4. cancel(reason)
+   INPUT: reason (string stored as the program state, default 'cancelled')
+   OUTPUT: Boolean (True if a program was running)
+   SUMMARY: Stops the running program before its next motor command; the motors are left to the caller
+
+5. status()
+   INPUT: None
+   OUTPUT: dict with id, name, state, steps_done, current, result, elapsed and trace, or None before the first program
+   SUMMARY: Reports the progress of the running or last program
+
+6. wait(timeout)
+   INPUT: timeout (float seconds)
+   OUTPUT: status dict
+   SUMMARY: Blocks until the current program ends or timeout passes
+
+7. run_program(program, steps)
+   INPUT: program (internal program dict), steps (validated step list)
+   OUTPUT: None (thread target)
+   SUMMARY: Runs the steps, stops the motors at the end and publishes the final status
+
+8. run_steps(program, steps)
+   INPUT: program (internal program dict), steps (list of step dicts)
+   OUTPUT: Boolean (False once the program finished early or was cancelled)
+   SUMMARY: Executes one list of steps, recursing into if/repeat blocks
+
+9. sleep_until(program, deadline)
+   INPUT: program (internal program dict), deadline (float monotonic seconds)
+   OUTPUT: Boolean (False if the program was cancelled while waiting)
+   SUMMARY: Sleeps on the monotonic clock and spins the last couple of milliseconds for an exact step boundary
+
+STEPS:
+- {'direction': 'left', 'duration': 1.4}          run a motor command for duration seconds ('stop' pauses)
+- {'if': 'obstacle_clear', 'then': [...], 'else': [...]}   branch on a condition checked on the Pi
+- {'repeat': 3, 'steps': [...]}                    run a block several times
+- {'finish': 'left'}                               end the program now with result 'left'
+A program that runs out of steps ends with result None. The motors are always stopped at the end.
+"""
+
+import threading
+import time
+
+class SequenceRunner:
+    # Run a whole uploaded motion program on the Pi so step timing never crosses the network
+    def __init__(self, motion, conditions, on_finish=None, spin=0.002, max_steps=500):
+        self.motion = motion
+        self.conditions = conditions
+        self.on_finish = on_finish
+        self.spin = spin
+        self.max_steps = max_steps
+
+        # held while a program checks for cancel and sends a motor command, so a cancel
+        # followed by a newer command can never be overwritten by the old program
+        self.lock = threading.Lock()
+        self.finished = threading.Condition()
+        self.program = None
+        self.next_id = 0
+
+    # Check a program before anything moves
+    def validate(self, steps, depth=0):
+        if not isinstance(steps, list):
+            raise ValueError('steps must be a list')
+        if depth > 4:
+            raise ValueError('steps are nested too deeply')
+
+        count = 0
+        for index, step in enumerate(steps):
+            where = f'step {index} at depth {depth}'
+            if not isinstance(step, dict):
+                raise ValueError(f'{where} is not an object')
+            if 'direction' in step:
+                if step['direction'] not in self.motion.commands:
+                    raise ValueError(f"{where} has unknown direction {step['direction']!r}")
+                duration = step.get('duration', 0)
+                if not isinstance(duration, (int, float)) or not 0 <= duration <= 30:
+                    raise ValueError(f'{where} needs a duration between 0 and 30 seconds')
+                count += 1
+            elif 'if' in step:
+                if step['if'] not in self.conditions:
+                    raise ValueError(f"{where} has unknown condition {step['if']!r}")
+                count += 1 + max(self.validate(step.get('then', []), depth + 1),
+                                 self.validate(step.get('else', []), depth + 1))
+            elif 'repeat' in step:
+                times = step['repeat']
+                if not isinstance(times, int) or not 1 <= times <= 20:
+                    raise ValueError(f'{where} must repeat between 1 and 20 times')
+                count += times * self.validate(step.get('steps', []), depth + 1)
+            elif 'finish' in step:
+                count += 1
+            else:
+                raise ValueError(f'{where} has no direction, if, repeat or finish')
+
+        if depth == 0 and count > self.max_steps:
+            raise ValueError(f'program runs up to {count} steps, the limit is {self.max_steps}')
+        return count
+
+    # Validate the program, cancel whatever program is running and run the new one on its own thread
+    def start(self, steps, name=None):
+        self.validate(steps)
+        self.cancel('replaced')
+
+        with self.finished:
+            self.next_id += 1
+            program = {'id': self.next_id,
+                       'name': name,
+                       'state': 'running',
+                       'steps_done': 0,
+                       'current': None,
+                       'result': None,
+                       'started': time.monotonic(),
+                       'elapsed': 0.0,
+                       'trace': [],
+                       'deadline': None,
+                       'cancel': threading.Event()}
+            self.program = program
+
+        threading.Thread(target=self.run_program, args=(program, steps), daemon=True).start()
+        return self.status()
+
+    # Stop the running program before its next motor command
+    def cancel(self, reason='cancelled'):
+        with self.lock:
+            program = self.program
+            if program is None or program['state'] != 'running':
+                return False
+            program['state'] = reason
+            program['cancel'].set()
+            return True
+
+    # Report the progress of the running or last program
+    def status(self):
+        program = self.program
+        if program is None:
+            return None
+        status = {key: value for key, value in program.items() if key not in ('cancel', 'deadline')}
+        status['trace'] = list(program['trace'])
+        if program['state'] == 'running':
+            status['elapsed'] = time.monotonic() - program['started']
+        return status
+
+    # Block until the current program ends or timeout passes
+    def wait(self, timeout):
+        with self.finished:
+            self.finished.wait_for(lambda: self.program is None or self.program['state'] != 'running',
+                                   timeout=timeout)
+        return self.status()
+
+    # Run the steps, stop the motors at the end and publish the final status
+    def run_program(self, program, steps):
+        program['deadline'] = time.monotonic()
+        try:
+            self.run_steps(program, steps)
+        except Exception as e:
+            print(f'sequence {program["id"]} failed: {e}')
+            with self.lock:
+                if program['state'] == 'running':
+                    program['state'] = 'failed'
+
+        with self.lock:
+            if program['state'] == 'running':
+                # a cancelled program leaves the motors to whoever cancelled it
+                self.motion.run('stop')
+                program['state'] = 'done'
+        program['current'] = None
+        program['elapsed'] = time.monotonic() - program['started']
+
+        with self.finished:
+            self.finished.notify_all()
+        if self.on_finish is not None:
+            self.on_finish(self.status())
+
+    # Execute one list of steps, recursing into if/repeat blocks
+    def run_steps(self, program, steps):
+        for step in steps:
+            if program['cancel'].is_set():
+                return False
+
+            if 'direction' in step:
+                duration = step.get('duration', 0)
+                with self.lock:
+                    if program['cancel'].is_set():
+                        return False
+                    self.motion.run(step['direction'])
+                    now = time.monotonic()
+                # a late start never shortens the move, a turn angle matters more than total time
+                start = max(program['deadline'], now)
+                program['deadline'] = start + duration
+                program['current'] = step
+                program['trace'].append({'direction': step['direction'], 'duration': duration,
+                                         'at': now - program['started'], 'late_ms': 1000 * (now - start)})
+                program['steps_done'] += 1
+                if not self.sleep_until(program, program['deadline']):
+                    return False
+
+            elif 'if' in step:
+                passed = bool(self.conditions[step['if']]())
+                program['trace'].append({'if': step['if'], 'passed': passed,
+                                         'at': time.monotonic() - program['started']})
+                program['steps_done'] += 1
+                if not self.run_steps(program, step.get('then' if passed else 'else', [])):
+                    return False
+
+            elif 'repeat' in step:
+                for _ in range(step['repeat']):
+                    if not self.run_steps(program, step.get('steps', [])):
+                        return False
+
+            elif 'finish' in step:
+                program['result'] = step['finish']
+                program['steps_done'] += 1
+                return False
+        return True
+
+    # Sleep on the monotonic clock and spin the last couple of milliseconds for an exact step boundary
+    def sleep_until(self, program, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining > self.spin and program['cancel'].wait(remaining - self.spin):
+            return False
+        while time.monotonic() < deadline:
+            if program['cancel'].is_set():
+                return False
+        return not program['cancel'].is_set()
@@ -0,0 +1,149 @@
+"""
+ROVER STATE (RoverState class):
+1. __init__(max_events)
+   INPUT: max_events (int events kept for clients that fell behind, default 100)
+   OUTPUT: Empty RoverState object
+   SUMMARY: Holds everything the API shares between request threads, each part behind its own lock
+
+2. store_frame(jpeg, timestamp)
+   INPUT: jpeg (encoded JPEG bytes), timestamp (float capture time, optional)
+   OUTPUT: frame_id (int)
+   SUMMARY: Caches encoded frame bytes with a sequence number and wakes up waiting streams
+
+3. wait_for_frame(after_id, timeout)
+   INPUT: after_id (int frame id the client already has, optional), timeout (float seconds, None to wait forever)
+   OUTPUT: (jpeg bytes, frame id, timestamp) or None if no newer frame arrived in time
+   SUMMARY: Blocks until there is a frame other than after_id
+
+4. frame_info()
+   INPUT: None
+   OUTPUT: (frame id, timestamp)
+   SUMMARY: Reads the id and capture time of the cached frame without its bytes
+
+5. latest_frame()
+   INPUT: None
+   OUTPUT: Decoded OpenCV frame or None
+   SUMMARY: Decodes the cached JPEG once per frame id, only when a server-side consumer needs pixels
+
+6. set_direction(direction)
+   INPUT: direction (string)
+   OUTPUT: dict with direction
+   SUMMARY: Records the direction the rover was last told to move in
+
+7. log_command(direction, source)
+   INPUT: direction (string), source (string IP address or internal source such as 'reflex')
+   OUTPUT: Log entry dict
+   SUMMARY: Records the last command with who sent it and when
+
+8. command_state()
+   INPUT: None
+   OUTPUT: (dict with direction, last log entry dict), both copies taken together
+   SUMMARY: Reads direction and log as one consistent snapshot
+
+9. publish_event(event)
+   INPUT: event (dict with at least a type key)
+   OUTPUT: event id (int)
+   SUMMARY: Adds an event to the recent-events log and wakes clients waiting for events
+
+10. wait_for_events(after_id, timeout)
+    INPUT: after_id (int last event id the client has), timeout (float seconds)
+    OUTPUT: (list of event dicts newer than after_id, last event id)
+    SUMMARY: Blocks until an event newer than after_id exists or timeout passes
+"""
+
+from collections import deque
+from datetime import datetime
+import threading
+import time
+import cv2
+import numpy as np
+
+class RoverState:
+    # Hold everything the API shares between request threads, each part behind its own lock
+    def __init__(self, max_events=100):
+        # frame cache; frames, commands and events have separate locks so a burst of
+        # frame posts never makes a movement command wait
+        self.frame_condition = threading.Condition()
+        self.jpeg = None  # encoded bytes exactly as the camera sent them
+        self.frame_id = 0  # increments on every received frame so streams only send new ones
+        self.frame_timestamp = None  # capture time reported by the camera
+        self.decoded = (None, None)  # (frame id, decoded frame), swapped as one tuple
+
+        self.command_lock = threading.Lock()
+        self.direction = None
+        self.log = {}
+
+        self.event_condition = threading.Condition()
+        self.events = deque(maxlen=max_events)  # (event id, event)
+        self.event_id = 0
+
+    # Cache encoded frame bytes with a sequence number and wake up waiting streams
+    def store_frame(self, jpeg, timestamp=None):
+        with self.frame_condition:
+            self.jpeg = jpeg
+            self.frame_id += 1
+            self.frame_timestamp = timestamp if timestamp is not None else time.time()
+            self.frame_condition.notify_all()  # wakes up every open mjpeg stream
+            return self.frame_id
+
+    # Block until there is a frame other than after_id
+    def wait_for_frame(self, after_id=None, timeout=None):
+        with self.frame_condition:
+            # "different" rather than "greater" so a client still works after the api restarts
+            self.frame_condition.wait_for(lambda: self.jpeg is not None and self.frame_id != after_id,
+                                          timeout=timeout)
+            if self.jpeg is None or self.frame_id == after_id:
+                return None
+            return self.jpeg, self.frame_id, self.frame_timestamp
+
+    # Read the id and capture time of the cached frame without its bytes
+    def frame_info(self):
+        with self.frame_condition:
+            return self.frame_id, self.frame_timestamp
+
+    # Decode the cached JPEG once per frame id, only when a server-side consumer needs pixels
+    def latest_frame(self):
+        with self.frame_condition:
+            jpeg, current_id = self.jpeg, self.frame_id
+        if jpeg is None:
+            return None
+        decoded_id, frame = self.decoded
+        if decoded_id != current_id:
+            # decoded outside the lock; two threads may both decode, but neither sees a mismatched pair
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self.decoded = (current_id, frame)
+        return frame
+
+    # Record the direction the rover was last told to move in
+    def set_direction(self, direction):
+        with self.command_lock:
+            self.direction = direction
+            return {'direction': direction}
+
+    # Record the last command with who sent it and when
+    def log_command(self, direction, source):
+        entry = {'IP Address': source,
+                 'Direction Sent': direction,
+                 'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        with self.command_lock:
+            self.log = entry
+        return entry
+
+    # Read direction and log as one consistent snapshot
+    def command_state(self):
+        with self.command_lock:
+            return {'direction': self.direction}, dict(self.log)
+
+    # Add an event to the recent-events log and wake clients waiting for events
+    def publish_event(self, event):
+        with self.event_condition:
+            self.event_id += 1
+            self.events.append((self.event_id, dict(event, id=self.event_id)))
+            self.event_condition.notify_all()
+            return self.event_id
+
+    # Block until an event newer than after_id exists or timeout passes
+    def wait_for_events(self, after_id=0, timeout=0.0):
+        with self.event_condition:
+            self.event_condition.wait_for(lambda: self.event_id > after_id, timeout=timeout)
+            return [event for current_id, event in self.events if current_id > after_id], self.event_id
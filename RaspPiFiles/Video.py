@@ -8,9 +8,9 @@ MAIN PROCESS:
 3. Continuously capture frames from camera
 4. Resize frames to 400x300 for consistent processing
 5. Encode frames to JPEG format
-6. Convert to base64 for JSON transmission
-7. Send frames to API endpoint via POST request
-8. Handle frame rate limiting and error conditions
+6. Write raw JPEG bytes and capture timestamp into the shared-memory frame ring
+7. Handle frame rate limiting and error conditions
+8. Time capture, encode and hand-off, saving the timers for API.py's /metrics every couple of seconds
 9. Clean up video capture resources on exit
 
 CAMERA OPERATIONS:
@@ -20,20 +20,26 @@ CAMERA OPERATIONS:
 - Frame resizing for standardized dimensions
 - JPEG encoding for efficient transmission
 
-NETWORK OPERATIONS:
-- Base64 encoding for JSON compatibility
-- HTTP POST requests to API endpoint
-- Error handling for network failures
-- JSON payload construction with frame data
+FRAME HAND-OFF:
+- Frames go to API.py through the FrameRing created by main.py (name in ROVER_FRAME_RING)
+- No network stack, base64 or JSON between the two processes
+- API.py serves the same JPEG bytes to the computer without re-encoding
+
+METRICS:
+- video.capture (each cap.read, including the wait for the camera), video.encode (resize + JPEG),
+  video.handoff (ring write), counters video.frames and video.errors
+- Saved with Metrics.save to ROVER_VIDEO_METRICS (set by main.py), where API.py picks them up
 """
 
 import cv2
-import base64
-import requests
+import os
 import time
 
-# Set API endpoint URL for video stream transmission
-api_url = "http://192.168.240.25:5000/vidstream"
+from FrameRing import FrameRing, default_name
+import Metrics
+
+# Attach to the shared-memory frame ring that API.py reads from
+ring = FrameRing.attach(os.environ.get('ROVER_FRAME_RING', default_name))
 
 # Initialize video capture from default camera
 cap = cv2.VideoCapture(0)
@@ -47,37 +53,52 @@ if not cap.isOpened():
 frame_rate = 7
 prev_time = 0
 
+# This process's timers reach the API through a small file, the frame ring only carries frames
+metrics_path = os.environ.get('ROVER_VIDEO_METRICS')
+metrics_every = 2.0
+metrics_saved = time.monotonic()
+
 # Main video capture and transmission loop
 while True:
     # Capture frame-by-frame from camera
+    start = time.perf_counter()
     ret, frame = cap.read()
+    Metrics.observe('video.capture', time.perf_counter() - start)
     if not ret:
         print("Error: Unable to capture video frame")
         break
 
-    # Implement frame rate limiting to prevent excessive API calls
+    # Implement frame rate limiting to keep the camera at a steady 7 fps
     current_time = time.time()
     if (current_time - prev_time) < 1.0 / frame_rate:
         continue
     prev_time = current_time
+    capture_time = current_time
 
     # Resize frame to standard dimensions for consistent processing
+    start = time.perf_counter()
     frame = cv2.resize(frame, (400, 300))
 
     # Encode frame to JPEG format for efficient transmission
     _, buffer = cv2.imencode('.jpg', frame)
-
-    # Convert frame to base64 string for JSON compatibility
-    base64_image = base64.b64encode(buffer).decode('utf-8')
-
-    # Create JSON payload with encoded frame data
-    payload = {
-        "frame": base64_image,
-    }
-
-    # Send frame to API endpoint via HTTP POST request
-    headers = {'Content-Type': 'application/json'}
-    response = requests.post(api_url, json=payload, headers=headers)
+    encoded = time.perf_counter()
+    Metrics.observe('video.encode', encoded - start)
+
+    # Hand the JPEG bytes to the API through shared memory
+    try:
+        ring.write(buffer, capture_time)
+        Metrics.observe('video.handoff', time.perf_counter() - encoded)
+        Metrics.count('video.frames')
+    except ValueError as e:
+        Metrics.count('video.errors')
+        print(f"Error: Unable to store frame: {e}")
+
+    if metrics_path and time.monotonic() - metrics_saved >= metrics_every:
+        metrics_saved = time.monotonic()
+        try:
+            Metrics.save(metrics_path)
+        except OSError as e:
+            print(f"Error: Unable to save video metrics: {e}")
 
     # Exit loop when 'q' key is pressed
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -85,4 +106,5 @@ while True:
 
 # Clean up video capture resources
 cap.release()
+ring.close()
 
@@ -16,18 +16,42 @@ IMPORTED MODULES AND THEIR FUNCTIONS:
 3. time - Provides timing control for startup sequencing
    - Delay mechanisms to ensure proper initialization order
 
+4. FrameRing - Shared-memory ring buffer for camera frames
+   - Created here before either script starts and freed when both exit
+   - Name handed to both scripts through the ROVER_FRAME_RING environment variable
+
+5. argparse - Reads the --server and --threads options that pick the API worker model
+
+6. tempfile - Locates the file Video.py saves its timers to (ROVER_VIDEO_METRICS), which API.py
+   serves on /metrics next to its own
+
 EXECUTED SCRIPTS AND THEIR ROLES:
 1. API.py - Flask web server for robot control
    - REST API endpoints for movement commands (/moving)
+   - TCP command channel on port 5001 for low-latency movement commands
    - Video stream handling (/vidstream)
    - Logging and obstacle detection endpoints
-   - Motor control integration and command processing
+   - Background ultrasonic sampling (Sensor.py) with a filtered distance cache
+   - Reflex stop (Reflex.py) that cuts forward throttle on the Pi and reports it on /events
+   - Motion scheduler (Motion.py) that times the stop of "direction for N seconds" moves on the Pi
+   - Uploaded motion programs (Sequence.py) run step by step on the Pi via /sequence
+   - Timer histograms and counters (Metrics.py) for the API and Video.py on /metrics
+   - Motor control integration and command processing (Motor.py, hardware from Hardware.py)
 
 2. Video.py - Camera capture and streaming system
    - Real-time video capture from Pi camera
-   - Frame encoding and transmission to API
+   - Frame encoding and hand-off to API through the shared-memory frame ring
    - Frame rate control and error handling
-   - Base64 encoding for network transmission
+   - JPEG bytes written with a capture timestamp into the FrameRing named by ROVER_FRAME_RING, which API.py
+     reads and serves; no HTTP post between the two scripts
+
+SERVER MODES (python main.py --server MODE --threads N):
+1. threaded (default) - Werkzeug server, one thread per request, no debugger or reloader
+2. waitress - waitress WSGI server with N worker threads, if waitress is installed
+3. dev - Flask debug server with the reloader, for working on the code
+The choice reaches API.py through the ROVER_SERVER and ROVER_SERVER_THREADS environment variables.
+Setting ROVER_HARDWARE=sim before starting swaps the motor HAT and ultrasonic sensor for the simulated
+ones in Hardware.py, so the API runs off the Pi (Benchmark.py e2e uses this).
 
 THREADING ARCHITECTURE:
 1. Thread 1 (API Server): Starts first to establish network endpoints
@@ -36,20 +60,37 @@ THREADING ARCHITECTURE:
 4. Both threads run concurrently until completion
 
 STARTUP SEQUENCE:
-1. Create separate threads for API server and video capture
-2. Start API server thread to establish network interface
-3. Wait 3 seconds for API initialization
-4. Start video capture thread to begin frame transmission
-5. Wait for both threads to complete execution
+1. Create the shared-memory frame ring
+2. Create separate threads for API server and video capture
+3. Start API server thread to establish network interface
+4. Wait 3 seconds for API initialization
+5. Start video capture thread to begin frame transmission
+6. Wait for both threads to complete execution, then free the frame ring
 """
 
+import argparse
+import os
 import threading
 import subprocess
+import tempfile
 import time
 
+from FrameRing import FrameRing, default_name
+
+parser = argparse.ArgumentParser(description='rover server')
+parser.add_argument('--server', choices=('threaded', 'waitress', 'dev'), default='threaded')
+parser.add_argument('--threads', type=int, default=8, help='worker threads for --server waitress')
+args = parser.parse_args()
+
+# Create the frame ring that Video.py writes into and API.py reads from
+ring = FrameRing.create(default_name)
+child_env = dict(os.environ, ROVER_FRAME_RING=default_name, ROVER_SERVER=args.server,
+                 ROVER_SERVER_THREADS=str(args.threads),
+                 ROVER_VIDEO_METRICS=os.path.join(tempfile.gettempdir(), 'rover_video_metrics.json'))
+
 # Execute Python script as separate subprocess
 def run_file(filename):
-  subprocess.run(['python', filename])
+  subprocess.run(['python', filename], env=child_env)
 
 # Create thread for API server execution
 thread1 = threading.Thread(target=run_file, args=("API.py",))
@@ -64,5 +105,10 @@ time.sleep(3)
 thread2.start() 
 
 # Wait for both threads to complete execution
-thread1.join()
-thread2.join()
+try:
+  thread1.join()
+  thread2.join()
+finally:
+  # Free the shared memory once neither script needs it
+  ring.close()
+  ring.unlink()
@@ -0,0 +1,39 @@
+import time
+import Motion
+
+# Scheduler over fake motors that records every motor call and timed stop
+def make_scheduler():
+    calls = []
+    timed_stops = []
+    commands = {direction: (lambda direction=direction: calls.append(direction))
+                for direction in ('forward', 'backward', 'left', 'right', 'stop')}
+    motion = Motion.MotionScheduler(commands, lambda direction: calls.append(f'halt {direction}'),
+                                    on_timed_stop=lambda direction, late: timed_stops.append(direction))
+    return motion, calls, timed_stops
+
+def test_timed_move_stops_itself():
+    motion, calls, timed_stops = make_scheduler()
+    motion.run('forward', 0.05)
+    time.sleep(0.2)
+    motion.stop()
+    assert calls == ['forward', 'halt forward']
+    assert timed_stops == ['forward']
+    assert motion.status()['direction'] == 'stop'
+
+def test_preempt_drops_the_pending_timed_stop():
+    motion, calls, timed_stops = make_scheduler()
+    motion.run('forward', 0.1)
+    preempted = motion.preempt('reflex', 'forward')
+    assert preempted['direction'] == 'forward' and preempted['reason'] == 'reflex'
+    assert motion.status() == {'direction': 'stop', 'remaining': None, 'generation': preempted['generation']}
+    time.sleep(0.25)
+    motion.stop()
+    assert calls == ['forward']
+    assert timed_stops == []
+
+def test_preempt_leaves_a_newer_motion_alone():
+    motion, _, _ = make_scheduler()
+    motion.run('backward', 0.5)
+    assert motion.preempt('reflex', 'forward') is None
+    assert motion.status()['direction'] == 'backward'
+    motion.stop()
@@ -0,0 +1,106 @@
+import time
+import pytest
+import Reflex
+import Sensor
+
+# Feed the service whatever the fake sensor reports, one sample per period, on a made-up clock
+def feed(service, sensor, distances, start=0.0):
+    readings = []
+    for index, distance in enumerate(distances):
+        sensor.set_distance(distance)
+        readings.append(service.add_sample(sensor.distance, start + index * service.period))
+    return readings
+
+# Motor stand-in that is driving forward until something halts it
+class FakeMotor:
+    def __init__(self):
+        self.direction = 'forward'
+        self.halts = 0
+
+    def halt_if(self, direction):
+        if self.direction != direction:
+            return False
+        self.direction = 'stop'
+        self.halts += 1
+        return True
+
+def test_filter_is_a_median_then_an_ema():
+    sensor = Sensor.FakeDistanceSensor()
+    service = Sensor.SensorService(sensor, window=5, alpha=0.4)
+    readings = feed(service, sensor, [1.0, 0.8, 0.6])
+    # medians 1.0, 0.9, 0.8
+    assert readings[0]['distance'] == pytest.approx(1.0)
+    assert readings[1]['distance'] == pytest.approx(0.4 * 0.9 + 0.6 * 1.0)
+    assert readings[2]['distance'] == pytest.approx(0.4 * 0.8 + 0.6 * 0.96)
+    assert [reading['raw'] for reading in readings] == [1.0, 0.8, 0.6]
+
+def test_single_bad_echo_is_dropped_by_the_median():
+    sensor = Sensor.FakeDistanceSensor()
+    service = Sensor.SensorService(sensor)
+    readings = feed(service, sensor, [1.0, 1.0, 1.0, 0.05, 1.0])
+    assert readings[3]['raw'] == 0.05
+    assert all(reading['distance'] == pytest.approx(1.0) for reading in readings)
+    assert not any(reading['detect_flag'] for reading in readings)
+
+def test_approach_rate_sign_and_threshold_flag():
+    sensor = Sensor.FakeDistanceSensor()
+    service = Sensor.SensorService(sensor, threshold=0.25)
+    closing_in = feed(service, sensor, [1.0 - 0.04 * step for step in range(24)])
+    assert closing_in[-1]['approach_rate'] > 0
+    assert not closing_in[0]['detect_flag']
+    assert closing_in[-1]['detect_flag']  # filtered distance has fallen below 0.25 m
+
+    backing_off = feed(service, sensor, [0.1 + 0.04 * step for step in range(24)], start=1.0)
+    assert backing_off[-1]['approach_rate'] < 0
+    assert not backing_off[-1]['detect_flag']
+
+def test_failed_read_keeps_the_last_reading():
+    sensor = Sensor.FakeDistanceSensor(0.5)
+    service = Sensor.SensorService(sensor)
+    reading = service.add_sample(sensor.distance, 0.0)
+    assert service.add_sample(None, 0.025) is reading
+    assert service.latest() is reading
+
+def test_sampling_thread_publishes_readings():
+    service = Sensor.SensorService(Sensor.FakeDistanceSensor(0.1), rate=200.0)
+    service.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while (service.latest() is None or service.latest()['samples'] < 5) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        service.stop()
+    assert service.latest()['detect_flag']
+    assert service.latest()['distance'] == pytest.approx(0.1)
+
+def test_reflex_trips_on_two_raw_samples_in_range():
+    sensor = Sensor.FakeDistanceSensor()
+    service = Sensor.SensorService(sensor)
+    motor = FakeMotor()
+    events = []
+    reflex = Reflex.ReflexStop(motor, threshold=0.25, on_trip=events.append)
+    service.add_listener(reflex.check)
+
+    readings = feed(service, sensor, [1.0, 1.0, 1.0, 0.1, 0.1])
+    assert not readings[-1]['detect_flag']  # the filter hasn't caught up, the raw streak is what trips
+    assert motor.halts == 1 and reflex.trips == 1
+    assert len(events) == 1 and events[0]['raw'] == 0.1
+
+def test_reflex_ignores_a_single_spike():
+    sensor = Sensor.FakeDistanceSensor()
+    service = Sensor.SensorService(sensor)
+    motor = FakeMotor()
+    reflex = Reflex.ReflexStop(motor, threshold=0.25)
+    service.add_listener(reflex.check)
+
+    feed(service, sensor, [1.0, 1.0, 0.1, 1.0, 1.0, 0.1, 1.0])
+    assert motor.halts == 0 and reflex.trips == 0
+    assert motor.direction == 'forward'
+
+def test_reflex_only_stops_forward_motion():
+    motor = FakeMotor()
+    motor.direction = 'backward'
+    reflex = Reflex.ReflexStop(motor, threshold=0.25)
+    reading = {'distance': 0.1, 'raw': 0.1, 'approach_rate': 0.0, 'detect_flag': True, 'timestamp': 0.0}
+    assert reflex.check(reading) is None
+    assert motor.direction == 'backward'